@@ -0,0 +1,103 @@
+"""
+Benchmark of the global bandwidth governor (bandwidth.py) against the local mock server.
+
+Runs one download per --weights entry at the same time (each over --connections
+segments) and reports, while all of them are still running, each download's rate
+and its share of the aggregate, next to the share its weight entitles it to:
+  * uncapped: the engine without a governor cap (the cost of an idle governor),
+  * capped: the same downloads under a --cap-kbps aggregate cap.
+Run with:
+
+    python benchmarks/bench_bandwidth.py [--weights 1,1,2] [--video-mb N] [--cap-kbps N] [--connections N]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from mock_server import serve  # noqa: E402
+
+from anime3rb_downloader import bandwidth, fastio  # noqa: E402
+from anime3rb_downloader.segmented import download_resumable  # noqa: E402
+
+
+def run(base_url, workdir, weights, connections):
+    """Downloads one video per weight concurrently; returns (bytes per download while all ran, seconds, wall)."""
+    progress = [0] * len(weights)
+    snapshot = {}
+    finished = threading.Event()
+    lock = threading.Lock()
+
+    def download(index, weight):
+        session = requests.Session()
+        session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=connections))
+
+        def on_progress(downloaded, total):
+            progress[index] = downloaded
+
+        with bandwidth.governor.transfer(weight, f"video-{index}") as transfer:
+            download_resumable(f"{base_url}/download/bench-{index}.mp4", os.path.join(workdir, f"video-{index}.mp4"),
+                               session, connections=connections, progress_callback=on_progress,
+                               engine=fastio.engine.shaped(transfer))
+        with lock:
+            # The first download to finish ends the measurement window.
+            if not finished.is_set():
+                snapshot["bytes"], snapshot["at"] = list(progress), time.perf_counter()
+                finished.set()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=download, args=(index, weight)) for index, weight in enumerate(weights)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return snapshot["bytes"], snapshot["at"] - started, time.perf_counter() - started
+
+
+def report(name, weights, received, seconds, wall):
+    total = sum(received) or 1
+    print(f"{name}: aggregate {total / seconds / 1024 / 1024:.2f} MB/s while all ran, {wall:.2f}s overall")
+    print(f"  {'download':<10}{'weight':>8}{'MB/s':>10}{'share':>9}{'entitled':>10}")
+    for index, (weight, n) in enumerate(zip(weights, received)):
+        print(f"  {f'video-{index}':<10}{weight:>8g}{n / seconds / 1024 / 1024:>10.2f}"
+              f"{n / total:>9.1%}{weight / sum(weights):>10.1%}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--weights", default="1,1,2")
+    arg_parser.add_argument("--video-mb", type=float, default=16)
+    arg_parser.add_argument("--cap-kbps", type=float, default=8 * 1024)
+    arg_parser.add_argument("--connections", type=int, default=4)
+    args = arg_parser.parse_args()
+    weights = [float(w) for w in args.weights.split(",")]
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(0, 0, int(args.video_mb * 1024 * 1024), 0, port_queue),
+                                     daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get()}"
+    workdir = tempfile.mkdtemp(prefix="bench_bandwidth_")
+    try:
+        print(f"{len(weights)} downloads of {args.video_mb:g} MB, {args.connections} connections each")
+        bandwidth.configure(0, [])
+        report("uncapped", weights, *run(base_url, workdir, weights, args.connections))
+        bandwidth.configure(args.cap_kbps, [])
+        report(f"capped at {args.cap_kbps:g} KB/s", weights, *run(base_url, workdir, weights, args.connections))
+    finally:
+        bandwidth.configure(0, [])
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
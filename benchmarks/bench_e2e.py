@@ -0,0 +1,171 @@
+"""
+End-to-end benchmark of the CLI and GUI code paths against the local mock
+anime3rb server (benchmarks/mock_server.py).
+
+Each path runs in its own process, in a fresh working directory (so the page
+cache, link store and journal start cold), with every anime3rb / CDN request
+routed to the mock server:
+  * cli: episode count, get_download_links and start_downloads, as main() does,
+  * gui: search_anime, scrape_episode_list and start_download_process.
+Reports episodes/min, MB/s, p50/p99 link-resolution latency and peak RSS. Run with:
+
+    python benchmarks/bench_e2e.py [--episodes N] [--video-mb N] [--latency-ms N]
+                                   [--throttle-kbps N] [--downloads N] [--page-rate N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from mock_server import MockAdapter, serve  # noqa: E402
+
+SLUG = "one-piece"
+TITLE_URL = f"https://anime3rb.com/titles/{SLUG}"
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def route_sessions(module, mock_url):
+    """Replaces `module.sessions` (core.sessions) with a SessionPool whose sessions talk to the mock server."""
+    from anime3rb_downloader.sessions import SessionPool
+
+    class MockSessionPool(SessionPool):
+        def get(self):
+            session = super().get()
+            if not getattr(session, "mock_routed", False):
+                adapter = MockAdapter(mock_url, pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.mock_routed = True
+            return session
+
+    module.sessions = MockSessionPool()
+
+
+def run_cli(args):
+    from anime3rb_downloader import cli_downloader as cli
+    from anime3rb_downloader.journal import DownloadJournal
+
+    cli.journal = DownloadJournal()
+    cli.max_concurrent_downloads = args.downloads
+    count = cli.fetch_episode_count(TITLE_URL)
+    cli.start_downloads(SLUG, count, cli.get_download_links(TITLE_URL, SLUG, count, 1, min(args.episodes, count)))
+
+
+def run_gui(args):
+    from anime3rb_downloader import core
+    from anime3rb_downloader import gui_app as gui
+
+    gui.search_anime("one piece")
+    gui.scrape_episode_list(TITLE_URL)
+    episode_tuples = core.episode_list(TITLE_URL)
+    for _ in gui.start_download_process(TITLE_URL, episode_tuples[:args.episodes], args.downloads):
+        pass
+
+
+def child(args):
+    # Runs one code path and writes its measurements to args.result as JSON.
+    from anime3rb_downloader import core, ratelimit, telemetry
+
+    if args.page_rate:
+        ratelimit.limiter.configure(ratelimit.PAGE, rate=args.page_rate, burst=max(1, int(args.page_rate)))
+    events = []
+    telemetry.subscribe(events.append)
+    route_sessions(core, args.mock_url)
+    if args.path == "gui":
+        # The GUI imports gradio on first use; keep its (seconds long) import out of the measurement.
+        import gradio  # noqa: F401
+
+    wall = time.perf_counter()
+    # Progress prints and tqdm bars would only add noise (and terminal time) to the measurement.
+    stdout, stderr = sys.stdout, sys.stderr
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = sys.stderr = devnull
+        try:
+            (run_cli if args.path == "cli" else run_gui)(args)
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+    wall = time.perf_counter() - wall
+
+    downloads = [e for e in events if e["event"] == telemetry.DOWNLOAD and e.get("ok")]
+    resolves = [e["duration"] for e in events if e["event"] == telemetry.RESOLVE]
+    result = {
+        "episodes": len(downloads),
+        "wall": wall,
+        "bytes": sum(e.get("bytes", 0) for e in downloads),
+        "resolve_p50": percentile(resolves, 50),
+        "resolve_p99": percentile(resolves, 99),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--episodes", type=int, default=6)
+    arg_parser.add_argument("--video-mb", type=float, default=32)
+    arg_parser.add_argument("--latency-ms", type=float, default=50)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=0, help="per connection, 0 = unthrottled")
+    arg_parser.add_argument("--downloads", type=int, default=3, help="concurrent downloads")
+    arg_parser.add_argument("--page-rate", type=float, help="override the page budget of the rate limiter (req/s)")
+    arg_parser.add_argument("--paths", default="cli,gui")
+    arg_parser.add_argument("--path", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.path:
+        child(args)
+        return
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve,
+        args=(0, args.latency_ms / 1000, int(args.video_mb * 1024 * 1024), args.throttle_kbps * 1024, port_queue),
+        daemon=True,
+    )
+    server.start()
+    mock_url = f"http://127.0.0.1:{port_queue.get()}"
+
+    print(f"{args.episodes} episodes of {args.video_mb:g} MB, page latency {args.latency_ms:g} ms, "
+          f"throttle {args.throttle_kbps:g} KB/s/conn, {args.downloads} concurrent downloads")
+    print(f"{'path':<6}{'episodes':>10}{'wall s':>9}{'ep/min':>9}{'MB/s':>9}"
+          f"{'resolve p50 ms':>16}{'p99 ms':>9}{'peak RSS MB':>13}")
+    try:
+        for path in args.paths.split(","):
+            workdir = tempfile.mkdtemp(prefix=f"bench_e2e_{path}_")
+            result_path = os.path.join(workdir, "result.json")
+            command = [sys.executable, os.path.abspath(__file__), "--path", path, "--mock-url", mock_url,
+                       "--result", result_path, "--episodes", str(args.episodes), "--downloads", str(args.downloads)]
+            if args.page_rate:
+                command += ["--page-rate", str(args.page_rate)]
+            try:
+                subprocess.run(command, cwd=workdir, check=True)
+                with open(result_path) as f:
+                    r = json.load(f)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            print(f"{path:<6}{r['episodes']:>10}{r['wall']:>9.2f}{r['episodes'] / r['wall'] * 60:>9.1f}"
+                  f"{r['bytes'] / 1024 / 1024 / r['wall']:>9.1f}{r['resolve_p50'] * 1000:>16.1f}"
+                  f"{r['resolve_p99'] * 1000:>9.1f}{r['peak_rss_kb'] / 1024:>13.1f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Episode enumeration benchmark (core.iter_episodes) against the local mock server.
+
+For each series length of --episodes, serves a title whose episode listing is split in
+pages of --per-page episodes and walks it with the page cache bypassed:
+  * all:        every episode,
+  * first 10:   episodes 1-10 (range end pushed down: the walk stops after page 1),
+  * last 10:    the last 10 episodes (range start pushed down: jumps to their page),
+  * skip done:  every episode but the last 10 already downloaded (pages holding only
+                skipped episodes are never fetched),
+  * list (GUI): core.episode_list, the whole sorted list the GUI displays.
+Reports the episodes yielded, the listing pages fetched, the time to the first episode
+and in total, and the peak memory allocated while walking (tracemalloc), which stays
+flat with the series length except for the materialised list. Run with:
+
+    python benchmarks/bench_episodes.py [--episodes N,N,...] [--per-page N] [--latency-ms N]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from bench_e2e import route_sessions, TITLE_URL  # noqa: E402
+from mock_server import serve  # noqa: E402
+
+
+def walk(enumerate_episodes, fetches):
+    """Consumes enumerate_episodes(); returns (episodes, pages, first s, total s, peak KB)."""
+    before = len(fetches)
+    tracemalloc.start()
+    started = time.perf_counter()
+    first = None
+    count = 0
+    for _ in enumerate_episodes():
+        if first is None:
+            first = time.perf_counter() - started
+        count += 1
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, len(fetches) - before, first or 0, total, peak / 1024
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--episodes", default="500,3000,10000", help="series lengths, comma-separated")
+    arg_parser.add_argument("--per-page", type=int, default=50)
+    arg_parser.add_argument("--latency-ms", type=float, default=10)
+    args = arg_parser.parse_args()
+
+    from anime3rb_downloader import core, ratelimit, telemetry
+
+    # The mock server is local: let the walk go as fast as it can.
+    ratelimit.limiter.configure(ratelimit.PAGE, rate=1000, burst=1000)
+    fetches = []
+    telemetry.subscribe(lambda e: e["event"] == telemetry.FETCH and fetches.append(e))
+    workdir = tempfile.mkdtemp(prefix="bench_episodes_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    print(f"{args.per_page} episodes per listing page, {args.latency_ms:g} ms per page")
+    print(f"{'episodes':<10}{'walk':<12}{'yielded':>9}{'pages':>7}{'first ms':>10}{'total ms':>10}{'peak KB':>10}")
+    try:
+        for length in (int(n) for n in args.episodes.split(",")):
+            port_queue = multiprocessing.Queue()
+            server = multiprocessing.Process(target=serve, args=(0, args.latency_ms / 1000, 1024, 0, port_queue),
+                                             kwargs={"episodes": length, "per_page": args.per_page}, daemon=True)
+            server.start()
+            route_sessions(core, f"http://127.0.0.1:{port_queue.get()}")
+            stdout = sys.stdout
+            walks = [
+                ("all", lambda: core.iter_episodes(TITLE_URL, refresh=True)),
+                ("first 10", lambda: core.iter_episodes(TITLE_URL, end=10, refresh=True)),
+                ("last 10", lambda: core.iter_episodes(TITLE_URL, start=length - 9, refresh=True)),
+                ("skip done", lambda: core.iter_episodes(TITLE_URL, skip=range(1, length - 9), refresh=True)),
+                ("list (GUI)", lambda: core.episode_list(TITLE_URL, refresh=True)),
+            ]
+            try:
+                for name, enumerate_episodes in walks:
+                    with open(os.devnull, "w") as devnull:
+                        sys.stdout = devnull
+                        try:
+                            count, pages, first, total, peak = walk(enumerate_episodes, fetches)
+                        finally:
+                            sys.stdout = stdout
+                    print(f"{length:<10}{name:<12}{count:>9}{pages:>7}{first * 1000:>10.1f}{total * 1000:>10.1f}"
+                          f"{peak:>10.0f}")
+            finally:
+                server.terminate()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
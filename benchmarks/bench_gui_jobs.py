@@ -0,0 +1,109 @@
+"""
+Multi-user benchmark of the GUI download handler against the local mock server.
+
+--users simulated users each run start_download_process (the generator behind the
+"Lancer le téléchargement" button) for the same --episodes episodes, the user i
+arriving i * --stagger seconds after the first, all in one process like concurrent
+Gradio sessions. Reports, per user, the delay to the first streamed status and the
+number of status updates received, then the downloads actually run and the bytes
+fetched from the mock server against what the users asked for. Without the
+server-wide registry every user would download every episode. Run with:
+
+    python benchmarks/bench_gui_jobs.py [--users N] [--episodes N] [--stagger S]
+                                        [--video-mb N] [--throttle-kbps N]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from bench_e2e import route_sessions, SLUG, TITLE_URL  # noqa: E402
+from mock_server import serve  # noqa: E402
+
+
+def user(index, episodes, args, report):
+    from anime3rb_downloader import gui_app as gui
+
+    time.sleep(index * args.stagger)
+    started = time.perf_counter()
+    first = None
+    updates = 0
+    text = ""
+    for text in gui.start_download_process(TITLE_URL, episodes, args.downloads):
+        updates += 1
+        if first is None:
+            first = time.perf_counter() - started
+    report[index] = {"first": first, "updates": updates, "wall": time.perf_counter() - started,
+                     "ok": text.startswith("Processus terminé"), "summary": text.splitlines()[0] if text else ""}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--users", type=int, default=3)
+    arg_parser.add_argument("--episodes", type=int, default=4)
+    arg_parser.add_argument("--stagger", type=float, default=1.0, help="seconds between two users' requests")
+    arg_parser.add_argument("--video-mb", type=float, default=8)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=2048, help="per connection")
+    arg_parser.add_argument("--downloads", type=int, default=3, help="concurrent downloads per request")
+    args = arg_parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(0, 0.02, int(args.video_mb * 1024 * 1024), args.throttle_kbps * 1024, port_queue),
+        daemon=True)
+    server.start()
+    mock_url = f"http://127.0.0.1:{port_queue.get()}"
+    workdir = tempfile.mkdtemp(prefix="bench_gui_jobs_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from anime3rb_downloader import core, telemetry
+
+        route_sessions(core, mock_url)
+        events = []
+        telemetry.subscribe(events.append)
+        episodes = [(str(n), f"https://anime3rb.com/episode/{SLUG}/{n}") for n in range(1, args.episodes + 1)]
+
+        report = {}
+        stdout = sys.stdout
+        wall = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            try:
+                threads = [threading.Thread(target=user, args=(index, episodes, args, report))
+                           for index in range(args.users)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                sys.stdout = stdout
+        wall = time.perf_counter() - wall
+
+        print(f"{args.users} users x {args.episodes} episodes of {args.video_mb:g} MB, {args.stagger:g}s apart, "
+              f"{args.throttle_kbps:g} KB/s/conn")
+        print(f"{'user':<6}{'first status s':>16}{'updates':>9}{'wall s':>9}  summary")
+        for index in sorted(report):
+            r = report[index]
+            print(f"{index:<6}{r['first'] or 0:>16.2f}{r['updates']:>9}{r['wall']:>9.2f}  {r['summary']}")
+        downloads = [e for e in events if e["event"] == telemetry.DOWNLOAD]
+        fetched = sum(e.get("bytes", 0) for e in downloads)
+        requested = args.users * args.episodes
+        print(f"downloads run: {len(downloads)} for {requested} episode requests; "
+              f"fetched {fetched / 1024 / 1024:.1f} MB of {requested * args.video_mb:g} MB requested; "
+              f"wall {wall:.2f}s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
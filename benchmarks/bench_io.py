@@ -0,0 +1,154 @@
+"""
+Throughput benchmark of the download write path against a local HTTP server.
+
+Serves a generated file from a separate process (so its CPU time is not counted)
+and downloads it with:
+  * the original loop: iter_content(1024) + a progress print per chunk,
+  * iter_content(64 KB) with an unthrottled callback,
+  * the fastio engine over a single stream and over parallel Range segments.
+The fastio cases also fsync a checkpoint every CHECKPOINT_BYTES (needed to resume),
+which the two plain loops skip. Reports MB/s and the CPU% of this process. Run with:
+
+    python benchmarks/bench_io.py [--size-mb N] [--repeat N] [--buffer-kb N]
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from anime3rb_downloader import fastio
+from anime3rb_downloader.segmented import download_resumable
+
+
+def serve(path, port_queue):
+    size = os.path.getsize(path)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match:
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining:
+                    block = f.read(min(remaining, 1024 * 1024))
+                    if not block:
+                        break
+                    self.wfile.write(block)
+                    remaining -= len(block)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def original_loop(url, path, session):
+    # The write loop the CLI used before the segmented engine.
+    response = session.get(url, stream=True)
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded = 0
+    out = io.StringIO()
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=1024):
+            if chunk:
+                f.write(chunk)
+                downloaded += len(chunk)
+                print(f"Downloading... {downloaded / total_size * 100:.2f}%" + 50 * ' ', end='\r', file=out)
+                out.seek(0)
+    return True
+
+
+def chunked_loop(url, path, session):
+    response = session.get(url, stream=True)
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded = 0
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if chunk:
+                f.write(chunk)
+                downloaded += len(chunk)
+                report(downloaded, total_size)
+    return True
+
+
+def report(downloaded, total):
+    return f"Downloading... {downloaded / total * 100:.2f}%"
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        fn()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if best is None or wall < best[0]:
+            best = (wall, cpu)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--size-mb", type=int, default=256)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--buffer-kb", type=int, default=fastio.BUFFER_SIZE // 1024)
+    arg_parser.add_argument("--connections", type=int, default=4)
+    args = arg_parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_io_")
+    source = os.path.join(workdir, "source.bin")
+    with open(source, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(source, port_queue), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/video.mp4"
+    target = os.path.join(workdir, "video.mp4")
+    session = requests.Session()
+    engine = fastio.IOEngine(buffer_size=args.buffer_kb * 1024)
+
+    cases = [
+        ("original (1 KB + print/chunk)", lambda: original_loop(url, target, session)),
+        ("iter_content 64 KB", lambda: chunked_loop(url, target, session)),
+        ("fastio, 1 stream", lambda: download_resumable(url, target, session, connections=1,
+                                                        progress_callback=report, engine=engine)),
+        (f"fastio, {args.connections} segments",
+         lambda: download_resumable(url, target, session, connections=args.connections,
+                                    progress_callback=report, engine=engine)),
+    ]
+
+    try:
+        print(f"{args.size_mb} MB file, buffer {args.buffer_kb} KB, best of {args.repeat}")
+        print(f"{'write path':<32}{'MB/s':>10}{'CPU %':>10}{'CPU s':>10}")
+        for name, fn in cases:
+            wall, cpu = measure(fn, args.repeat)
+            print(f"{name:<32}{args.size_mb / wall:>10.1f}{cpu / wall * 100:>10.1f}{cpu:>10.2f}")
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
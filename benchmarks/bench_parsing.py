@@ -0,0 +1,88 @@
+"""
+Micro-benchmark of the HTML extractors in anime3rb_downloader.parsing.
+
+Compares, for each page type, the original approach (full html.parser tree +
+find/find_all) with the targeted extractors, over the saved fixtures in
+benchmarks/fixtures/. Run with:
+
+    python benchmarks/bench_parsing.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from anime3rb_downloader import parsing
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def baseline_download_holder(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.find("div", class_=parsing.DOWNLOAD_LINKS_CLASS)
+
+
+def baseline_episode_links(content, anime_id):
+    soup = BeautifulSoup(content, "html.parser")
+    links = soup.find_all('a', href=re.compile(f"https://anime3rb.com/episode/{anime_id}/\\d+"))
+    return [(link['href'].split("/")[-1], link['href']) for link in links]
+
+
+def baseline_search_cards(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.find_all("a", class_=lambda x: x and "simple-title-card" in x)
+
+
+def baseline_episode_count(content):
+    soup = BeautifulSoup(content, "html.parser")
+    return soup.find_all('p', class_=parsing.EPISODE_COUNT_CLASS)
+
+
+def bench(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    episode_page = load("episode.html")
+    title_page = load("title.html")
+    search_page = load("search.html")
+
+    cases = [
+        ("download links (episode page)",
+         lambda: baseline_download_holder(episode_page),
+         lambda: parsing.find_download_links_holder(episode_page)),
+        ("episode links (title page)",
+         lambda: baseline_episode_links(title_page, "one-piece"),
+         lambda: parsing.find_episode_links(title_page, "one-piece")),
+        ("episode count (title page)",
+         lambda: baseline_episode_count(title_page),
+         lambda: parsing.find_episode_count_paragraphs(title_page)),
+        ("episode count, regex (title page)",
+         lambda: baseline_episode_count(title_page),
+         lambda: parsing.find_episode_count(title_page)),
+        ("search cards (search page)",
+         lambda: baseline_search_cards(search_page),
+         lambda: parsing.find_search_cards(search_page)),
+    ]
+
+    print(f"Parser backend: {parsing.PARSER}")
+    print(f"{'extractor':<32}{'baseline ms':>14}{'targeted ms':>14}{'speedup':>10}")
+    for name, baseline, targeted in cases:
+        before = bench(baseline, args.repeat)
+        after = bench(targeted, args.repeat)
+        print(f"{name:<32}{before:>14.2f}{after:>14.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
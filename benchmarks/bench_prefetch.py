@@ -0,0 +1,113 @@
+"""
+Search result prefetch benchmark (prefetch.py) against the local mock server.
+
+Searches once, then "clicks into" each of the first --results results in turn, the
+way the GUI's Détails and Épisodes tabs do (the cover, then the episode list), and
+times each click. Each scenario runs in a fresh process and working directory, so
+with empty page and thumbnail caches:
+  * no prefetch:  every click fetches the title page and the cover,
+  * prefetch:     the results are prefetched as soon as the search returns, and the
+                  user reads the list for --read seconds before the first click,
+  * prefetch, no reading: the same with the first click right after the search,
+                  which waits for the prefetch of that result rather than fetch twice.
+Reports the median and worst click, the time until every result has been opened,
+and the requests made after the search (no page is ever fetched twice). Run with:
+
+    python benchmarks/bench_prefetch.py [--results N] [--read S] [--latency-ms N]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from bench_e2e import route_sessions  # noqa: E402
+from mock_server import serve  # noqa: E402
+
+QUERY = "naruto"
+
+
+def scenario(args):
+    # One user session: search, optionally prefetch, then click into each result.
+    from anime3rb_downloader import core, prefetch, telemetry
+
+    route_sessions(core, args.mock_url)
+    fetches = []
+    telemetry.subscribe(lambda e: e["event"] == telemetry.FETCH and fetches.append(e))
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            prefetcher = prefetch.Prefetcher()
+            anime_map = core.search(QUERY)
+            before = len(fetches)
+            if args.prefetch:
+                prefetcher.prefetch(anime_map, args.results)
+                time.sleep(args.read)
+            clicks = []
+            opened = time.perf_counter()
+            for data in list(anime_map.values())[:args.results]:
+                started = time.perf_counter()
+                cover = prefetcher.cover(data["image"])
+                episodes = prefetcher.episode_list(data["url"])
+                clicks.append(time.perf_counter() - started)
+                if not (cover and episodes):
+                    raise RuntimeError(f"click into {data['url']} failed")
+            opened = time.perf_counter() - opened
+            prefetcher.scheduler.shutdown()
+            requests = len(fetches) - before
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({"clicks": clicks, "opened": opened, "requests": requests}))
+
+
+def run(args, name, prefetch, read, mock_url, workdir):
+    run_dir = tempfile.mkdtemp(dir=workdir)
+    command = [sys.executable, os.path.abspath(__file__), "--scenario", "--mock-url", mock_url,
+               "--results", str(args.results), "--read", str(read)] + (["--prefetch"] if prefetch else [])
+    result = json.loads(subprocess.run(command, cwd=run_dir, check=True, capture_output=True).stdout.splitlines()[-1])
+    clicks = result["clicks"]
+    print(f"{name:<24}{statistics.median(clicks) * 1000:>12.1f}{max(clicks) * 1000:>11.1f}"
+          f"{result['opened'] * 1000:>12.1f}{result['requests']:>10}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--results", type=int, default=5, help="results clicked into (and prefetched)")
+    arg_parser.add_argument("--read", type=float, default=2.0, help="seconds spent reading the results")
+    arg_parser.add_argument("--latency-ms", type=float, default=150, help="per page and cover request")
+    arg_parser.add_argument("--scenario", action="store_true", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--prefetch", action="store_true", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.scenario:
+        scenario(args)
+        return
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(0, args.latency_ms / 1000, 1024, 0, port_queue), daemon=True)
+    server.start()
+    mock_url = f"http://127.0.0.1:{port_queue.get()}"
+    workdir = tempfile.mkdtemp(prefix="bench_prefetch_")
+    try:
+        print(f"{args.results} results clicked into, {args.latency_ms:g} ms per request, "
+              f"{args.read:g}s reading the results")
+        print(f"{'scenario':<24}{'median ms':>12}{'worst ms':>11}{'all ms':>12}{'requests':>10}")
+        run(args, "no prefetch", False, 0, mock_url, workdir)
+        run(args, "prefetch", True, args.read, mock_url, workdir)
+        run(args, "prefetch, no reading", True, 0, mock_url, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
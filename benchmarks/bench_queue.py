@@ -0,0 +1,137 @@
+"""
+Scaling benchmark of the shared work queue (workqueue.py) against the local mock server.
+
+Queues --episodes episodes, then runs 1, 2, ... --nodes worker processes, each in its
+own working directory (a separate "box" with its own journal and output folder),
+leasing from one queue: a sqlite file (--backend sqlite) or a coordinator on
+127.0.0.1 (--backend tcp). Video connections are paced to --throttle-kbps, so one
+node's throughput is bounded and adding nodes should scale the total. With
+--kill-after S the first node is killed S seconds into each run: its leases expire
+after --ttl seconds and the other nodes finish its episodes. Reports wall time,
+episodes/min, episodes per node and any episode downloaded by two nodes. Run with:
+
+    python benchmarks/bench_queue.py [--episodes N] [--nodes N] [--backend sqlite|tcp]
+                                     [--video-mb N] [--throttle-kbps N] [--kill-after S]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from bench_e2e import route_sessions, SLUG  # noqa: E402
+from mock_server import serve  # noqa: E402
+
+from anime3rb_downloader import workqueue  # noqa: E402
+
+
+def node(args):
+    # One worker node: downloads what it leases, printing nothing but its counts.
+    from anime3rb_downloader import batch, core
+
+    route_sessions(core, args.mock_url)
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        try:
+            counts = batch.run_queue_worker(workqueue.open_queue(args.queue), args.downloads, ttl=args.ttl)
+        finally:
+            sys.stdout = stdout
+    print(counts)
+
+
+def run(args, nodes, mock_url, workdir):
+    run_dir = os.path.join(workdir, f"{nodes}-nodes")
+    os.makedirs(run_dir)
+    queue_path = os.path.join(run_dir, "queue.sqlite3")
+    queue = workqueue.SqliteQueue(queue_path)
+    spec = queue_path
+    if args.backend == "tcp":
+        server = workqueue.QueueServer(("127.0.0.1", 0), queue)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        spec = f"tcp://127.0.0.1:{server.server_address[1]}"
+    queue.put([{"title": SLUG, "episode": n, "episodes": args.episodes, "url": f"https://anime3rb.com/episode/{SLUG}/{n}",
+                "quality": [1080, 720, 480]} for n in range(1, args.episodes + 1)])
+
+    wall = time.perf_counter()
+    processes = []
+    for index in range(nodes):
+        node_dir = os.path.join(run_dir, f"node-{index}")
+        os.makedirs(node_dir)
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--node", "--queue", spec, "--mock-url", mock_url,
+             "--downloads", str(args.downloads), "--ttl", str(args.ttl)],
+            cwd=node_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    killed = False
+    # Timed until the queue is drained: idle nodes only notice it at their next poll.
+    while True:
+        stats = queue.stats()
+        if stats["done"] + stats["failed"] == args.episodes or all(p.poll() is not None for p in processes):
+            break
+        if args.kill_after and nodes > 1 and not killed and time.perf_counter() - wall >= args.kill_after:
+            processes[0].kill()
+            killed = True
+        time.sleep(0.1)
+    wall = time.perf_counter() - wall
+    for process in processes:
+        process.wait()
+
+    per_node, seen, duplicates = [], set(), 0
+    for index in range(nodes):
+        output = os.path.join(run_dir, f"node-{index}", "output")
+        files = [name for name in os.listdir(output) if name.endswith(".mp4")] if os.path.isdir(output) else []
+        per_node.append(len(files))
+        duplicates += len(seen & set(files))
+        seen |= set(files)
+    if args.backend == "tcp":
+        server.shutdown()
+    print(f"{nodes:<7}{wall:>9.2f}{stats['done'] / wall * 60:>10.1f}{stats['done']:>7}{stats['failed']:>8}"
+          f"{duplicates:>6}  {per_node}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--episodes", type=int, default=12)
+    arg_parser.add_argument("--nodes", type=int, default=3)
+    arg_parser.add_argument("--backend", choices=("sqlite", "tcp"), default="sqlite")
+    arg_parser.add_argument("--video-mb", type=float, default=4)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=2048, help="per connection")
+    arg_parser.add_argument("--downloads", type=int, default=2, help="concurrent downloads per node")
+    arg_parser.add_argument("--ttl", type=float, default=6, help="lease duration in seconds")
+    arg_parser.add_argument("--kill-after", type=float, help="kill the first node after this many seconds")
+    arg_parser.add_argument("--node", action="store_true", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--queue", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--mock-url", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.node:
+        node(args)
+        return
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve, args=(0, 0.02, int(args.video_mb * 1024 * 1024), args.throttle_kbps * 1024, port_queue),
+        daemon=True)
+    server.start()
+    mock_url = f"http://127.0.0.1:{port_queue.get()}"
+    workdir = tempfile.mkdtemp(prefix="bench_queue_")
+    try:
+        print(f"{args.episodes} episodes of {args.video_mb:g} MB, {args.throttle_kbps:g} KB/s/conn, "
+              f"{args.downloads} downloads per node, {args.backend} queue"
+              + (f", first node killed after {args.kill_after:g}s (lease ttl {args.ttl:g}s)" if args.kill_after else ""))
+        print(f"{'nodes':<7}{'wall s':>9}{'ep/min':>10}{'done':>7}{'failed':>8}{'dup':>6}  episodes per node")
+        for nodes in range(1, args.nodes + 1):
+            run(args, nodes, mock_url, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
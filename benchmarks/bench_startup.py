@@ -0,0 +1,104 @@
+"""
+Startup-time benchmark of the command line, against the local mock server.
+
+Times fresh interpreter processes, --runs times each, and reports the median and best:
+  * python:        the bare interpreter (`python -c pass`), the floor of everything below,
+  * import core:   `import anime3rb_downloader.core`, the cost of embedding the library,
+  * cli --help:    `anime3rb_dl --help` (through `python -m`),
+  * first request: importing the CLI and fetching one title page (its episode count)
+                   from the mock server, bypassing the page cache, then exiting.
+With --baseline REF the same commands also run against the package as of git commit
+REF (exported to a temporary directory), for a before/after comparison. Run with:
+
+    python benchmarks/bench_startup.py [--runs N] [--baseline REF]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, BENCHMARKS)
+
+from mock_server import serve  # noqa: E402
+
+SLUG = "one-piece"
+
+FIRST_REQUEST = """
+import sys
+from anime3rb_downloader import cli_downloader as cli
+cli.refresh_cache = True
+sys.exit(0 if cli.fetch_episode_count(sys.argv[1]) else 1)
+"""
+
+
+def commands(title_url):
+    return [
+        ("python", ["-c", "pass"]),
+        ("import core", ["-c", "import anime3rb_downloader.core"]),
+        ("cli --help", ["-m", "anime3rb_downloader.cli_downloader", "--help"]),
+        ("first request", ["-c", FIRST_REQUEST, title_url]),
+    ]
+
+
+def time_command(args, src, workdir, runs):
+    """Runs `python args` `runs` times with `src` first on the path; returns the wall times in seconds."""
+    env = dict(os.environ, PYTHONPATH=src + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE)
+        times.append(time.perf_counter() - started)
+        if result.returncode:
+            raise RuntimeError(f"{args[:2]} failed:\n{result.stderr.decode(errors='replace')}")
+    return times
+
+
+def export(ref, workdir):
+    """Writes the src/ tree of git commit `ref` under `workdir` and returns its path."""
+    archive = subprocess.run(["git", "archive", ref, "src"], cwd=ROOT, check=True, capture_output=True).stdout
+    subprocess.run(["tar", "-x", "-C", workdir], input=archive, check=True)
+    return os.path.join(workdir, "src")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--runs", type=int, default=10)
+    arg_parser.add_argument("--baseline", metavar="REF", help="also time the package as of this git commit")
+    args = arg_parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(0, 0, 1024, 0, port_queue), daemon=True)
+    server.start()
+    title_url = f"http://127.0.0.1:{port_queue.get()}/titles/{SLUG}"
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        trees = [("current", os.path.join(ROOT, "src"))]
+        if args.baseline:
+            baseline_dir = os.path.join(workdir, "baseline")
+            os.makedirs(baseline_dir)
+            trees.insert(0, (args.baseline, export(args.baseline, baseline_dir)))
+        print(f"{args.runs} runs per command, fresh interpreter each")
+        print(f"{'command':<16}{'tree':<12}{'median ms':>11}{'best ms':>10}")
+        for name, command in commands(title_url):
+            for tree, src in trees:
+                if name == "import core" and not os.path.exists(os.path.join(src, "anime3rb_downloader", "core.py")):
+                    print(f"{name:<16}{tree:<12}{'-':>11}{'-':>10}")
+                    continue
+                run_dir = tempfile.mkdtemp(dir=workdir)
+                times = time_command(command, src, run_dir, args.runs)
+                print(f"{name:<16}{tree:<12}{statistics.median(times) * 1000:>11.1f}{min(times) * 1000:>10.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
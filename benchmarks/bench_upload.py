@@ -0,0 +1,103 @@
+"""
+Benchmark of the Facebook upload against the local Graph stand-in (benchmarks/mock_graph.py):
+  * single: one multipart POST per file, one file after the other (the former GUI code),
+  * resumable: upload.upload_files (chunked resumable protocol, --concurrency files at a time).
+Each server connection is throttled to --throttle-kbps, and --fail-rate of the requests fail.
+A failure costs the single-POST path its whole file. The uploaded bytes are checked
+against the files' sha256. Run with:
+
+    python benchmarks/bench_upload.py [--files N] [--file-mb N] [--chunk-mb N]
+                                      [--throttle-kbps N] [--fail-rate F] [--concurrency N]
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+from mock_graph import serve  # noqa: E402
+
+from anime3rb_downloader import upload  # noqa: E402
+
+PAGE_ID = "1234"
+
+
+def upload_single(paths, graph_url, retries=20):
+    """The former GUI upload: one POST with the whole file, retried from zero on failure."""
+    for path in paths:
+        for _ in range(retries):
+            try:
+                with open(path, "rb") as f:
+                    response = requests.post(f"{graph_url}/{PAGE_ID}/videos", params={"access_token": "token"},
+                                             files={"source": f})
+                if response.ok:
+                    break
+            except requests.ConnectionError:
+                pass
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--files", type=int, default=4)
+    arg_parser.add_argument("--file-mb", type=float, default=32)
+    arg_parser.add_argument("--chunk-mb", type=float, default=4)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=16 * 1024, help="per connection, 0 = unthrottled")
+    arg_parser.add_argument("--fail-rate", type=float, default=0.05)
+    arg_parser.add_argument("--concurrency", type=int, default=upload.DEFAULT_UPLOAD_CONCURRENCY)
+    args = arg_parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(
+        target=serve,
+        args=(0, int(args.chunk_mb * 1024 * 1024), args.throttle_kbps * 1024, args.fail_rate, port_queue),
+        daemon=True,
+    )
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get()}"
+    graph_url = f"{base_url}/v18.0"
+
+    workdir = tempfile.mkdtemp(prefix="bench_upload_")
+    try:
+        paths, digests = [], set()
+        for n in range(args.files):
+            path = os.path.join(workdir, f"video-ep-{n + 1}.mp4")
+            data = os.urandom(int(args.file_mb * 1024 * 1024))
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+            digests.add(hashlib.sha256(data).hexdigest())
+        total_mb = args.files * args.file_mb
+        print(f"{args.files} files of {args.file_mb:g} MB, chunks of {args.chunk_mb:g} MB, "
+              f"{args.throttle_kbps:g} KB/s/conn, fail rate {args.fail_rate:g}")
+        print(f"{'path':<11}{'wall s':>9}{'MB/s':>9}  verified")
+
+        wall = time.perf_counter()
+        upload_single(paths, graph_url)
+        wall = time.perf_counter() - wall
+        print(f"{'single':<11}{wall:>9.2f}{total_mb / wall:>9.1f}  -")
+
+        store = upload.UploadStore(os.path.join(workdir, "uploads.sqlite3"))
+        wall = time.perf_counter()
+        results = upload.upload_files(paths, PAGE_ID, "token", concurrency=args.concurrency, store=store,
+                                      graph_url=graph_url)
+        wall = time.perf_counter() - wall
+        uploaded = {state["sha256"] for state in requests.get(f"{base_url}/uploads").json().values()
+                    if state["finished"]}
+        errors = [error for _, _, error in results if error]
+        verified = "yes" if digests <= uploaded and not errors else f"NO ({errors})"
+        print(f"{'resumable':<11}{wall:>9.2f}{total_mb / wall:>9.1f}  {verified}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Graph API video endpoint, for exercising upload.py.
+
+    POST /<version>/<page>/videos   upload_phase=start|transfer|finish (resumable protocol),
+                                    or a single multipart POST with a "source" file
+    GET  /uploads                   JSON state of every upload session (bytes received, sha256...)
+
+Transfer windows are --chunk-mb long. Request bodies are read at --throttle-kbps per
+connection (0 = unthrottled), and --fail-rate of the requests fail at random (a 500, a
+transient Graph error or a dropped connection) to exercise the retries. Run standalone with:
+
+    python benchmarks/mock_graph.py [--port N] [--chunk-mb N] [--throttle-kbps N] [--fail-rate F]
+
+and point upload.upload_video(..., graph_url="http://127.0.0.1:<port>/v18.0") at it.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+READ_BLOCK = 64 * 1024
+
+
+def parse_form(content_type, body):
+    """Returns the fields of an urlencoded or multipart body as {name: str or bytes}."""
+    if not content_type.startswith("multipart/"):
+        return dict(parse_qsl(body.decode("utf-8")))
+    message = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        fields[name] = payload if part.get_filename() else payload.decode("utf-8")
+    return fields
+
+
+class MockGraph:
+    """Upload sessions of the stand-in; `handler()` returns the request handler class."""
+
+    def __init__(self, chunk_size=4 * 1024 * 1024, throttle=0, fail_rate=0.0):
+        self.chunk_size = chunk_size
+        self.throttle = throttle
+        self.fail_rate = fail_rate
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def window(self, upload):
+        start = upload["received"]
+        return {"start_offset": str(start), "end_offset": str(min(upload["size"], start + self.chunk_size))}
+
+    def videos(self, fields):
+        """Handles one POST to /videos; returns (status, answer)."""
+        phase = fields.get("upload_phase")
+        if phase is None and isinstance(fields.get("source"), bytes):
+            with self._lock:
+                video_id = str(next(self._ids))
+            return 200, {"id": video_id}
+        if phase == "start":
+            with self._lock:
+                video_id = str(next(self._ids))
+                upload = self.sessions[f"s{video_id}"] = {
+                    "video_id": video_id, "size": int(fields["file_size"]), "received": 0,
+                    "sha256": hashlib.sha256(), "chunks": 0, "finished": False, "title": None,
+                }
+            return 200, {"video_id": video_id, "upload_session_id": f"s{video_id}", **self.window(upload)}
+        upload = self.sessions.get(fields.get("upload_session_id"))
+        if upload is None:
+            return 400, {"error": {"message": "Invalid upload session", "code": 6000, "is_transient": False}}
+        with self._lock:
+            if phase == "transfer":
+                if int(fields.get("start_offset", -1)) != upload["received"]:
+                    return 400, {"error": {"message": "Wrong start_offset", "code": 6001, "is_transient": False,
+                                           "error_data": self.window(upload)}}
+                chunk = fields.get("video_file_chunk") or b""
+                upload["received"] += len(chunk)
+                upload["sha256"].update(chunk)
+                upload["chunks"] += 1
+                return 200, self.window(upload)
+            if phase == "finish":
+                if upload["received"] != upload["size"]:
+                    return 400, {"error": {"message": "Upload incomplete", "code": 6002, "is_transient": False}}
+                upload.update(finished=True, title=fields.get("title"))
+                return 200, {"success": True}
+        return 400, {"error": {"message": f"Unknown upload_phase {phase!r}", "code": 100, "is_transient": False}}
+
+    def state(self):
+        with self._lock:
+            return {session_id: {**{k: v for k, v in upload.items() if k != "sha256"},
+                                 "sha256": upload["sha256"].hexdigest()}
+                    for session_id, upload in self.sessions.items()}
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, answer):
+                body = json.dumps(answer).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body, began = bytearray(), time.monotonic()
+                while len(body) < length:
+                    block = self.rfile.read(min(READ_BLOCK, length - len(body)))
+                    if not block:
+                        break
+                    body += block
+                    if mock.throttle:
+                        ahead = len(body) / mock.throttle - (time.monotonic() - began)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                return bytes(body)
+
+            def do_GET(self):
+                if urlsplit(self.path).path == "/uploads":
+                    self.send_json(200, mock.state())
+                else:
+                    self.send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                body = self.read_body()
+                if not re.fullmatch(r"/v[\d.]+/[\w-]+/videos/?", urlsplit(self.path).path):
+                    self.send_json(404, {"error": {"message": "Not found"}})
+                    return
+                if mock.fail_rate and random.random() < mock.fail_rate:
+                    failure = random.choice(("500", "transient", "drop"))
+                    if failure == "drop":
+                        self.close_connection = True
+                        return
+                    if failure == "500":
+                        self.send_json(500, {"error": {"message": "Internal error"}})
+                    else:
+                        self.send_json(400, {"error": {"message": "Temporary failure", "code": 390,
+                                                       "is_transient": True}})
+                    return
+                self.send_json(*mock.videos(parse_form(self.headers.get("Content-Type", ""), body)))
+
+        return Handler
+
+
+def serve(port=0, chunk_size=4 * 1024 * 1024, throttle=0, fail_rate=0.0, port_queue=None):
+    """Runs the stand-in forever; the bound port is put on `port_queue` when given."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockGraph(chunk_size, throttle, fail_rate).handler())
+    server.daemon_threads = True
+    if port_queue is not None:
+        port_queue.put(server.server_address[1])
+    print(f"Mock Graph API listening on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--port", type=int, default=8001)
+    arg_parser.add_argument("--chunk-mb", type=float, default=4)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=0)
+    arg_parser.add_argument("--fail-rate", type=float, default=0)
+    args = arg_parser.parse_args()
+    serve(args.port, int(args.chunk_mb * 1024 * 1024), args.throttle_kbps * 1024, args.fail_rate)
+
+
+if __name__ == "__main__":
+    main()
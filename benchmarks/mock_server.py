@@ -0,0 +1,233 @@
+"""
+Local stand-in for anime3rb.com and its video CDN, serving the HTML fixtures in
+benchmarks/fixtures/ and synthetic video files with Range support.
+
+    /search?q=...              search.html
+    /titles/<slug>[?page=N]    title.html (slug substituted); with --episodes/--per-page,
+                               its episode list regenerated and split in pages of
+                               --per-page episodes linked by rel="next"/"prev"
+    /episode/<slug>/<n>        episode.html, with per-episode signed video links
+    /storage/covers/<slug>.jpg a 480x720 cover image (PNG data)
+    /download/<name>.mp4       <video-mb> MB of synthetic data, Range aware
+
+Page responses are delayed by --latency-ms and carry an ETag (If-None-Match is
+answered with 304); video responses are paced to --throttle-kbps per connection
+(0 = unthrottled), or to the rate of the first --slow PART=KBPS whose PART is in the
+video's path (e.g. --slow 1080p=200 for a crawling 1080p mirror). Run standalone with:
+
+    python benchmarks/mock_server.py [--port N] [--latency-ms N] [--video-mb N] [--throttle-kbps N]
+                                     [--slow PART=KBPS ...] [--episodes N] [--per-page N]
+
+Requests for https://anime3rb.com/... and https://video.vid3rb.com/... must be routed
+to it; bench_e2e.py does so with MockAdapter.
+"""
+import argparse
+import hashlib
+import os
+import re
+import struct
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+from requests.adapters import HTTPAdapter
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_SLUG = b"one-piece"
+FIXTURE_EPISODE = b"one-piece-12-"
+FIXTURE_EXPIRES = b"expires=1760000000"
+FIXTURE_COUNT = b'<p class="text-lg leading-relaxed">220'
+EPISODE_CARD = ('<a href="https://anime3rb.com/episode/{slug}/{n}" class="video-card rounded-lg overflow-hidden bg-white '
+                'dark:bg-dark-700"><img loading="lazy" src="https://anime3rb.com/storage/thumbs/{slug}-{n}.jpg" '
+                'alt="الحلقة {n}"><div class="p-2"><span class="text-sm">الحلقة {n}</span><span class="text-xs '
+                'text-gray-400">24 دقيقة</span></div></a>\n')
+BLOCK_SIZE = 64 * 1024
+LINK_LIFETIME = 3600
+COVER_SIZE = (480, 720)
+
+
+def png(width, height):
+    """A noisy RGB PNG of width x height (rows drawn from a few random ones, so it compresses like a cover)."""
+    rows = [b"\x00" + os.urandom(width * 3) for _ in range(16)]
+    raw = b"".join(rows[(y * 7) % len(rows)] for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class MockAnime3rb:
+    """Fixture pages and synthetic videos; `handler()` returns the request handler class."""
+
+    def __init__(self, latency=0.05, video_size=32 * 1024 * 1024, throttle=0, slow=None, episodes=None, per_page=0):
+        self.latency = latency
+        self.video_size = video_size
+        self.throttle = throttle
+        # {path part: bytes per second} overriding `throttle` for matching videos.
+        self.slow = dict(slow or {})
+        self.pages = {name: load(f"{name}.html") for name in ("search", "title", "episode")}
+        self.cover = png(*COVER_SIZE)
+        # Title pages list `episodes` episodes (the fixture's own list when None), `per_page` a page (0 = all).
+        self.episodes = episodes
+        self.per_page = per_page
+        if episodes or per_page:
+            title = self.pages["title"]
+            section = title.index(b">", title.index(b'<section class="videos-list')) + 1
+            self.title_parts = (title[:section].replace(FIXTURE_COUNT, FIXTURE_COUNT[:-3] + str(episodes or 220).encode()),
+                                title[title.index(b"</section>", section):])
+        # The same random block repeated: cheap to serve, incompressible per block.
+        self.block = os.urandom(BLOCK_SIZE)
+
+    def title_page(self, slug, page):
+        total = self.episodes or 220
+        per_page = self.per_page or total
+        first = (page - 1) * per_page + 1
+        cards = "".join(EPISODE_CARD.format(slug=slug, n=n) for n in range(first, min(first + per_page, total + 1)))
+        links = "".join(f'<a href="https://anime3rb.com/titles/{slug}?page={number}" rel="{rel}">{rel}</a>'
+                        for number, rel in ((page - 1, "prev"), (page + 1, "next"))
+                        if 1 <= number and (number - 1) * per_page < total)
+        head, tail = self.title_parts
+        return (head.replace(FIXTURE_SLUG, slug.encode()) + cards.encode() + b"</section>"
+                + f'<nav role="navigation" aria-label="Pagination Navigation">{links}</nav>'.encode()
+                + tail[len(b"</section>"):].replace(FIXTURE_SLUG, slug.encode()))
+
+    def page(self, path, query=""):
+        match = re.fullmatch(r"/episode/([\w-]+)/(\d+)/?", path)
+        if match:
+            slug, number = match.group(1).encode(), match.group(2).encode()
+            expires = str(int(time.time()) + LINK_LIFETIME).encode()
+            return (self.pages["episode"].replace(FIXTURE_EPISODE, slug + b"-" + number + b"-")
+                    .replace(FIXTURE_EXPIRES, b"expires=" + expires))
+        match = re.fullmatch(r"/titles/([\w-]+)/?", path)
+        if match and (self.episodes or self.per_page):
+            return self.title_page(match.group(1), int((re.search(r"page=(\d+)", query) or [0, 1])[1]))
+        if match:
+            return self.pages["title"].replace(FIXTURE_SLUG, match.group(1).encode())
+        if path == "/search":
+            return self.pages["search"]
+        if re.fullmatch(r"/storage/covers/[\w-]+\.jpg", path):
+            return self.cover
+        return None
+
+    def handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_HEAD(self):
+                self.do_GET(head=True)
+
+            def do_GET(self, head=False):
+                path = urlsplit(self.path).path
+                if path.startswith("/download/"):
+                    self.send_video(head, path)
+                    return
+                time.sleep(mock.latency)
+                body = mock.page(path, urlsplit(self.path).query)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "image/png" if path.startswith("/storage/") else "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def send_video(self, head, path):
+                size = mock.video_size
+                throttle = next((rate for part, rate in mock.slow.items() if part in path), mock.throttle)
+                start, end = 0, size - 1
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if head:
+                    return
+                view = memoryview(mock.block)
+                offset, began = start, time.monotonic()
+                try:
+                    while offset <= end:
+                        position = offset % BLOCK_SIZE
+                        chunk = view[position:min(BLOCK_SIZE, position + end + 1 - offset)]
+                        self.wfile.write(chunk)
+                        offset += len(chunk)
+                        if throttle:
+                            ahead = (offset - start) / throttle - (time.monotonic() - began)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+def serve(port=0, latency=0.05, video_size=32 * 1024 * 1024, throttle=0, port_queue=None, slow=None, episodes=None,
+          per_page=0):
+    """Runs the mock server forever; the bound port is put on `port_queue` when given."""
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 MockAnime3rb(latency, video_size, throttle, slow, episodes, per_page).handler())
+    server.daemon_threads = True
+    if port_queue is not None:
+        port_queue.put(server.server_address[1])
+    print(f"Mock anime3rb listening on http://127.0.0.1:{server.server_address[1]}")
+    server.serve_forever()
+
+
+class MockAdapter(HTTPAdapter):
+    """Transport adapter sending every request to the mock server, keeping path and query."""
+
+    def __init__(self, base_url, **kwargs):
+        self.base = urlsplit(base_url)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        request.url = urlunsplit((self.base.scheme, self.base.netloc, url.path, url.query, ""))
+        return super().send(request, **kwargs)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--port", type=int, default=8000)
+    arg_parser.add_argument("--latency-ms", type=float, default=50)
+    arg_parser.add_argument("--video-mb", type=float, default=32)
+    arg_parser.add_argument("--throttle-kbps", type=float, default=0)
+    arg_parser.add_argument("--slow", action="append", default=[], metavar="PART=KBPS")
+    arg_parser.add_argument("--episodes", type=int, help="episodes listed on title pages (default: the fixture's 220)")
+    arg_parser.add_argument("--per-page", type=int, default=0, help="episodes per title page (0 = all on one page)")
+    args = arg_parser.parse_args()
+    slow = {part: float(rate) * 1024 for part, rate in (item.split("=", 1) for item in args.slow)}
+    serve(args.port, args.latency_ms / 1000, int(args.video_mb * 1024 * 1024), args.throttle_kbps * 1024, slow=slow,
+          episodes=args.episodes, per_page=args.per_page)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,10 @@ setup(
         'tqdm',
         'gradio',
     ],
+    extras_require={
+        'fast': ['lxml'],
+        'yaml': ['PyYAML'],
+    },
     entry_points={
         'console_scripts': [
             'anime3rb_dl=anime3rb_downloader.cli_downloader:main',
@@ -0,0 +1,194 @@
+import threading
+import time
+
+# --- Global bandwidth governor ---
+# Every download moves its bytes through one process-wide Governor, so the aggregate
+# rate of all workers stays under a cap (0 = unlimited) instead of each connection
+# pulling at full speed. A download registers one Transfer (whatever its number of
+# connections) with a weight; the bytes are paid for after each read of the IOEngine.
+# When reads have to wait, the waiting transfer that has received the least bytes per
+# unit of weight goes first (weighted fair queuing): transfers of equal weight get equal
+# shares, a weight 2 transfer twice as much, and a share one transfer cannot use (a slow
+# mirror) goes to the others. The cap may follow a time-of-day schedule:
+#
+#   "01:00-07:00=0,07:00-01:00=2048"    unlimited at night, 2048 KB/s during the day
+#
+# Windows may wrap past midnight; the first matching window wins, and outside every
+# window the base cap applies. Without a cap or schedule, reads skip the governor.
+
+# Bytes the bucket may hold, in seconds of the cap.
+BURST_SECONDS = 0.5
+# A waiting read re-checks the schedule at least this often.
+MAX_WAIT = 1.0
+# Reads of a shaped transfer stay below its share of `interval` seconds, down to this size.
+MIN_SHAPED_READ = 16 * 1024
+
+
+def parse_schedule(text):
+    """
+    Parses "HH:MM-HH:MM=KBPS,..." into [(start_minute, end_minute, bytes_per_second)].
+    Raises ValueError on a malformed window.
+    """
+    schedule = []
+    for window in (text or "").split(","):
+        window = window.strip()
+        if not window:
+            continue
+        try:
+            hours, rate = window.split("=")
+            start, end = hours.split("-")
+            start, end = _minutes(start), _minutes(end, end=True)
+            rate = float(rate) * 1024
+        except ValueError:
+            raise ValueError(f"Invalid bandwidth window {window!r} (expected HH:MM-HH:MM=KBPS)")
+        if rate < 0:
+            raise ValueError(f"Invalid bandwidth window {window!r}: negative rate")
+        schedule.append((start, end, rate))
+    return schedule
+
+
+def _minutes(text, end=False):
+    # Minute of the day of "HH:MM"; 24:00 is only valid as the `end` of a window.
+    hours, minutes = text.strip().split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= minutes < 60 and (0 <= hours < 24 or (end and hours == 24 and minutes == 0))):
+        raise ValueError(text)
+    return hours * 60 + minutes
+
+
+class Transfer:
+    """One download's claim on the governor (see Governor.transfer)."""
+
+    def __init__(self, governor, weight=1.0, name=None):
+        self.governor = governor
+        self.weight = max(float(weight), 0.01)
+        self.name = name
+        # Bytes received per unit of weight, on the governor's clock.
+        self.virtual = 0.0
+        self.waiting = 0
+
+    def consume(self, n):
+        """
+        Pays for `n` bytes just read, blocking while the transfer is over its share.
+        Returns the transfer's current fair share in bytes/s, or None when unshaped.
+        """
+        return self.governor.consume(self, n)
+
+    def __repr__(self):
+        return f"Transfer({self.name!r}, weight={self.weight:g})"
+
+
+class Governor:
+    """Aggregate cap shared by every transfer, with weighted fair sharing. Safe to share between threads."""
+
+    def __init__(self, rate=0, schedule=None):
+        self.rate = float(rate or 0)
+        self.schedule = list(schedule or [])
+        self.tokens = 0.0
+        self._updated = time.monotonic()
+        self._clock = 0.0
+        self._transfers = set()
+        self._cond = threading.Condition()
+
+    def configure(self, rate=None, schedule=None):
+        """Changes the base cap (bytes/s, 0 = unlimited) and/or the schedule; applies to running transfers."""
+        with self._cond:
+            if rate is not None:
+                self.rate = float(rate)
+            if schedule is not None:
+                self.schedule = list(schedule)
+            self._cond.notify_all()
+
+    @property
+    def shaping(self):
+        return bool(self.rate or self.schedule)
+
+    def current_rate(self, now=None):
+        """The cap in force at local time `now` (seconds since the epoch), in bytes/s; 0 = unlimited."""
+        if not self.schedule:
+            return self.rate
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.schedule:
+            if (start <= minute < end) if start <= end else (minute >= start or minute < end):
+                return rate
+        return self.rate
+
+    def fair_share(self, weight=1.0):
+        """Bytes/s a transfer of `weight` gets when every registered transfer is busy; 0 = unlimited."""
+        rate = self.current_rate()
+        with self._cond:
+            total = sum(transfer.weight for transfer in self._transfers) or weight
+        return rate * weight / total if rate else 0
+
+    def transfer(self, weight=1.0, name=None):
+        """Context manager registering a Transfer for the duration of one download."""
+        return _Registration(self, Transfer(self, weight, name))
+
+    def _register(self, transfer):
+        with self._cond:
+            # A newcomer starts level with the others instead of claiming the bytes it never received.
+            transfer.virtual = max(transfer.virtual, self._clock)
+            self._transfers.add(transfer)
+
+    def _unregister(self, transfer):
+        with self._cond:
+            self._transfers.discard(transfer)
+            self._cond.notify_all()
+
+    def consume(self, transfer, n):
+        if not self.shaping:
+            return None
+        with self._cond:
+            transfer.waiting += 1
+            try:
+                while True:
+                    rate = self.current_rate()
+                    if not rate:
+                        break
+                    now = time.monotonic()
+                    self.tokens = min(rate * BURST_SECONDS, self.tokens + (now - self._updated) * rate)
+                    self._updated = now
+                    if self.tokens > 0 and self._is_next(transfer):
+                        # The bucket may go into debt by one read; later reads wait it off.
+                        self.tokens -= n
+                        break
+                    wait = -self.tokens / rate if self.tokens <= 0 else MAX_WAIT
+                    self._cond.wait(min(max(wait, 0.001), MAX_WAIT))
+                self._clock = max(self._clock, transfer.virtual)
+                transfer.virtual += n / transfer.weight
+            finally:
+                transfer.waiting -= 1
+                self._cond.notify_all()
+            if not rate:
+                return None
+            total = sum(t.weight for t in self._transfers) or transfer.weight
+        return rate * transfer.weight / total
+
+    def _is_next(self, transfer):
+        # True if no other waiting transfer is further behind (ties go to the caller).
+        return all(transfer.virtual <= t.virtual for t in self._transfers if t.waiting and t is not transfer)
+
+
+class _Registration:
+    def __init__(self, governor, transfer):
+        self.governor = governor
+        self.transfer = transfer
+
+    def __enter__(self):
+        self.governor._register(self.transfer)
+        return self.transfer
+
+    def __exit__(self, *exc):
+        self.governor._unregister(self.transfer)
+        return False
+
+
+governor = Governor()
+
+
+def configure(max_kbps=None, schedule=None):
+    """Sets the shared governor's cap in KB/s (0 = unlimited) and/or its schedule (text or parsed)."""
+    if isinstance(schedule, str):
+        schedule = parse_schedule(schedule)
+    governor.configure(max_kbps * 1024 if max_kbps is not None else None, schedule)
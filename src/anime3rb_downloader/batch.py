@@ -0,0 +1,346 @@
+import itertools
+import json
+import os
+import shutil
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from anime3rb_downloader import cli_downloader as cli
+from anime3rb_downloader import core, workqueue
+from anime3rb_downloader.journal import DownloadJournal
+from anime3rb_downloader.scheduler import Scheduler, CANCELLED
+
+# --- Batch / daemon mode ---
+# Runs download jobs without any prompt. A job file (JSON, or YAML when PyYAML is
+# installed) lists titles with an optional episode range and quality preference:
+#
+#   {"concurrency": 4, "quality": [1080, 720, 480],
+#    "jobs": [{"url": "https://anime3rb.com/titles/naruto", "start": 1, "end": 20, "quality": [720]}]}
+#
+# ("jobs" may also be given as a bare list.) Every title shares one Scheduler, so
+# `concurrency` bounds the downloads of the whole batch. A job's optional "weight"
+# (default 1) is the share of the bandwidth cap each of its downloads gets. A summary with the outcome
+# of every episode is returned as a JSON-serialisable dict. In daemon mode the same
+# runner stays up and takes new jobs from a local TCP socket and/or a watched directory,
+# and can sync the follow list (follow.py) periodically.
+#
+# Several machines can also share one backlog: enqueue_job_file() expands a job file
+# into one workqueue job per episode, and run_queue_worker() leases and downloads them
+# (see workqueue.py).
+
+DEFAULT_CONCURRENCY = 3
+# Titles of one batch whose pages are resolved at the same time.
+TITLE_WORKERS = 4
+WATCH_INTERVAL = 5
+JOB_FILE_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+def load_job_file(path):
+    """Reads a JSON or YAML job file and returns its settings dict (see the module comment)."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML job files need PyYAML (pip install anime3rb_downloader[yaml])")
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    return parse_jobs(data)
+
+
+def parse_jobs(data):
+    """Normalises a job document (dict with "jobs", a list of jobs, or a single job) into a settings dict."""
+    if isinstance(data, list):
+        data = {"jobs": data}
+    elif isinstance(data, dict) and "jobs" not in data:
+        data = {"jobs": [data]}
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list):
+        raise ValueError("A job file must hold a list of jobs or an object with a \"jobs\" list")
+    default_quality = data.get("quality")
+    jobs = []
+    for job in data["jobs"]:
+        if isinstance(job, str):
+            job = {"url": job}
+        if not isinstance(job, dict) or not job.get("url") or "/titles/" not in job["url"]:
+            raise ValueError(f"Invalid job (needs an anime3rb title url): {job!r}")
+        quality = job.get("quality", default_quality) or cli.QUALITY_PREFERENCE
+        if not isinstance(quality, (list, tuple)):
+            quality = [quality]
+        jobs.append({
+            "url": job["url"].strip(),
+            "start": int(job.get("start", 1)),
+            "end": int(job["end"]) if job.get("end") else None,
+            "quality": [int(str(q).rstrip("p")) for q in quality],
+            "weight": float(job.get("weight", 1)),
+        })
+    return {"jobs": jobs, "concurrency": data.get("concurrency")}
+
+
+class BatchRunner:
+    """Runs batches of title jobs on one shared download Scheduler. Safe to share between threads."""
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY):
+        self.concurrency = concurrency or DEFAULT_CONCURRENCY
+        self.scheduler = Scheduler(self.concurrency, max_pending=self.concurrency * 2)
+        if cli.journal is None:
+            cli.journal = DownloadJournal()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._batches = {}
+
+    def run(self, jobs, batch_id=None):
+        """Runs a list of parsed jobs to completion and returns the batch summary."""
+        batch_id = batch_id or next(self._ids)
+        summary = {"id": batch_id, "state": "running", "started_at": time.time(), "finished_at": None,
+                   "titles": [], "counts": {}}
+        with self._lock:
+            self._batches[batch_id] = summary
+        with ThreadPoolExecutor(max_workers=TITLE_WORKERS) as executor:
+            summary["titles"] = list(executor.map(
+                lambda indexed: self._run_title(indexed[1], (batch_id, indexed[0])), enumerate(jobs)))
+        counts = {}
+        for title in summary["titles"]:
+            for status in title["episodes"].values():
+                counts[status] = counts.get(status, 0) + 1
+            if title["error"]:
+                counts["title_errors"] = counts.get("title_errors", 0) + 1
+        summary.update(state="done", finished_at=time.time(), counts=counts)
+        return summary
+
+    def submit(self, jobs, on_done=None):
+        """Runs a batch in the background and returns its id; `on_done(summary)` is called at the end."""
+        batch_id = next(self._ids)
+
+        def run():
+            summary = self.run(jobs, batch_id)
+            if on_done:
+                on_done(summary)
+
+        threading.Thread(target=run, daemon=True).start()
+        return batch_id
+
+    def status(self, batch_id=None):
+        """Returns the (live) summary of one batch, or of every batch."""
+        with self._lock:
+            if batch_id is not None:
+                return self._batches.get(batch_id)
+            return list(self._batches.values())
+
+    def shutdown(self, cancel_pending=False):
+        self.scheduler.shutdown(cancel_pending)
+
+    def _run_title(self, job, priority):
+        url = job["url"]
+        title = {"url": url, "anime": None, "episodes": {}, "error": None}
+        try:
+            anime_name = title["anime"] = cli.get_anime_name(url)
+            episodes_cnt = cli.fetch_episode_count(url)
+            if not episodes_cnt:
+                title["error"] = "episode count not found"
+                return title
+            start = max(1, job["start"])
+            end = min(episodes_cnt, job["end"] or episodes_cnt)
+            for number in range(start, end + 1):
+                if cli.journal.is_done(anime_name, number):
+                    title["episodes"][str(number)] = "skipped"
+            links = cli.get_download_links(url, anime_name, episodes_cnt, start, end, job["quality"])
+            jobs = cli.start_downloads(anime_name, episodes_cnt, links, self.scheduler, priority, job["quality"],
+                                       job.get("weight", 1))
+            for number, download in jobs.items():
+                if download is None:
+                    status = "no_link"
+                else:
+                    done = download.wait()
+                    status = "done" if done else ("cancelled" if download.state == CANCELLED else "failed")
+                title["episodes"][str(number)] = status
+        except Exception as e:
+            print(f"Job for {url} failed: {e}")
+            title["error"] = str(e)
+        return title
+
+
+def run_job_file(path, concurrency=None, summary_path=None):
+    """Runs every job of a job file and writes the summary (JSON) to `summary_path` or stdout."""
+    settings = load_job_file(path)
+    runner = BatchRunner(concurrency or settings["concurrency"])
+    try:
+        summary = runner.run(settings["jobs"])
+    finally:
+        runner.shutdown()
+    write_summary(summary, summary_path)
+    return summary
+
+
+def write_summary(summary, path=None):
+    data = json.dumps(summary, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        sys.stdout.write(data + "\n")
+
+
+# --- Shared queue ---
+
+def episode_jobs(jobs):
+    """Expands parsed title jobs into workqueue jobs, one per episode, walking each title's episode listing."""
+    for priority, job in enumerate(jobs):
+        url = job["url"]
+        anime_name = cli.get_anime_name(url)
+        episodes_cnt = cli.fetch_episode_count(url)
+        if not episodes_cnt:
+            print(f"Episode count of {url} not found, skipping it.")
+            continue
+        for number, episode_url in core.iter_episodes(url, job["start"], min(episodes_cnt, job["end"] or episodes_cnt),
+                                                      refresh=cli.refresh_cache):
+            yield {"title": anime_name, "episode": number, "episodes": episodes_cnt, "url": episode_url,
+                   "quality": job["quality"], "weight": job.get("weight", 1), "priority": priority}
+
+
+def enqueue_job_file(path, queue):
+    """Adds the episodes of a job file to a shared queue; returns how many were not queued already."""
+    jobs = list(episode_jobs(load_job_file(path)["jobs"]))
+    added = queue.put(jobs)
+    print(f"Queued {added} new episode(s) of {len(jobs)}.")
+    return added
+
+
+def run_queue_worker(queue, concurrency=None, until_empty=True, ttl=workqueue.LEASE_TTL):
+    """
+    Leases episodes from a shared queue and downloads them, `concurrency` at a time, until
+    the queue is drained (or forever when not `until_empty`). Leases last `ttl` seconds
+    between heartbeats. Returns the worker's counts.
+    """
+    if cli.journal is None:
+        cli.journal = DownloadJournal()
+
+    def run_job(job):
+        return cli.download_episode(job["title"], job["episodes"], job["episode"], job["url"], None, job["quality"],
+                                    job.get("weight", 1))
+
+    worker = workqueue.QueueWorker(queue, run_job, concurrency or DEFAULT_CONCURRENCY, ttl=ttl)
+    print(f"Worker {worker.worker_id} taking jobs from the queue.")
+    try:
+        counts = worker.run(until_empty)
+    except KeyboardInterrupt:
+        print("Stopping worker...")
+        worker.stop()
+        counts = dict(worker.counts)
+    print(f"Worker done: {counts}")
+    return counts
+
+
+# --- Daemon ---
+
+class JobServer(socketserver.ThreadingTCPServer):
+    """
+    Line-based JSON protocol on 127.0.0.1. Each request line is either a job document
+    (see parse_jobs) answered with {"batch": id}, or {"command": "status", "batch": id?}
+    answered with the summaries. Errors are answered with {"error": message}.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, runner):
+        self.runner = runner
+        super().__init__(("127.0.0.1", port), JobRequestHandler)
+
+
+class JobRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if isinstance(request, dict) and request.get("command") == "status":
+                    reply = {"batches": self.server.runner.status(request.get("batch"))}
+                else:
+                    reply = {"batch": self.server.runner.submit(parse_jobs(request)["jobs"])}
+            except Exception as e:
+                # A malformed job is answered, never allowed to drop the connection.
+                reply = {"error": str(e) or type(e).__name__}
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+def watch_directory(directory, runner, interval=WATCH_INTERVAL, stop=None):
+    """
+    Polls `directory` for job files. Each one is moved to <directory>/running, and then
+    to <directory>/done next to a <name>.summary.json once its batch is finished
+    (or to <directory>/failed if it cannot be parsed).
+    """
+    folders = {name: os.path.join(directory, name) for name in ("running", "done", "failed")}
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not (os.path.isfile(path) and name.lower().endswith(JOB_FILE_EXTENSIONS)):
+                continue
+            running_path = os.path.join(folders["running"], name)
+            shutil.move(path, running_path)
+            try:
+                jobs = load_job_file(running_path)["jobs"]
+            except (OSError, ValueError) as e:
+                print(f"Invalid job file {name}: {e}")
+                shutil.move(running_path, os.path.join(folders["failed"], name))
+                continue
+
+            def finished(summary, name=name, running_path=running_path):
+                shutil.move(running_path, os.path.join(folders["done"], name))
+                write_summary(summary, os.path.join(folders["done"], f"{os.path.splitext(name)[0]}.summary.json"))
+
+            batch_id = runner.submit(jobs, finished)
+            print(f"Job file {name} queued as batch {batch_id}.")
+        stop.wait(interval)
+
+
+def sync_periodically(runner, interval, stop):
+    """Syncs the follow list every `interval` seconds until `stop` is set."""
+    from anime3rb_downloader import follow
+
+    while not stop.is_set():
+        try:
+            follow.run_sync(runner)
+        except Exception as e:
+            print(f"Sync failed: {e}")
+        stop.wait(interval)
+
+
+def run_daemon(concurrency=None, port=None, watch_dir=None, initial_job_file=None, sync_interval=None):
+    """
+    Runs a BatchRunner until interrupted, fed by a JobServer on `port` and/or `watch_dir`,
+    and syncing the follow list every `sync_interval` minutes when given.
+    """
+    runner = BatchRunner(concurrency)
+    stop = threading.Event()
+    server = None
+    if initial_job_file:
+        runner.submit(load_job_file(initial_job_file)["jobs"], write_summary)
+    if port:
+        server = JobServer(port, runner)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Accepting jobs on 127.0.0.1:{server.server_address[1]}")
+    if watch_dir:
+        os.makedirs(watch_dir, exist_ok=True)
+        threading.Thread(target=watch_directory, args=(watch_dir, runner, WATCH_INTERVAL, stop), daemon=True).start()
+        print(f"Watching {watch_dir} for job files")
+    if sync_interval:
+        threading.Thread(target=sync_periodically, args=(runner, sync_interval * 60, stop), daemon=True).start()
+        print(f"Syncing followed titles every {sync_interval:g} minutes")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Stopping daemon...")
+    finally:
+        stop.set()
+        if server:
+            server.shutdown()
+        runner.shutdown(cancel_pending=True)
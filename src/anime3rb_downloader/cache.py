@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Persistent page cache ---
+# Stores the *parsed* result of a scraped page (search results, episode list,
+# download options...) keyed by page kind and URL, so that a repeated lookup skips
+# both the request (and any Cloudflare challenge) and the parse. Entries expire
+# after a per-kind TTL and the least recently used ones are evicted once the cache
+# grows past MAX_BYTES.
+
+DEFAULT_CACHE_PATH = os.path.join("output", ".page_cache.sqlite3")
+MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds a parsed page stays valid, per kind of page.
+TTLS = {
+    "search": 10 * 60,
+    "episode_list": 30 * 60,
+    "episode_page": 30 * 60,
+    "episode_count": 30 * 60,
+    "download_options": 5 * 60,
+}
+DEFAULT_TTL = 10 * 60
+
+
+class PageCache:
+    """sqlite-backed TTL + LRU cache of JSON-serialisable values. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=MAX_BYTES, ttls=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (kind, url)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+
+    def get(self, kind, url):
+        """Returns the cached value, or None if missing or older than the kind's TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM pages WHERE kind = ? AND url = ?", (kind, url)
+            ).fetchone()
+            if not row:
+                return None
+            if now - row[1] > self.ttls.get(kind, DEFAULT_TTL):
+                self._conn.execute("DELETE FROM pages WHERE kind = ? AND url = ?", (kind, url))
+                return None
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE kind = ? AND url = ?", (now, kind, url))
+        return json.loads(row[0])
+
+    def put(self, kind, url, value):
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (kind, url, value, size, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, url, data, len(data), now, now),
+            )
+            self._evict()
+
+    def invalidate(self, kind, url):
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE kind = ? AND url = ?", (kind, url))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM pages")
+
+    def _evict(self):
+        # Caller holds self._lock. Drops least recently used entries until under max_bytes.
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for kind, url, size in self._conn.execute(
+            "SELECT kind, url, size FROM pages ORDER BY last_access"
+        ).fetchall():
+            self._conn.execute("DELETE FROM pages WHERE kind = ? AND url = ?", (kind, url))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Returns the process-wide PageCache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PageCache()
+        return _default_cache
+
+
+def cached(kind, url, fetch, refresh=False):
+    """
+    Returns the parsed value of `url` from the cache, or calls `fetch()` to scrape
+    and parse it and stores the result. `refresh=True` bypasses the cached entry.
+    Empty results (failed scrapes) are not cached.
+    """
+    cache = get_cache()
+    if not refresh:
+        value = cache.get(kind, url)
+        if value:
+            return value
+    value = fetch()
+    if value:
+        cache.put(kind, url, value)
+    return value
@@ -1,107 +1,103 @@
 import os
-import time
-import threading
 import sys
-from collections import deque
-import cloudscraper
-from bs4 import BeautifulSoup
-
-queue = deque()
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-}
-
-scraper = cloudscraper.create_scraper()
-
-def download_video(url, filename):
-    response = scraper.get(url, headers=headers, stream=True)
-
-    if response.status_code != 200:
-        print(f"Failed to download video: {response.status_code}")
-        return
-
-    total_size = int(response.headers.get('content-length', 0))
-    os.makedirs("output", exist_ok=True)
-
-    with open(f"output/{filename}", 'wb') as f:
-        for chunk in response.iter_content(chunk_size=1024):
-            f.write(chunk)
-            print(f"Downloading... {f.tell() / total_size * 100:.2f}%" + 50 * ' ', end='\r')
-
-def start_downloads(anime_name: str, episodes: int):
-    while not queue:
-        time.sleep(1)
-
-    for counter in range(start, end + 1):
-        link = queue.popleft()
-        print(f"Starting download for episode {counter}/{episodes}...", end='\r')
-
-        ep_name = f"{anime_name} - Episode {counter}"
-        if counter == episodes:
-            ep_name += " [END]"
-        ep_name += '.mp4'
-
-        download_video(link, ep_name)
+import argparse
+import atexit
+import json
+import time
+from anime3rb_downloader import bandwidth, core, mirrors, telemetry
+from anime3rb_downloader.core import get_anime_name
+from anime3rb_downloader.journal import DownloadJournal
+from anime3rb_downloader.scheduler import Scheduler
+
+# The scraping and downloading live in core.py; this module adds the console frontend.
+journal = None
+max_concurrent_downloads = 1
+refresh_cache = False
+# mirrors.LinkPolicy ranking the links of each episode; None keeps the first preferred quality.
+link_policy = None
+# Qualities in the order get_download_link picks them.
+QUALITY_PREFERENCE = (480, 720, 1080)
+
+def show_progress(downloaded, total):
+    if total:
+        print(f"Downloading... {downloaded / total * 100:.2f}%" + 50 * ' ', end='\r')
+    else:
+        print(f"Downloading... {downloaded / (1024 * 1024):.1f} MB" + 50 * ' ', end='\r')
+
+def download_episode(anime_name, episodes, counter, episode, link=None, qualities=QUALITY_PREFERENCE, weight=1):
+    """
+    Downloads episode `counter` of `anime_name` from `link` (resolved from the `episode`
+    page when None) and returns True on success. A failed link is resolved again and
+    retried once; `weight` is the download's share of the bandwidth cap.
+    """
+    print(f"Starting download for episode {counter}/{episodes}...", end='\r')
+
+    ep_name = f"{anime_name} - Episode {counter}"
+    if counter == episodes:
+        ep_name += " [END]"
+    ep_name += '.mp4'
+
+    done = core.download_episode(anime_name, counter, episode, ep_name, link, qualities, link_policy, journal,
+                                 show_progress, weight, refresh_cache)
+    if done:
         print(f"Episode {counter}/{episodes} downloaded successfully!")
-
-def get_episode_cnt(soup: BeautifulSoup) -> int:
-    try:
-        cnt = soup.find_all('p', class_="text-lg leading-relaxed")[1].text.strip()
-        return int(cnt)
-    except (IndexError, ValueError, AttributeError):
-        print("Failed to retrieve episode count.")
-        sys.exit(1)
-
-def get_episode_links(url: str, episodes: int) -> list[str]:
-    res = []
-    i = url.index("titles")
-    base_url = url[:i] + "episode" + url[i + 6:]
-
-    for episode in range(1, episodes + 1):
-        res.append(f"{base_url}/{episode}")
-    return res
-
-def get_download_links(episode_links: list[str]):
-    global queue, start
-
-    for episode in episode_links[start - 1:]:
-        page = scraper.get(episode, headers=headers)
-        soup = BeautifulSoup(page.content, "html.parser")
-
-        download_links_holder = soup.find("div", class_="flex-grow flex flex-wrap gap-4 justify-center")
-        if not download_links_holder:
-            print(f"Failed to find download links for {episode}")
-            continue
-
-        download_links = download_links_holder.find_all("label")
-        desired = [None, None]
-
-        for link in download_links:
-            if "480" in link.text:
-                desired = [480, link]
-            elif "720" in link.text and desired[0] != 1080:
-                desired = [720, link]
-            elif not desired[1]:  
-                desired = [1080, link]  
-
-        if desired[1]:
-            queue.append(desired[1].parent.find("a")["href"])
-        else:
-            print(f"No valid download link found for {episode}")
-
-def main(url):
+    return done
+
+def start_downloads(anime_name: str, episodes: int, download_links, scheduler=None, priority=0,
+                    qualities=QUALITY_PREFERENCE, weight=1):
+    """
+    Downloads every ((counter, episode_url), link) of `download_links` and returns
+    {counter: Job}, with None for episodes that have no link. Each download gets
+    `weight` shares of the bandwidth cap.
+    Without a `scheduler` the downloads run on a private one and this blocks until they
+    finish; with one (e.g. the batch runner's) they are only queued, at `priority`.
+    """
+    # Earlier episodes first; the scheduler queue is bounded so link resolution never runs far ahead.
+    private = scheduler is None
+    if private:
+        scheduler = Scheduler(max_concurrent_downloads, max_pending=max_concurrent_downloads)
+    jobs = {}
+    for (counter, episode), link in download_links:
+        jobs[counter] = scheduler.submit(download_episode, anime_name, episodes, counter, episode, link, qualities,
+                                         weight, priority=(priority, counter), key=(anime_name, counter)) if link else None
+    if private:
+        scheduler.join()
+        scheduler.shutdown()
+    return jobs
+
+def fetch_episode_count(url: str) -> int:
+    """Returns the episode count of a title page (through the page cache), or None."""
+    return core.fetch_episode_count(url, refresh_cache)
+
+def get_download_link(episode: str, refresh: bool = False, qualities=QUALITY_PREFERENCE, policy=None):
+    return core.get_download_link(episode, refresh or refresh_cache, qualities, policy or link_policy)
+
+def get_download_links(url: str, anime_name: str, episodes: int, start: int, end: int, qualities=QUALITY_PREFERENCE):
+    """
+    Yields ((episode_number, episode_url), download_link) for the episodes of `url`
+    between start and end, resolving several pages concurrently as the episode listing
+    is walked. Finished episodes are skipped without fetching their page (nor a listing
+    page holding only finished episodes).
+    """
+    done = set()
+    for number in range(start, end + 1):
+        if journal.is_done(anime_name, number):
+            print(f"Episode {number}/{episodes} already downloaded, skipping.")
+            done.add(number)
+    return core.resolve_links(core.iter_episodes(url, start, end, done, refresh_cache), refresh_cache, qualities,
+                              link_policy)
+
+def interactive(url):
+    """Downloads a range of episodes of `url`, asking for the range on the console."""
     print("Welcome to Anime3rb Downloader")
 
-    page = scraper.get(url, headers=headers)
-    soup = BeautifulSoup(page.content, "html.parser")
-
-    anime_name = url[url.index("titles") + 7:]
-    episodes_cnt = get_episode_cnt(soup)
+    anime_name = get_anime_name(url)
+    episodes_cnt = fetch_episode_count(url)
+    if not episodes_cnt:
+        sys.exit(1)
 
-    episode_links = get_episode_links(url, episodes_cnt)
     print(f"{anime_name} has {episodes_cnt} episodes.")
 
-    global start, end
     # start = 1
     start = int(input("Enter the episode number to start from: "))
     while start < 1 or start > episodes_cnt:
@@ -113,14 +109,139 @@ def main(url):
         end = int(input(f"Invalid episode number. Please enter a number between {start} and {episodes_cnt} (inclusive): "))
     
 
-    threading.Thread(target=get_download_links, args=[episode_links]).start()
-    start_downloads(anime_name, episodes_cnt)
+    global journal
+    journal = DownloadJournal()
+
+    start_downloads(anime_name, episodes_cnt, get_download_links(url, anime_name, episodes_cnt, start, end))
 
     print("Thanks for using Anime3rb Downloader :)")
-    os.system("pause > nul")
+    if os.name == "nt":
+        os.system("pause > nul")
+
+def main(argv=None):
+    """Entry point of the anime3rb_dl command."""
+    global refresh_cache, link_policy
+    parser = argparse.ArgumentParser(description="Download anime episodes from anime3rb.com")
+    parser.add_argument("url", nargs="?", help="anime URL, e.g. https://anime3rb.com/titles/naruto")
+    parser.add_argument("--refresh", action="store_true", help="bypass the page cache")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--profile", metavar="DIR", help="write cProfile stats of each stage to DIR")
+    batch_options = parser.add_argument_group("batch / daemon mode")
+    batch_options.add_argument("--batch", metavar="JOBFILE", help="download every title of a JSON/YAML job file, without prompting")
+    batch_options.add_argument("--daemon", action="store_true", help="keep running and accept jobs from --listen and/or --watch")
+    batch_options.add_argument("--listen", type=int, metavar="PORT", help="accept JSON jobs on 127.0.0.1:PORT (daemon mode)")
+    batch_options.add_argument("--watch", metavar="DIR", help="pick up job files dropped in DIR (daemon mode)")
+    batch_options.add_argument("--concurrency", type=int, help="downloads running at once, across all titles")
+    batch_options.add_argument("--summary", metavar="PATH", help="write the batch summary (JSON) to PATH instead of stdout")
+    link_options = parser.add_argument_group("link selection")
+    link_options.add_argument("--link-policy", choices=mirrors.POLICIES,
+                              help="probe every link of an episode and pick by: preferred quality (fastest mirror), "
+                                   "best quality within --max-minutes, smallest file, or fastest download")
+    link_options.add_argument("--max-minutes", type=float, help="with --link-policy deadline: download time budget per episode")
+    link_options.add_argument("--probe-mb", type=float, help="measure each link's throughput on its first MB (default: 2 for deadline/fastest)")
+    link_options.add_argument("--min-speed", type=float, metavar="KBPS", help="switch to the next link when a download stays below KBPS KB/s")
+    bandwidth_options = parser.add_argument_group("bandwidth")
+    bandwidth_options.add_argument("--max-bandwidth", type=float, metavar="KBPS",
+                                   help="cap the combined rate of all downloads at KBPS KB/s, shared fairly between them")
+    bandwidth_options.add_argument("--bandwidth-schedule", metavar="WINDOWS",
+                                   help="time-of-day caps overriding --max-bandwidth, e.g. \"01:00-07:00=0,07:00-01:00=2048\" (KB/s, 0 = unlimited)")
+    queue_options = parser.add_argument_group("shared queue (several machines, one backlog)")
+    queue_options.add_argument("--queue", metavar="SPEC",
+                               help="shared episode queue: a sqlite file (may be on shared storage) or tcp://HOST:PORT of a coordinator")
+    queue_options.add_argument("--enqueue", metavar="JOBFILE", help="add the episodes of a job file to --queue")
+    queue_options.add_argument("--work", action="store_true",
+                               help="lease and download episodes from --queue until it is drained (with --daemon: keep waiting for more)")
+    queue_options.add_argument("--serve-queue", metavar="[HOST:]PORT",
+                               help="run a coordinator on HOST:PORT for the sqlite queue --queue (default host 127.0.0.1; "
+                                    "other hosts need --queue-secret)")
+    queue_options.add_argument("--queue-secret", metavar="SECRET",
+                               help="shared secret of the coordinator, required by it and sent to it "
+                                    "(default: $ANIME3RB_QUEUE_SECRET)")
+    queue_options.add_argument("--queue-status", action="store_true", help="print the number of queued, leased, done and failed episodes")
+    follow_options = parser.add_argument_group("follow / sync")
+    follow_options.add_argument("--follow", metavar="URL", help="follow a title (new episodes are downloaded by --sync)")
+    follow_options.add_argument("--from-episode", type=int, help="with --follow: also sync episodes from this one on")
+    follow_options.add_argument("--quality", help="with --follow: quality preference, e.g. 1080,720")
+    follow_options.add_argument("--unfollow", metavar="URL", help="stop following a title")
+    follow_options.add_argument("--following", action="store_true", help="list the followed titles")
+    follow_options.add_argument("--sync", action="store_true", help="check followed titles and download new episodes")
+    follow_options.add_argument("--sync-interval", type=float, metavar="MINUTES", help="with --daemon: sync every MINUTES")
+    args = parser.parse_args(argv)
+
+    refresh_cache = args.refresh
+    if args.link_policy or args.min_speed:
+        link_policy = mirrors.LinkPolicy(args.link_policy or mirrors.QUALITY, QUALITY_PREFERENCE, args.max_minutes,
+                                         int(args.probe_mb * 1024 * 1024) if args.probe_mb is not None else None,
+                                         (args.min_speed or 0) * 1024)
+    if args.max_bandwidth or args.bandwidth_schedule:
+        try:
+            bandwidth.configure(args.max_bandwidth or 0, args.bandwidth_schedule)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.metrics_port:
+        telemetry.serve_metrics(args.metrics_port)
+    if args.profile:
+        telemetry.enable_profiling(args.profile)
+        atexit.register(telemetry.dump_profiles)
+
+    if args.follow or args.unfollow or args.following or args.sync:
+        from anime3rb_downloader import batch, follow
+        store = follow.FollowStore()
+        if args.follow:
+            quality = [int(q.strip().rstrip("p")) for q in args.quality.split(",")] if args.quality else None
+            store.add(args.follow, quality, args.from_episode)
+            print(f"Following {get_anime_name(args.follow)}.")
+        if args.unfollow:
+            print("Unfollowed." if store.remove(args.unfollow) else "That title was not followed.")
+        if args.following:
+            for title in store.all():
+                print(f"{title['anime']}: {title['episode_count'] or '?'} episodes, from episode {title['from_episode'] or 'next'}")
+        if args.sync and not args.daemon:
+            runner = batch.BatchRunner(args.concurrency)
+            try:
+                batch.write_summary(follow.run_sync(runner, refresh_cache), args.summary)
+            finally:
+                runner.shutdown()
+        if not args.daemon:
+            return
+
+    if args.enqueue or args.work or args.serve_queue or args.queue_status:
+        from anime3rb_downloader import batch, workqueue
+        if not args.queue:
+            parser.error("--enqueue, --work, --serve-queue and --queue-status need --queue")
+        secret = args.queue_secret or os.environ.get(workqueue.SECRET_ENV)
+        queue = workqueue.open_queue(args.queue, secret)
+        if args.serve_queue:
+            host, _, port = args.serve_queue.rpartition(":")
+            try:
+                workqueue.serve_queue(queue, host or "127.0.0.1", int(port), secret)
+            except ValueError as e:
+                parser.error(str(e))
+        if args.enqueue:
+            batch.enqueue_job_file(args.enqueue, queue)
+        if args.queue_status:
+            print(json.dumps(queue.stats()))
+        if args.work:
+            batch.run_queue_worker(queue, args.concurrency, until_empty=not args.daemon)
+        elif args.serve_queue:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                print("Stopping coordinator...")
+        return
+
+    if args.batch or args.daemon:
+        from anime3rb_downloader import batch
+        if args.daemon:
+            if not (args.listen or args.watch or args.sync_interval):
+                parser.error("--daemon needs --listen, --watch and/or --sync-interval")
+            batch.run_daemon(args.concurrency, args.listen, args.watch, initial_job_file=args.batch,
+                             sync_interval=args.sync_interval)
+        else:
+            batch.run_job_file(args.batch, args.concurrency, args.summary)
+        return
+    interactive(args.url or input("Enter the URL of the anime (e.g. https://anime3rb.com/titles/naruto): ").strip())
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        main(input("Enter the URL of the anime (e.g. https://anime3rb.com/titles/naruto): ").strip())
-    else:
-        main(sys.argv[1])
\ No newline at end of file
+    main()
\ No newline at end of file
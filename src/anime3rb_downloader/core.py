@@ -0,0 +1,351 @@
+import re
+import threading
+from urllib.parse import urljoin
+
+from anime3rb_downloader import bandwidth, fastio, mirrors, ratelimit
+from anime3rb_downloader.cache import cached
+from anime3rb_downloader.integrity import ContentHasher
+from anime3rb_downloader.journal import download_with_journal
+from anime3rb_downloader.library import register_download, reuse_held_copy
+from anime3rb_downloader.links import get_link_store
+from anime3rb_downloader.pipeline import resolve_stream, DEFAULT_RESOLVE_WORKERS
+from anime3rb_downloader.scheduler import current_job
+from anime3rb_downloader.segmented import download_resumable, DEFAULT_CONNECTIONS
+
+# --- Core API ---
+# Searching, scraping and downloading, shared by the command line (cli_downloader.py)
+# and the Gradio app (gui_app.py) and usable from other tools:
+#
+#   from anime3rb_downloader import core
+#   number, episode_url = next(core.iter_episodes("https://anime3rb.com/titles/naruto", start=1))
+#   link = core.get_download_link(episode_url)
+#   core.download_video(link, "naruto-1.mp4")
+#
+# Importing it is cheap: the HTTP stack (requests, cloudscraper) and the HTML parser
+# (BeautifulSoup) are only imported, and the session pool only created, when the first
+# page is fetched or parsed. Frontends add their own output (progress bars, messages)
+# on top; the functions here print only what the CLI always printed.
+
+BASE_URL = "https://anime3rb.com"
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+}
+# Qualities tried in order by get_download_link, unless the caller passes its own.
+QUALITY_PREFERENCE = (1080, 720, 480)
+# The page number in the URL of a page of an episode listing (?page=N, Laravel pagination).
+PAGE_PARAM = re.compile(r"([?&]page=)(\d+)")
+
+# One session per thread, sharing persisted Cloudflare clearance cookies (see get_sessions).
+sessions = None
+_sessions_lock = threading.Lock()
+
+
+def get_sessions():
+    """Returns the process-wide SessionPool, creating it on first use."""
+    global sessions
+    with _sessions_lock:
+        if sessions is None:
+            from anime3rb_downloader.sessions import SessionPool
+
+            sessions = SessionPool()
+        return sessions
+
+
+def fetch(url, budget=ratelimit.PAGE, **kwargs):
+    """GETs `url` with the calling thread's session, through the rate limiter."""
+    return ratelimit.get(get_sessions().get(), url, budget, headers=headers, **kwargs)
+
+
+# --- Titles and episodes ---
+
+def get_anime_name(url: str) -> str:
+    return url[url.index("titles") + 7:].strip("/")
+
+
+def parse_listing_page(content, page_url, anime_id, count=False):
+    """
+    Parses one page of a title's episode listing into {"episodes": [[number, url], ...],
+    "next": URL of the next page or None, "count": episode count (only read when `count`)},
+    or returns None when the page lists nothing.
+    """
+    from anime3rb_downloader.parsing import find_episode_count, find_episode_links, find_next_page
+
+    episodes = [[int(number), link] for number, link in find_episode_links(content, anime_id)]
+    episode_count = find_episode_count(content) if count else None
+    if not (episodes or episode_count):
+        return None
+    next_page = find_next_page(content)
+    return {"episodes": episodes, "next": urljoin(page_url, next_page) if next_page else None, "count": episode_count}
+
+
+def fetch_listing_page(page_url, anime_id, refresh=False, count=False):
+    """One page of a title's episode listing (see parse_listing_page), through the page cache."""
+    return cached("episode_page", page_url,
+                  lambda: parse_listing_page(fetch(page_url).content, page_url, anime_id, count), refresh)
+
+
+def fetch_episode_count(url: str, refresh=False) -> int:
+    """Returns the episode count of a title page (through the page cache), or None."""
+    page = fetch_listing_page(url, url.rstrip("/").split("/")[-1], refresh, count=True)
+    if not (page and page["count"]):
+        print("Failed to retrieve episode count.")
+        return None
+    return page["count"]
+
+
+def iter_episodes(url, start=1, end=None, skip=(), refresh=False):
+    """
+    Yields (number, episode_url) for the episodes of a title numbered start..end (to the
+    last by default) and not in `skip`, in listing order, walking the listing pages
+    lazily: one page is held at a time, whatever the length of the series. When the
+    listing is split in pages of consecutive episodes the filters are pushed down to the
+    pages: the walk jumps to the page holding `start`, stops after the one holding `end`,
+    and never fetches a page whose episodes are all in `skip`.
+    """
+    anime_id = url.rstrip("/").split("/")[-1]
+    start = max(1, start or 1)
+
+    def wanted(number):
+        return start <= number and (end is None or number <= end) and number not in skip
+
+    first = fetch_listing_page(url, anime_id, refresh, count=True)
+    if not first:
+        return
+    per_page = len(first["episodes"])
+    paged = bool(per_page and first["next"] and PAGE_PARAM.search(first["next"])
+                 and [number for number, _ in first["episodes"]] == list(range(1, per_page + 1)))
+    if not paged:
+        # A single page, or pages we cannot predict: walk them all in order.
+        yield from _walk_listing(first, anime_id, refresh, wanted)
+        return
+
+    last = min(n for n in (end, first["count"]) if n) if (end or first["count"]) else None
+    page, page_number, highest = first, 1, 0
+    while True:
+        if page:
+            if page["episodes"][0][0] != (page_number - 1) * per_page + 1:
+                # Not consecutive after all: walk the listing again from page 2, page by page.
+                yield from _walk_listing(fetch_listing_page(first["next"], anime_id, refresh), anime_id, refresh,
+                                         lambda number: number > highest and wanted(number))
+                return
+            for number, episode_url in page["episodes"]:
+                if wanted(number):
+                    highest = number
+                    yield number, episode_url
+            if not page["next"]:
+                return
+        page_number += 1
+        low = (page_number - 1) * per_page + 1
+        if last is not None and low > last:
+            return
+        high = low + per_page - 1 if last is None else min(low + per_page - 1, last)
+        if high < start or (last is not None and all(number in skip for number in range(max(low, start), high + 1))):
+            page = None
+            continue
+        page_url = PAGE_PARAM.sub(lambda m: m.group(1) + str(page_number), first["next"], count=1)
+        page = fetch_listing_page(page_url, anime_id, refresh)
+        if not (page and page["episodes"]):
+            return
+        if not (refresh or page["next"]) and first["count"] and page["episodes"][-1][0] < first["count"]:
+            # A cached last page from before the newest episodes came out.
+            page = fetch_listing_page(page_url, anime_id, True)
+
+
+def _walk_listing(page, anime_id, refresh, wanted):
+    # Follows the "next" links from `page`, yielding its wanted episodes.
+    while page:
+        for number, episode_url in page["episodes"]:
+            if wanted(number):
+                yield number, episode_url
+        page = fetch_listing_page(page["next"], anime_id, refresh) if page["next"] else None
+
+
+def episode_list(url, refresh=False):
+    """Every (number, episode_url) of a title, sorted by episode number, through the page cache."""
+    return cached("episode_list", url, lambda: sorted(iter_episodes(url, refresh=refresh)), refresh)
+
+
+def search_url(query):
+    return f"{BASE_URL}/search?q={query.replace(' ', '+')}"
+
+
+def fetch_search_results(url):
+    """Scrapes a search page and returns a dict: label -> {url, title, subtitle, image}."""
+    from anime3rb_downloader.parsing import find_search_cards
+
+    page = fetch(url)
+    page.raise_for_status()
+    anime_map = {}
+    for card in find_search_cards(page.content):
+        url = card.get("href")
+        details = card.find("div", class_="details")
+        title = details.find("h4").text.strip() if details and details.find("h4") else "N/A"
+        subtitle = details.find("h5").text.strip() if details and details.find("h5") else ""
+        img = card.find("img")
+        image_url = img.get("src") if img else None
+
+        if title != "N/A" and url:
+            label = f"{title} ({subtitle})"
+            anime_map[label] = {"url": url, "title": title, "subtitle": subtitle, "image": image_url}
+    return anime_map
+
+
+def search(query, refresh=False):
+    """Searches the site for `query` (through the page cache); see fetch_search_results."""
+    url = search_url(query)
+    return cached("search", url, lambda: fetch_search_results(url), refresh)
+
+
+# --- Download links ---
+
+def fetch_download_options(episode_url):
+    """Scrapes an episode page and returns its [label_text, href] download options (empty if none)."""
+    from anime3rb_downloader.parsing import extract_download_options
+
+    page = fetch(episode_url)
+    options = extract_download_options(page.content)
+    if not options:
+        print(f"Failed to find download links for {episode_url}")
+    return options
+
+
+def pick_link(options, qualities=QUALITY_PREFERENCE):
+    """
+    Returns (quality, href) of the first quality of `qualities` the options offer, else
+    (None, href) of the first link at all, or (None, None). HEVC links are skipped: they
+    are not downloadable with a free account.
+    """
+    options = [(text, href) for text, href in options if href and "hevc" not in text.lower()]
+    for quality in qualities:
+        for text, href in options:
+            if str(quality) in text:
+                return quality, href
+    if options:
+        return None, options[0][1]
+    return None, None
+
+
+def offered_qualities(options):
+    """Qualities the download options of an episode page are labelled with, best first (HEVC skipped)."""
+    return sorted({c["quality"] for c in mirrors.candidates_from_options(options, mirrors.DEFAULT_QUALITIES)
+                   if c["quality"]}, reverse=True)
+
+
+def get_download_link(episode_url: str, refresh=False, qualities=QUALITY_PREFERENCE, policy=None):
+    """
+    Returns the download link of an episode page, or None. A previously resolved link is
+    reused while it is still valid and the page's download options are cached;
+    `refresh=True` scrapes the page again. With a `policy` (mirrors.LinkPolicy) every link
+    of the page is probed and ranked instead, and the others are kept as fallbacks for
+    download_video.
+    """
+    slug, number = episode_url.rstrip("/").split("/")[-2:]
+    if not (refresh or policy):
+        quality, link = get_link_store().lookup(slug, number, qualities, get_sessions().get(), headers)
+        if link:
+            return link
+
+    options = cached("download_options", episode_url, lambda: fetch_download_options(episode_url), refresh)
+    if not options:
+        return None
+    # Only labelled qualities are stored, so that the lookup above never serves a guessed one.
+    get_link_store().put_offered(slug, number, offered_qualities(options))
+
+    if policy:
+        ranked = mirrors.rank(mirrors.candidates_from_options(options, qualities), policy, get_sessions().get(), headers,
+                              qualities)
+        if not ranked:
+            print(f"No working download link found for {episode_url}")
+            return None
+        best = ranked[0]
+        if best["quality"]:
+            get_link_store().put(slug, number, best["quality"], best["url"])
+        mirrors.remember_fallbacks(best["url"], [candidate["url"] for candidate in ranked[1:]], policy.min_speed)
+        return best["url"]
+
+    quality, link = pick_link(options, qualities)
+    if link:
+        if quality:
+            get_link_store().put(slug, number, quality, link)
+        return link
+    print(f"No valid download link found for {episode_url}")
+    return None
+
+
+def resolve_links(episodes, refresh=False, qualities=QUALITY_PREFERENCE, policy=None, workers=DEFAULT_RESOLVE_WORKERS):
+    """
+    Yields ((number, episode_url), link) for each (number, episode_url) of `episodes` as soon
+    as its page is resolved, `workers` pages at a time. Episodes without a link yield None.
+    """
+    return resolve_stream(episodes, lambda item: get_download_link(item[1], refresh, qualities, policy), workers)
+
+
+# --- Downloads ---
+
+def download_video(url, filename, progress_callback=None, connections=DEFAULT_CONNECTIONS, job_key=None,
+                   journal=None, max_retries=3, retry_delay=5, weight=1):
+    """
+    Downloads `url` to output/`filename` and returns True on success. `progress_callback`
+    gets (downloaded, total) and a cancelled scheduler job stops at the next call. With a
+    `journal` (journal.DownloadJournal) and `job_key` (anime_name, episode) an interrupted
+    download is resumed and a copy already in the library is reused. Size and content hash
+    are checked as the bytes are written. A link chosen by a link policy that turns out too
+    slow is replaced by the next one. `weight` is the download's share of the bandwidth cap
+    relative to the other running downloads (see bandwidth.py).
+    """
+    job = current_job()
+
+    def progress(downloaded, total):
+        if job:
+            job.check_cancelled()
+        if progress_callback:
+            progress_callback(downloaded, total)
+
+    path = f"output/{filename}"
+    anime_name, episode = job_key or (None, None)
+    hasher = ContentHasher()
+
+    def attempt(link, watch):
+        if journal and job_key:
+            return download_with_journal(journal, anime_name, episode, link, path, get_sessions().get, headers,
+                                         connections, watch(progress), hasher=hasher, reuse=reuse_held_copy,
+                                         max_retries=max_retries, retry_delay=retry_delay, engine=engine)
+        return download_resumable(link, path, get_sessions().get, headers, connections, watch(progress),
+                                  max_retries=max_retries, retry_delay=retry_delay, engine=engine, hasher=hasher)
+
+    links, min_speed = mirrors.candidate_links(url)
+    with bandwidth.governor.transfer(weight, filename) as transfer:
+        engine = fastio.engine.shaped(transfer)
+        done, url = mirrors.download_racing(links, attempt, min_speed)
+    if done:
+        register_download(path, anime_name, episode, url, hasher.hexdigest)
+    return bool(done)
+
+
+def download_episode(anime_name, number, episode_url, filename, link=None, qualities=QUALITY_PREFERENCE, policy=None,
+                     journal=None, progress_callback=None, weight=1, refresh=False):
+    """
+    Downloads episode `number` of `anime_name` to output/`filename` from `link` (resolved
+    from `episode_url` when None) and returns True on success. A failed link may have
+    expired: it is resolved again from the page and retried once.
+    """
+    import requests
+
+    if link is None:
+        link = get_download_link(episode_url, refresh, qualities, policy)
+        if not link:
+            return False
+    job_key = (anime_name, number)
+    for attempt in range(2):
+        if attempt:
+            # Links are stored under the page's slug, which `anime_name` need not be (GUI titles carry a quality).
+            get_link_store().invalidate(*episode_url.rstrip("/").split("/")[-2:])
+            link = get_download_link(episode_url, True, qualities, policy)
+            if not link:
+                return False
+        try:
+            if download_video(link, filename, progress_callback, job_key=job_key, journal=journal, weight=weight):
+                return True
+        except requests.RequestException as e:
+            print(f"Download of episode {number} failed: {e}")
+    return False
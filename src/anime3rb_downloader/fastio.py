@@ -0,0 +1,161 @@
+import copy
+import os
+import threading
+import time
+
+from anime3rb_downloader import bandwidth
+
+# --- High-throughput write path ---
+# Copies streamed response bodies to disk with one large reusable buffer per thread,
+# filled with readinto() straight from the connection (no per-chunk bytes objects),
+# preallocates output files whose size is known, and rate-limits progress callbacks
+# so a multi-GB download does not spend its time printing or redrawing a bar.
+# An engine bound to a bandwidth.Transfer (see IOEngine.shaped) pays for every read
+# through the global governor; unbound engines never touch it.
+
+BUFFER_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.25
+# Used when the body has to be decoded (gzip...) and readinto() cannot be used.
+FALLBACK_CHUNK_SIZE = 256 * 1024
+# readinto() only returns once the buffer is full, so reads start at this size and
+# double up to the buffer size while each takes less than the progress interval (and
+# halve again when one takes longer): on a slow connection progress, cancellation and
+# throughput checks keep running.
+MIN_READ_SIZE = 64 * 1024
+
+
+def _readinto(response):
+    # readinto of the underlying http.client response reads from the socket directly into
+    # our buffer. Encoded bodies must go through requests' decoding, so they get None.
+    if response.headers.get("content-encoding", "identity").lower() not in ("", "identity"):
+        return None
+    fp = getattr(response.raw, "_fp", None)
+    return getattr(fp, "readinto", None) or getattr(response.raw, "readinto", None)
+
+
+class ProgressThrottle:
+    """Wraps a progress_callback(downloaded, total) so it runs at most once per `interval` seconds."""
+
+    def __init__(self, callback, interval=PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self._last = 0.0
+        self._pending = None
+
+    def __call__(self, downloaded, total):
+        now = time.monotonic()
+        if now - self._last >= self.interval or (total and downloaded >= total):
+            self._last = now
+            self._pending = None
+            self.callback(downloaded, total)
+        else:
+            self._pending = (downloaded, total)
+
+    def flush(self):
+        """Reports the last skipped update, if any."""
+        if self._pending:
+            pending, self._pending = self._pending, None
+            self.callback(*pending)
+
+
+class IOEngine:
+    """Buffer size, preallocation and progress rate used by the download engine."""
+
+    def __init__(self, buffer_size=BUFFER_SIZE, progress_interval=PROGRESS_INTERVAL, preallocate=True):
+        self.buffer_size = buffer_size
+        self.progress_interval = progress_interval
+        self.preallocate = preallocate
+        self.transfer = None
+        self._local = threading.local()
+
+    def shaped(self, transfer):
+        """Returns a copy of the engine (sharing its buffers) whose reads are paced by `transfer`."""
+        shaped = copy.copy(self)
+        shaped.transfer = transfer
+        return shaped
+
+    def _shaped_read_size(self, share):
+        # At most `progress_interval` worth of the transfer's share per read, so that
+        # progress keeps flowing while the governor holds the transfer back.
+        return max(bandwidth.MIN_SHAPED_READ, int(share * self.progress_interval)) if share else None
+
+    def _buffer(self):
+        view = getattr(self._local, "view", None)
+        if view is None or len(view) != self.buffer_size:
+            view = self._local.view = memoryview(bytearray(self.buffer_size))
+        return view
+
+    def allocate(self, f, size):
+        """Reserves `size` bytes for `f` on disk (falls back to a sparse truncate)."""
+        if self.preallocate and size > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(f.fileno(), 0, size)
+                return
+            except OSError:
+                pass
+        f.truncate(size)
+
+    def throttle(self, callback):
+        """Returns `callback` rate-limited to `progress_interval`, or None if there is no callback."""
+        if callback is None or self.progress_interval <= 0:
+            return callback
+        return ProgressThrottle(callback, self.progress_interval)
+
+    def copy(self, response, f, limit=None, on_bytes=None, on_data=None):
+        """
+        Writes the body of a streamed response to `f` at its current position, stopping
+        after `limit` bytes if given. `on_data(view)` is called with each block written
+        (e.g. to hash it; the view is only valid during the call) and `on_bytes(n)` after
+        each write. Returns the number of bytes written.
+        """
+        readinto = _readinto(response)
+        if readinto is None:
+            return self._copy_chunks(response, f, limit, on_bytes, on_data)
+        view = self._buffer()
+        read_size = min(len(view), MIN_READ_SIZE)
+        transfer = self.transfer
+        shaped_size = None
+        written = 0
+        while limit is None or written < limit:
+            size = read_size if shaped_size is None else min(read_size, shaped_size)
+            if limit is not None:
+                size = min(size, limit - written)
+            started = time.monotonic()
+            n = readinto(view[:size])
+            if not n:
+                break
+            if time.monotonic() - started > self.progress_interval:
+                read_size = max(MIN_READ_SIZE, read_size // 2)
+            elif read_size < len(view):
+                read_size = min(len(view), read_size * 2)
+            f.write(view[:n])
+            if on_data:
+                on_data(view[:n])
+            written += n
+            if on_bytes:
+                on_bytes(n)
+            if transfer:
+                shaped_size = self._shaped_read_size(transfer.consume(n))
+        return written
+
+    def _copy_chunks(self, response, f, limit, on_bytes, on_data):
+        written = 0
+        for chunk in response.iter_content(chunk_size=FALLBACK_CHUNK_SIZE):
+            if limit is not None:
+                chunk = chunk[:limit - written]
+            if not chunk:
+                continue
+            f.write(chunk)
+            if on_data:
+                on_data(chunk)
+            written += len(chunk)
+            if on_bytes:
+                on_bytes(len(chunk))
+            if self.transfer:
+                self.transfer.consume(len(chunk))
+            if limit is not None and written >= limit:
+                break
+        return written
+
+
+engine = IOEngine()
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from anime3rb_downloader import cli_downloader as cli
+from anime3rb_downloader import core, ratelimit
+from anime3rb_downloader.cache import get_cache
+from anime3rb_downloader.journal import DownloadJournal
+
+# --- Follow list and incremental sync ---
+# Followed titles are polled with conditional GETs (If-None-Match / If-Modified-Since
+# from the last response). A 304 costs no body and no parse; a 200 whose body hashes
+# the same as last time skips the parse too. The episode set is then diffed against
+# the journal and only the missing episodes (from the episode the title was followed
+# at) are handed to the batch runner, so a sync over hundreds of unchanged titles is
+# a few hundred tiny requests. They are page requests to anime3rb like any other and
+# share the "page" rate-limit budget (and its 429 backoff) with scraping.
+
+DEFAULT_FOLLOW_PATH = os.path.join("output", ".follow.sqlite3")
+# Titles polled at the same time during a sync (the "page" budget's max_concurrency).
+SYNC_WORKERS = 4
+
+
+class FollowStore:
+    """sqlite-backed follow list with the validators of each title page. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_FOLLOW_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS follows (
+                url TEXT PRIMARY KEY,
+                anime TEXT NOT NULL,
+                quality TEXT,
+                from_episode INTEGER,
+                episode_count INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                checked_at REAL,
+                added_at REAL NOT NULL
+            )"""
+        )
+
+    def add(self, url, quality=None, from_episode=None):
+        """Follows a title. `from_episode` None means "episodes released from now on" (set at the first sync)."""
+        url = url.strip().rstrip("/")
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO follows (url, anime, quality, from_episode, added_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (url) DO UPDATE SET quality = excluded.quality,
+                   from_episode = COALESCE(excluded.from_episode, follows.from_episode)""",
+                (url, core.get_anime_name(url), json.dumps(quality) if quality else None, from_episode, time.time()),
+            )
+
+    def remove(self, url):
+        with self._lock:
+            return self._conn.execute("DELETE FROM follows WHERE url = ?", (url.strip().rstrip("/"),)).rowcount > 0
+
+    def all(self):
+        """Returns every followed title as a dict."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT url, anime, quality, from_episode, episode_count, etag, last_modified, body_hash, checked_at
+                   FROM follows ORDER BY anime"""
+            ).fetchall()
+        keys = ("url", "anime", "quality", "from_episode", "episode_count", "etag", "last_modified", "body_hash",
+                "checked_at")
+        follows = [dict(zip(keys, row)) for row in rows]
+        for follow in follows:
+            follow["quality"] = json.loads(follow["quality"]) if follow["quality"] else None
+        return follows
+
+    def update(self, url, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE follows SET {columns} WHERE url = ?", (*fields.values(), url))
+
+
+def check_title(store, follow, session, refresh=False):
+    """
+    Polls one followed title with a conditional GET. Returns (episode_count, changed);
+    episode_count is the last known one when the page did not change (or could not be read).
+    """
+    request_headers = dict(core.headers)
+    if not refresh:
+        if follow["etag"]:
+            request_headers["If-None-Match"] = follow["etag"]
+        if follow["last_modified"]:
+            request_headers["If-Modified-Since"] = follow["last_modified"]
+    now = time.time()
+    response = ratelimit.get(session, follow["url"], ratelimit.PAGE, headers=request_headers)
+    if response.status_code == 304:
+        store.update(follow["url"], checked_at=now)
+        return follow["episode_count"], False
+    if response.status_code != 200:
+        print(f"Could not check {follow['url']}: HTTP {response.status_code}")
+        return follow["episode_count"], False
+
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "body_hash": hashlib.sha1(response.content).hexdigest(),
+        "checked_at": now,
+    }
+    if validators["body_hash"] == follow["body_hash"] and follow["episode_count"] and not refresh:
+        store.update(follow["url"], **validators)
+        return follow["episode_count"], False
+    page = core.parse_listing_page(response.content, follow["url"], follow["anime"], count=True)
+    count = page and page["count"]
+    if not count:
+        print("Failed to retrieve episode count.")
+        return follow["episode_count"], False
+    store.update(follow["url"], episode_count=count, **validators)
+    # Keep the interactive/batch paths from reading a stale count or listing out of the page cache.
+    get_cache().put("episode_page", follow["url"], page)
+    return count, count != follow["episode_count"]
+
+
+def sync(store=None, journal=None, refresh=False, workers=SYNC_WORKERS):
+    """
+    Polls every followed title and returns (jobs, report): batch jobs (see batch.parse_jobs)
+    for the episodes that are out but not downloaded yet, and one report entry per title.
+    """
+    store = store or FollowStore()
+    if cli.journal is None:
+        cli.journal = DownloadJournal()
+    journal = journal or cli.journal
+
+    def check(follow):
+        entry = {"url": follow["url"], "anime": follow["anime"], "changed": False, "missing": [], "error": None}
+        try:
+            count, entry["changed"] = check_title(store, follow, core.get_sessions().get(), refresh)
+        except Exception as e:
+            entry["error"] = str(e)
+            return entry, None
+        if not count:
+            entry["error"] = "episode count not found"
+            return entry, None
+        from_episode = follow["from_episode"]
+        if from_episode is None:
+            # First sync of a title followed "from now on".
+            from_episode = count + 1
+            store.update(follow["url"], from_episode=from_episode)
+        done = journal.done_episodes(follow["anime"])
+        entry["missing"] = [n for n in range(from_episode, count + 1) if str(n) not in done]
+        entry["episode_count"] = count
+        if not entry["missing"]:
+            return entry, None
+        job = {"url": follow["url"], "start": entry["missing"][0], "end": count}
+        if follow["quality"]:
+            job["quality"] = follow["quality"]
+        return entry, job
+
+    follows = store.all()
+    if not follows:
+        return [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(follows)))) as executor:
+        results = list(executor.map(check, follows))
+    return [job for _, job in results if job], [entry for entry, _ in results]
+
+
+def run_sync(runner=None, refresh=False, download=True):
+    """
+    Syncs the follow list and downloads what is missing on `runner` (a BatchRunner;
+    a private one is used when None). Returns a JSON-serialisable summary.
+    """
+    from anime3rb_downloader import batch
+
+    started = time.time()
+    jobs, report = sync(refresh=refresh)
+    summary = {"checked": len(report), "changed": sum(entry["changed"] for entry in report),
+               "check_seconds": round(time.time() - started, 3), "titles": report, "batch": None}
+    print(f"Checked {summary['checked']} followed titles in {summary['check_seconds']}s, "
+          f"{len(jobs)} with episodes to download.")
+    if jobs and download:
+        jobs = batch.parse_jobs(jobs)["jobs"]
+        if runner:
+            summary["batch"] = runner.run(jobs)
+        else:
+            runner = batch.BatchRunner()
+            try:
+                summary["batch"] = runner.run(jobs)
+            finally:
+                runner.shutdown()
+    return summary
@@ -1,272 +1,423 @@
 import os
-import time
-import threading
 import sys
-from collections import deque
-import cloudscraper
-from bs4 import BeautifulSoup
-import gradio as gr
+import argparse
+import atexit
 import re # Import regex module
-from tqdm import tqdm
-import requests # Import requests module for Facebook API interaction
+import threading
+import time
+from anime3rb_downloader import bandwidth, core, mirrors, prefetch, registry, telemetry, upload
+from anime3rb_downloader.cache import get_cache
+from anime3rb_downloader.journal import DownloadJournal
+from anime3rb_downloader.pipeline import resolve_stream
+from anime3rb_downloader.scheduler import Scheduler, PENDING, RUNNING
+from anime3rb_downloader.library import get_library, PAGE_SIZE
 
 # --- Global Variables & Setup ---
-queue = deque()
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-}
-queue_lock = threading.Lock()
-# We keep a global scraper for non-threaded tasks like searching
-scraper = cloudscraper.create_scraper()
+# Le scraping et les téléchargements sont dans core.py ; ce module n'est que l'interface Gradio.
+# gradio n'est importé qu'à sa première utilisation, car il est long à charger.
+
+# Qualités essayées, de la meilleure à la moins bonne (les liens HEVC sont ignorés)
+QUALITY_PREFERENCE = core.QUALITY_PREFERENCE
+# Intervalle (secondes) entre deux mises à jour de l'état affiché pendant les téléchargements
+PROGRESS_INTERVAL = 1.0
+# Demandes traitées en même temps par la file Gradio (tous utilisateurs confondus)
+DEFAULT_CONCURRENCY = 4
+# Nombre de résultats de recherche dont la page et la couverture sont préchargées (0 : aucun)
+prefetch_top = prefetch.PREFETCH_TOP
 
 # --- Core Logic Functions (Scraping & Downloading) ---
 
-def download_video(url, filename, progress_callback, max_retries=3, retry_delay=5):
-    """
-    Downloads a single video file with print statements instead of a progress callback.
-    """
-    response = scraper.get(url, headers=headers, stream=True)
-
-    if response.status_code != 200:
-        print(f"Failed to download video: {response.status_code}")
-        return "Échec du téléchargement"
-
-    total_size = int(response.headers.get('content-length', 0))
-    os.makedirs("output", exist_ok=True)
-
-    with open(f"output/{filename}", 'wb') as f:
-        with tqdm(total=total_size, unit='B', unit_scale=True, desc=filename) as pbar:
-            for chunk in response.iter_content(chunk_size=1024):
-                f.write(chunk)
-                pbar.update(len(chunk))
-    return "Téléchargement réussi"
-
-def get_episode_list(soup, anime_id):
+def get_download_link(ep_nbr, episode_url, refresh=False, policy=None, qualities=QUALITY_PREFERENCE):
     """
-    Extracts episode numbers and links from the anime page soup.
-    Returns a list of tuples: (ep_nbr, ep_link)
+    Finds the best available download link of an episode page (see core.get_download_link).
+    Returns the link, or None if the episode page offers none.
     """
-    episodes = []
     try:
-        episode_links = soup.find_all('a', href=re.compile(f"https://anime3rb.com/episode/{anime_id}/\\d+"))
-        print(f"Found {len(episode_links)} episode links.")
-        for link in episode_links:
-            ep_link = link['href']
-            ep_nbr = ep_link.split("/")[-1]
-            episodes.append((ep_nbr, ep_link))
-            print(f"Episode {ep_nbr}: {ep_link}")
-        episodes.sort(key=lambda x: int(x[0]))
-        return episodes
+        link = core.get_download_link(episode_url, refresh, qualities, policy)
+        print(f"✅ Resolved episode {ep_nbr} download link." if link else f"❌ No download link for episode {ep_nbr} at {episode_url}")
+        return link
     except Exception as e:
-        print(f"Failed to extract episode list: {e}")
-        return []
-
-def get_download_links(episode_tuples: list[tuple]):
+        print(f"Error processing episode {episode_url}: {e}")
+    return None
+
+def quality_preference(quality):
+    """Preference order starting with `quality`, then the others from best to worst."""
+    quality = int(quality or QUALITY_PREFERENCE[0])
+    return (quality,) + tuple(q for q in QUALITY_PREFERENCE if q != quality)
+
+def episode_title(anime_name, quality):
+    """Title under which an episode is journaled and named: the default quality keeps the plain title."""
+    quality = int(quality or QUALITY_PREFERENCE[0])
+    return anime_name if quality == QUALITY_PREFERENCE[0] else f"{anime_name}-{quality}p"
+
+def format_speed(rate):
+    return f"{rate / (1024 * 1024):.1f} Mo/s"
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{seconds:02d}" if minutes >= 60 else f"{minutes}:{seconds:02d}"
+
+def describe_download(download):
+    """One status line of a shared download (registry.SharedDownload) while it runs or waits."""
+    if download.state == registry.QUEUED:
+        text = "en file d'attente"
+    elif download.total:
+        text = (f"{download.downloaded / download.total:.0%} — {format_size(download.downloaded)}/{format_size(download.total)}"
+                f" — {format_speed(download.rate())}")
+        eta = download.eta()
+        if eta is not None:
+            text += f" — reste {format_duration(eta)}"
+    else:
+        text = f"{format_size(download.downloaded)} — {format_speed(download.rate())}"
+    if download.watchers > 1:
+        text += f" (partagé avec {download.watchers - 1} autre(s) demande(s))"
+    return text
+
+def start_download_process(url, selected_episodes_tuples, max_concurrent_downloads=3, upload_after_download=False,
+                           upload_concurrency=upload.DEFAULT_UPLOAD_CONCURRENCY, fb_config=None,
+                           link_policy="", max_minutes=None, min_speed_kbps=0, quality=None):
     """
-    Finds the best available download link by precisely replicating
-    the working logic from 'anime3rb_dl.py'.
-    """
-    for ep_nbr, episode_url in episode_tuples:
-        try:
-            page = scraper.get(episode_url, headers=headers)
-            page.raise_for_status()
-            soup = BeautifulSoup(page.content, "html.parser")
-
-            download_links_holder = soup.find("div", class_="flex-grow flex flex-wrap gap-4 justify-center")
-
-            if not download_links_holder:
-                print(f"No download links container found for episode {ep_nbr} at {episode_url}")
-                continue
-
-            print(f"Found download links holder for episode {ep_nbr} at {episode_url}")
-            
-            labels = download_links_holder.find_all("label")
-            # Initialise un dictionnaire pour suivre la meilleure qualité trouvée et la balise <label> correspondante.
-            # La qualité est initialisée à 0 pour s'assurer que toute qualité trouvée (480, 720, 1080) sera supérieure.
-            best_link_tag_info = {'quality': 0, 'tag': None}
-
-            # Parcourt toutes les balises <label> qui représentent les options de qualité de téléchargement.
-            for label in labels:
-                text = label.text.lower() # Convertit le texte de la balise en minuscules pour une comparaison insensible à la casse.
-                
-                # Skip HEVC links as they are not accessible in the free plan
-                if "hevc" in text:
-                    print(f"Skipping HEVC link for episode {ep_nbr}: {text}")
-                    continue
-
-                # Vérifie si "1080" est dans le texte et si c'est une meilleure qualité que celle actuellement stockée.
-                if "1080" in text and best_link_tag_info['quality'] < 1080:
-                    best_link_tag_info = {'quality': 1080, 'tag': label} # Met à jour avec 1080p comme meilleure qualité.
-                # Sinon, vérifie si "720" est dans le texte et si c'est une meilleure qualité que celle actuellement stockée.
-                # Cette condition n'est évaluée que si 1080p n'a pas été trouvé ou si la qualité actuelle est inférieure à 720p.
-                elif "720" in text and best_link_tag_info['quality'] < 720:
-                    best_link_tag_info = {'quality': 720, 'tag': label} # Met à jour avec 720p.
-                # Sinon, vérifie si "480" est dans le texte et si c'est une meilleure qualité que celle actuellement stockée.
-                # Cette condition n'est évaluée que si 1080p et 720p n'ont pas été trouvés ou si la qualité actuelle est inférieure à 480p.
-                elif "480" in text and best_link_tag_info['quality'] < 480:
-                    best_link_tag_info = {'quality': 480, 'tag': label} # Met à jour avec 480p.
-            
-            # Une fois toutes les balises <label> parcourues, 'best_label_tag' contient la balise correspondant à la plus haute qualité trouvée.
-            best_label_tag = best_link_tag_info['tag']
-
-            if best_label_tag:
-                # Trouve le conteneur parent de la balise <label> pour localiser le lien de téléchargement réel.
-                container = best_label_tag.parent
-                # Cherche la balise <a> (lien) à l'intérieur de ce conteneur.
-                link_tag = container.find('a') if container else None
-
-                if link_tag and link_tag.has_attr('href'):
-                    desired_link = link_tag['href']
-                    with queue_lock:
-                        queue.append((ep_nbr, desired_link))
-                    print(f"✅ Added episode {ep_nbr} ({best_link_tag_info['quality']}p) to download queue.")
-                else:
-                    print(f"❌ Found label for episode {ep_nbr}, but failed to find associated <a> tag.")
-            else:
-                print(f"❌ No valid download link quality found for episode {ep_nbr} at {episode_url}")
-
-        except Exception as e:
-            print(f"Error processing episode {episode_url}: {e}")
-
-
-def start_download_process(url, selected_episodes_tuples, max_concurrent_downloads=3):
-    """
-    Main download process function with enhanced parallel download handling.
+    Downloads the selected episodes, yielding the status text every PROGRESS_INTERVAL
+    seconds: per episode its state, progress, throughput and time left, then the summary.
+    Downloads go through the server-wide registry (registry.py): an episode another request
+    is already downloading at the same `quality` is attached to rather than fetched again.
+    At most `max_concurrent_downloads` episodes of this request run at once (and the
+    registry's workers cap the whole server); closing the generator (the "Annuler" button,
+    or the user leaving) cancels the downloads no other request is watching.
+    With `upload_after_download`, each episode is queued for upload to the Facebook Page
+    of `fb_config` as soon as its download completes (and its size is verified), so
+    uploads overlap the remaining downloads. Uploads run on their own scheduler of
+    `upload_concurrency` workers; the outcome of both steps is reported per episode.
+    `link_policy` (one of mirrors.POLICIES, "" for the first preferred quality),
+    `max_minutes` and `min_speed_kbps` select the link of each episode (see mirrors.py).
+    The bandwidth cap is the server's (see create_gui), not the request's.
     """
     print("start_download_process called")
     if not url:
-        return "L'URL de l'anime est manquante."
+        yield "L'URL de l'anime est manquante."
+        return
     if not selected_episodes_tuples:
-        return "Aucun épisode sélectionné pour le téléchargement."
-
+        yield "Aucun épisode sélectionné pour le téléchargement."
+        return
+    fb_config = fb_config or {}
+    if upload_after_download and not (fb_config.get("access_token") and fb_config.get("page_id")):
+        yield "Erreur: La configuration de l'API Facebook est incomplète. Veuillez la remplir dans l'onglet 'Configuration FB API'."
+        return
+
+    anime_name = url.split("/")[-1]
+    quality = int(quality or QUALITY_PREFERENCE[0])
+    qualities = quality_preference(quality)
+    title = episode_title(anime_name, quality)
+    policy = None
+    if link_policy or min_speed_kbps:
+        policy = mirrors.LinkPolicy(link_policy or mirrors.QUALITY, qualities, max_minutes or None,
+                                    min_speed=(min_speed_kbps or 0) * 1024)
+
+    journal = DownloadJournal()
+    already_done = [ep for ep, _ in selected_episodes_tuples if journal.is_done(title, ep)]
+    selected_episodes_tuples = [t for t in selected_episodes_tuples if t[0] not in already_done]
+    if not selected_episodes_tuples:
+        yield f"Tous les épisodes sélectionnés sont déjà téléchargés ({', '.join(already_done)})."
+        return
+
+    shared = registry.get_registry()
+    request = shared.next_request()
+    max_concurrent_downloads = max(1, int(max_concurrent_downloads))
+    episode_urls = dict(selected_episodes_tuples)
+    attached = {}   # ep_num -> registry.SharedDownload
+    no_link = []
+    ready = set()
+    results = {}
+    uploads = {}
+    upload_jobs = {}
+    lock = threading.Lock()
+    # Signalée à chaque changement (épisode lancé ou terminé, upload terminé, fin de la résolution des liens, arrêt) :
+    # réveille le feeder qui attend une place libre et l'affichage.
+    changed = threading.Condition(lock)
+    state = {"changed": False, "fed": False}
+    stop = threading.Event()
+    # Les uploads ont leur propre planificateur (sans limite de file, pour ne jamais bloquer un téléchargement).
+    upload_scheduler = Scheduler(int(upload_concurrency)) if upload_after_download else None
+
+    def attach(ep_num, link):
+        """Suit le téléchargement de l'épisode ; renvoie False si la demande a été abandonnée entre-temps."""
+        ep_name = f"{title}-ep-{ep_num}.mp4"
+        download, created = shared.attach(
+            (anime_name, ep_num, quality), core.download_episode, title, ep_num, episode_urls[ep_num], ep_name,
+            link=link, qualities=qualities, policy=policy, journal=journal,
+            priority=(request, int(ep_num)), label=ep_name)
+        # Vérifié sous `lock` avec l'ajout : le `finally` du générateur lève `stop` puis détache, sous `lock`,
+        # tout ce qui est dans `attached` ; un téléchargement arrivé après doit être détaché ici.
+        with lock:
+            abandoned = stop.is_set()
+            if not abandoned:
+                attached[ep_num] = download
+        if abandoned:
+            shared.detach(download)
+            return False
+        download.add_listener(wake)
+        wake()
+        if not created:
+            print(f"Episode {ep_num} is already being downloaded, following that download.")
+        return True
+
+    def wake(*_):
+        with changed:
+            state["changed"] = True
+            changed.notify_all()
+
+    def running():
+        # Appelée avec `lock` tenu.
+        return sum(not download.finished for download in attached.values())
+
+    def feeder():
+        try:
+            feed()
+        finally:
+            state["fed"] = True
+            wake()
+
+    def feed():
+        # Un épisode déjà en cours pour une autre demande est suivi tout de suite, sans résoudre son lien.
+        pending = []
+        for ep_num, episode_url in selected_episodes_tuples:
+            if stop.is_set():
+                return
+            if shared.get((anime_name, ep_num, quality)):
+                if not attach(ep_num, None):
+                    return
+            else:
+                pending.append((ep_num, episode_url))
+        # Les autres liens sont résolus en parallèle et chaque téléchargement démarre dès que son lien est prêt,
+        # avec au plus `max_concurrent_downloads` téléchargements actifs pour cette demande.
+        for (ep_num, _), link in resolve_stream(pending, lambda t: get_download_link(*t, policy=policy, qualities=qualities)):
+            if not link:
+                no_link.append(ep_num)
+                continue
+            ready.add(ep_num)
+            with changed:
+                # Réveillé par la fin d'un téléchargement de cette demande, ou par l'arrêt.
+                while running() >= max_concurrent_downloads and not stop.is_set():
+                    changed.wait()
+            if stop.is_set() or not attach(ep_num, link):
+                return
+
+    def upload_worker(ep_num, path):
+        uploads[ep_num] = f"Upload de l'épisode {ep_num} en cours"
+        try:
+            video_id = upload.upload_video(path, fb_config["page_id"], fb_config["access_token"],
+                                           title=f"{anime_name} - Épisode {ep_num}")
+            status = f"Upload de l'épisode {ep_num} réussi (vidéo {video_id})"
+        except Exception as e:
+            status = f"Échec de l'upload de l'épisode {ep_num}: {e}"
+        uploads[ep_num] = status
+        print(status)
+        wake()
+
+    def record(ep_num, download):
+        if download.state == registry.DONE:
+            status = "Téléchargement réussi"
+        elif download.state == registry.CANCELLED:
+            status = f"Épisode {ep_num} annulé"
+        elif download.error:
+            status = f"Échec du téléchargement de l'épisode {ep_num}: {download.error}"
+        else:
+            status = "Échec du téléchargement"
+        results[ep_num] = status
+        print(f"Episode {ep_num}: {status}")
+        if upload_scheduler and download.state == registry.DONE:
+            uploads[ep_num] = f"Upload de l'épisode {ep_num} en attente"
+            upload_jobs[ep_num] = upload_scheduler.submit(upload_worker, ep_num, f"output/{download.label}",
+                                                          priority=int(ep_num), key=ep_num)
+
+    def render(final):
+        with lock:
+            downloads = dict(attached)
+        lines = []
+        for ep_num, _ in selected_episodes_tuples:
+            if ep_num in results:
+                line = results[ep_num]
+            elif ep_num in downloads:
+                line = describe_download(downloads[ep_num])
+            elif ep_num in no_link:
+                line = "aucun lien de téléchargement trouvé"
+            elif ep_num in ready:
+                line = "en attente"
+            else:
+                line = "recherche du lien..."
+            lines.append(f"Épisode {ep_num} : {line}" + (f" — {uploads[ep_num]}" if ep_num in uploads else ""))
+        succeeded = len([s for s in results.values() if 'réussi' in s])
+        if final:
+            header = f"Processus terminé. {succeeded}/{len(downloads)} épisodes téléchargés.\n"
+        else:
+            rate = sum(download.rate() for download in downloads.values())
+            header = (f"Téléchargement en cours : {len(results)}/{len(selected_episodes_tuples)} épisodes terminés"
+                      f" — {format_speed(rate)} au total\n")
+        if upload_scheduler:
+            header += f"{len([s for s in uploads.values() if 'réussi' in s])}/{len(uploads)} épisodes uploadés sur Facebook.\n"
+        if already_done:
+            header += f"Déjà téléchargés (ignorés) : {', '.join(already_done)}\n"
+        return header + "\n".join(lines)
+
+    print("Recherche des liens de téléchargement...")
+    thread = threading.Thread(target=feeder, daemon=True)
+    thread.start()
+    last = None
+    next_update = 0
     try:
-        anime_name = url.split("/")[-1]
-
-        with queue_lock:
-            queue.clear()
-
-        print("Recherche des liens de téléchargement...")
-        get_download_links(selected_episodes_tuples)
-
-        download_threads = []
-        results = []
-        active_downloads = 0
-
-        with queue_lock:
-            num_to_download = len(queue)
-            if num_to_download == 0:
-                return "Impossible de trouver des liens de téléchargement pour les épisodes sélectionnés."
-
-            items_to_process = list(queue)
-            queue.clear()
-
-        def download_worker(ep_num, link, result_list):
-                    nonlocal active_downloads
-                    try:
-                        ep_name = f"{anime_name}-ep-{ep_num}.mp4"
-                        status = download_video(link, ep_name, None) # Changed to download_video
-                        result_list.append(status)
-                        print(status)
-                    finally:
-                        with queue_lock:
-                            active_downloads -= 1
-
-        for i, (ep_num, link) in enumerate(items_to_process):
-            # Wait if we've reached the maximum number of concurrent downloads
-            while active_downloads >= max_concurrent_downloads:
-                time.sleep(0.5)
-
-            # Removed progress_tracker = gr.Progress()
-            thread = threading.Thread(target=download_worker, args=(ep_num, link, results))
-            download_threads.append(thread)
-            with queue_lock:
-                active_downloads += 1
-            thread.start()
-            time.sleep(0.1)
-
-        for thread in download_threads:
-            thread.join()
-
-        return f"Processus terminé. {len([s for s in results if 'réussi' in s])}/{num_to_download} épisodes téléchargés.\n" + "\n".join(results)
+        while True:
+            with lock:
+                feeding = not state["fed"]
+                state["changed"] = False
+                downloads = dict(attached)
+            finished = False
+            for ep_num, download in downloads.items():
+                if download.finished and ep_num not in results:
+                    record(ep_num, download)
+                    finished = True
+            uploading = any(job.state in (PENDING, RUNNING) for job in upload_jobs.values())
+            if not feeding and len(results) == len(downloads) and not uploading:
+                break
+            # La fin d'un épisode est affichée tout de suite, la progression toutes les PROGRESS_INTERVAL secondes.
+            if finished or time.monotonic() >= next_update:
+                next_update = time.monotonic() + PROGRESS_INTERVAL
+                text = render(final=False)
+                if text != last:
+                    last = text
+                    yield text
+            with changed:
+                if not state["changed"]:
+                    changed.wait(max(0.0, next_update - time.monotonic()))
+        if not attached:
+            yield "Impossible de trouver des liens de téléchargement pour les épisodes sélectionnés."
+        else:
+            yield render(final=True)
     except Exception as e:
-        return f"Une erreur est survenue: {e}"
-
-def search_anime(search_query):
+        yield f"Une erreur est survenue: {e}"
+    finally:
+        stop.set()
+        wake()
+        with lock:
+            downloads = list(attached.values())
+        for download in downloads:
+            shared.detach(download)
+        if upload_scheduler:
+            upload_scheduler.shutdown(cancel_pending=True)
+
+def search_anime(search_query, refresh=False):
     """Searches for an anime and returns a list of results."""
+    import gradio as gr
+
     if not search_query:
         return gr.update(choices=[], value=None), {}
 
-    search_url = f"https://anime3rb.com/search?q={search_query.replace(' ', '+')}"
     try:
-        page = scraper.get(search_url, headers=headers)
-        page.raise_for_status()
+        anime_map = core.search(search_query, refresh)
     except Exception as e:
         print(f"Error fetching search results: {e}")
         return gr.update(choices=[("Error fetching results.", "")]), {}
 
-    soup = BeautifulSoup(page.content, "html.parser")
-    anime_cards = soup.find_all("a", class_=lambda x: x and "simple-title-card" in x)
-    results = []
-    anime_map = {}
-
-    for card in anime_cards:
-        url = card.get("href")
-        details = card.find("div", class_="details")
-        title = details.find("h4").text.strip() if details and details.find("h4") else "N/A"
-        subtitle = details.find("h5").text.strip() if details and details.find("h5") else ""
-        img = card.find("img")
-        image_url = img.get("src") if img else None
-        
-        if title != "N/A" and url:
-            label = f"{title} ({subtitle})"
-            results.append(label)
-            anime_map[label] = {"url": url, "title": title, "subtitle": subtitle, "image": image_url}
-            
+    results = list(anime_map)
     if not results:
         return gr.update(choices=[("No results found.", "")], value=None), {}
-    
+    if prefetch_top:
+        # Pages et couvertures des premiers résultats chargées pendant que l'utilisateur lit la liste
+        prefetch.get_prefetcher().prefetch(anime_map, prefetch_top, refresh)
+
     return gr.update(choices=results, value=None, interactive=True), anime_map
 
-def scrape_episode_list(url):
+def scrape_episode_list(url, refresh=False):
     """Scrapes the anime page to get a list of all available episodes."""
+    import gradio as gr
+
     if not url:
         return gr.update(choices=[], value=[], label="URL is missing.")
     print("Recherche de la page de l'anime...")
     try:
-        page = scraper.get(url, headers=headers)
-        page.raise_for_status()
-        soup = BeautifulSoup(page.content, "html.parser")
-        
-        anime_id = url.rstrip('/').split('/')[-1]
-        print(f"Anime ID: {anime_id}")
-        print("Analyse des liens d'épisodes...")
-        
-        episode_tuples = get_episode_list(soup, anime_id)
+        episode_tuples = prefetch.get_prefetcher().episode_list(url, refresh)
         print(f"Found {len(episode_tuples)} episode links: {episode_tuples}")
-        
-        if episode_tuples:
-            episode_choices = [f"🎬 Episode {ep_nbr} | 🔗 {ep_link}" for ep_nbr, ep_link in episode_tuples]
-            return gr.update(choices=episode_choices, value=[], label=f"{len(episode_choices)} épisodes trouvés")
-        else:
-            return gr.update(choices=[], value=[], label="Impossible de trouver les liens des épisodes.")
+        return episode_choices(episode_tuples)
     except Exception as e:
         return gr.update(choices=[], value=[], label=f"Error: {e}")
 
-def list_existing_videos():
+def episode_choices(episode_tuples):
+    """Met à jour la liste des épisodes avec les (ep_nbr, ep_link) donnés."""
+    import gradio as gr
+
+    if episode_tuples:
+        choices = [f"🎬 Episode {ep_nbr} | 🔗 {ep_link}" for ep_nbr, ep_link in episode_tuples]
+        return gr.update(choices=choices, value=[], label=f"{len(choices)} épisodes trouvés")
+    return gr.update(choices=[], value=[], label="Impossible de trouver les liens des épisodes.")
+
+def cached_episode_choices(url):
+    """Liste des épisodes déjà en cache (préchargée), sans requête ; sinon la liste est laissée telle quelle."""
+    import gradio as gr
+
+    episode_tuples = get_cache().get("episode_list", url) if url else None
+    return episode_choices(episode_tuples) if episode_tuples else gr.update()
+
+def format_size(size):
+    for unit in ("o", "Ko", "Mo", "Go"):
+        if size < 1024 or unit == "Go":
+            return f"{size:.0f} {unit}" if unit == "o" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def list_existing_videos(search="", page=1):
     """
-    Lists all .mp4 files in the 'output' directory and updates the Gradio CheckboxGroup choices.
+    Lists one page of the videos of the local library (see library.py), optionally filtered
+    by `search`, and updates the Gradio CheckboxGroup choices. The index is first reconciled
+    with the 'output' directory, which only rescans folders that changed.
+    Returns (checkbox update, page info markdown).
     """
-    output_dir = "output"
-    if not os.path.exists(output_dir):
-        # Return an update to clear choices if directory doesn't exist
-        return gr.update(choices=[], value=[])
-    
-    video_files = [f for f in os.listdir(output_dir) if f.endswith(".mp4")]
-    # Update the choices of the CheckboxGroup and clear any selected values
-    return gr.update(choices=video_files, value=[])
+    import gradio as gr
+
+    library = get_library()
+    library.reconcile()
+    page = max(1, int(page or 1))
+    entries, total = library.query((search or "").strip(), page)
+    pages = max(1, -(-total // PAGE_SIZE))
+    if page > pages:
+        page = pages
+        entries, total = library.query((search or "").strip(), page)
+    choices = []
+    for entry in entries:
+        label = entry["title"]
+        if entry["episode"] is not None:
+            label += f" – ép. {entry['episode']}"
+        if entry["quality"]:
+            label += f" – {entry['quality']}p"
+        label += f" – {format_size(entry['size'])}"
+        # La valeur est le chemin relatif à 'output', utilisé tel quel par l'upload.
+        choices.append((label, entry["path"]))
+    info = f"{total} vidéo(s) trouvée(s) — page {page}/{pages}"
+    return gr.update(choices=choices, value=[]), info
 
 # --- Gradio UI ---
-def create_gui():
+def create_gui(metrics_port=None, profile_dir=None, concurrency=DEFAULT_CONCURRENCY, max_downloads=None,
+               prefetch_results=prefetch.PREFETCH_TOP, max_bandwidth=0, bandwidth_schedule=None):
+    """
+    Builds and launches the Gradio app. `metrics_port` also serves Prometheus metrics
+    on that port; `profile_dir` writes cProfile stats of each stage there on exit.
+    Gradio's queue runs up to `concurrency` handlers at once, download requests in a pool
+    of their own so that they never hold up searches; `max_downloads` caps the downloads
+    running on the whole server (see registry.py). The title pages and covers of the
+    first `prefetch_results` search results are prefetched (see prefetch.py).
+    `max_bandwidth` (KB/s, 0 = unlimited) and `bandwidth_schedule` cap the combined rate of
+    every download of the server (see bandwidth.py); users cannot change them.
+    """
+    global prefetch_top
+    prefetch_top = prefetch_results
+    if max_bandwidth or bandwidth_schedule:
+        bandwidth.configure(max_bandwidth or 0, bandwidth_schedule)
+    registry.get_registry(max_downloads)
+    if metrics_port:
+        telemetry.serve_metrics(metrics_port)
+    if profile_dir:
+        telemetry.enable_profiling(profile_dir)
+        atexit.register(telemetry.dump_profiles)
+
+    import gradio as gr
+
     with gr.Blocks(theme=gr.themes.Soft()) as demo:
         gr.Markdown("# Anime3rb Downloader")
         selected_anime_state = gr.State({})
@@ -283,6 +434,7 @@ def create_gui():
                 with gr.Row():
                     search_input = gr.Textbox(label="Entrez le nom de l'anime à rechercher", scale=4)
                     search_button = gr.Button("Rechercher", scale=1)
+                search_refresh_checkbox = gr.Checkbox(label="Ignorer le cache (recharger depuis le site)", value=False)
                 search_results_radio = gr.Radio(label="Résultats", choices=[], interactive=True)
                 details_button = gr.Button("Voir les détails", interactive=False)
 
@@ -302,6 +454,7 @@ def create_gui():
                 gr.Markdown("## Sélection des épisodes")
                 episodes_url_input = gr.Textbox(label="Anime URL", interactive=False)
                 find_episodes_btn = gr.Button("Rechercher les épisodes", variant="primary")
+                episodes_refresh_checkbox = gr.Checkbox(label="Ignorer le cache (recharger depuis le site)", value=False)
                 with gr.Row():
                     select_all_btn = gr.Button("Tout sélectionner")
                     deselect_all_btn = gr.Button("Tout désélectionner")
@@ -314,7 +467,26 @@ def create_gui():
                 gr.Markdown("## Lancement du téléchargement")
                 download_url_input = gr.Textbox(label="Anime URL", placeholder="L'URL sera remplie automatiquement", interactive=False)
                 selected_episodes_display = gr.Markdown("Aucun épisode sélectionné.")
-                download_button = gr.Button("Lancer le téléchargement", variant="primary")
+                with gr.Row():
+                    quality_dropdown = gr.Dropdown(choices=[(f"{q}p", q) for q in QUALITY_PREFERENCE], value=QUALITY_PREFERENCE[0],
+                                                   label="Qualité préférée (sinon la meilleure disponible)")
+                    download_concurrency_slider = gr.Slider(minimum=1, maximum=8, value=3, step=1, label="Téléchargements simultanés")
+                    pipeline_upload_concurrency_slider = gr.Slider(minimum=1, maximum=6, value=upload.DEFAULT_UPLOAD_CONCURRENCY, step=1, label="Uploads simultanés")
+                with gr.Accordion("Choix du lien de téléchargement", open=False):
+                    link_policy_dropdown = gr.Dropdown(
+                        choices=[("Meilleure qualité (premier lien trouvé)", ""),
+                                 ("Meilleure qualité, miroir le plus rapide", mirrors.QUALITY),
+                                 ("Meilleure qualité téléchargeable en moins de N minutes", mirrors.DEADLINE),
+                                 ("Plus petit fichier", mirrors.SMALLEST),
+                                 ("Téléchargement le plus rapide", mirrors.FASTEST)],
+                        value="", label="Politique de sélection")
+                    with gr.Row():
+                        max_minutes_input = gr.Number(label="Durée maximale par épisode (minutes)", value=10, precision=1)
+                        min_speed_input = gr.Number(label="Vitesse minimale avant de changer de lien (Ko/s, 0 = jamais)", value=0, precision=0)
+                upload_after_download_checkbox = gr.Checkbox(label="Uploader chaque épisode sur Facebook dès qu'il est téléchargé", value=False)
+                with gr.Row():
+                    download_button = gr.Button("Lancer le téléchargement", variant="primary")
+                    cancel_download_button = gr.Button("Annuler")
                 output_text = gr.Textbox(label="Statut", interactive=False, lines=10)
                 with gr.Row():
                     back_to_episodes_btn_from_download = gr.Button("Précédent")
@@ -322,7 +494,11 @@ def create_gui():
 
             with gr.TabItem("Fichiers existants", id=4): # Nouveau Tab
                 gr.Markdown("## Fichiers vidéo existants")
+                with gr.Row():
+                    files_search_input = gr.Textbox(label="Rechercher", placeholder="Titre ou nom de fichier...", scale=3)
+                    files_page_input = gr.Number(label="Page", value=1, precision=0, minimum=1, scale=1)
                 list_files_btn = gr.Button("Actualiser la liste des fichiers")
+                files_page_info = gr.Markdown("")
                 existing_files_checkbox_group = gr.CheckboxGroup(label="Fichiers trouvés dans 'output'", interactive=True)
                 with gr.Row():
                     back_from_files_btn = gr.Button("Précédent")
@@ -333,6 +509,7 @@ def create_gui():
                 upload_files_display = gr.Markdown("Aucun fichier sélectionné pour l'upload.")
                 video_title_input = gr.Textbox(label="Titre de la vidéo (optionnel)", placeholder="Entrez un titre pour la vidéo...")
                 video_description_input = gr.Textbox(label="Description de la vidéo (optionnel)", placeholder="Entrez une description pour la vidéo...", lines=3)
+                upload_concurrency_slider = gr.Slider(minimum=1, maximum=6, value=upload.DEFAULT_UPLOAD_CONCURRENCY, step=1, label="Uploads simultanés")
                 upload_to_fb_button = gr.Button("Lancer l'upload vers Facebook", variant="primary")
                 upload_output_text = gr.Textbox(label="Statut de l'upload", interactive=False, lines=5)
                 with gr.Row():
@@ -364,7 +541,7 @@ def create_gui():
                 with gr.Row():
                     back_from_faq_btn = gr.Button("Précédent")
 
-        search_button.click(fn=search_anime, inputs=search_input, outputs=[search_results_radio, anime_map_state])
+        search_button.click(fn=search_anime, inputs=[search_input, search_refresh_checkbox], outputs=[search_results_radio, anime_map_state])
         search_results_radio.change(fn=lambda s: gr.update(interactive=bool(s)), inputs=search_results_radio, outputs=details_button)
         
         def go_to_details(selected_label, anime_map):
@@ -374,16 +551,19 @@ def create_gui():
 
         def update_details_view(anime_data):
             if not anime_data: return None, "", "", ""
-            return anime_data.get('image'), anime_data.get('title'), anime_data.get('subtitle'), anime_data.get('url')
+            # Couverture servie depuis le cache local (préchargée en général), l'URL d'origine en dernier recours
+            image = prefetch.get_prefetcher().cover(anime_data.get('image')) or anime_data.get('image')
+            return image, anime_data.get('title'), anime_data.get('subtitle'), anime_data.get('url')
         selected_anime_state.change(fn=update_details_view, inputs=selected_anime_state, outputs=[anime_image, anime_title, anime_subtitle, anime_url_display])
         
         back_to_search_btn.click(lambda: gr.update(selected=0), None, tabs)
 
         def go_to_episodes(anime_data):
-            return gr.update(selected=2), anime_data.get('url', '')
-        proceed_to_episodes_btn.click(fn=go_to_episodes, inputs=selected_anime_state, outputs=[tabs, episodes_url_input])
+            url = anime_data.get('url', '')
+            return gr.update(selected=2), url, cached_episode_choices(url)
+        proceed_to_episodes_btn.click(fn=go_to_episodes, inputs=selected_anime_state, outputs=[tabs, episodes_url_input, episodes_checkbox_group])
 
-        find_episodes_btn.click(fn=scrape_episode_list, inputs=episodes_url_input, outputs=episodes_checkbox_group)
+        find_episodes_btn.click(fn=scrape_episode_list, inputs=[episodes_url_input, episodes_refresh_checkbox], outputs=episodes_checkbox_group)
         select_all_btn.click(lambda choices: gr.update(value=choices), inputs=episodes_checkbox_group, outputs=episodes_checkbox_group)
         deselect_all_btn.click(lambda: gr.update(value=[]), None, outputs=episodes_checkbox_group)
         episodes_checkbox_group.change(fn=lambda s: gr.update(interactive=bool(s)), inputs=episodes_checkbox_group, outputs=proceed_to_download_config_btn)
@@ -409,18 +589,27 @@ def create_gui():
             inputs=[episodes_url_input, episodes_checkbox_group], 
             outputs=[tabs, download_url_input, selected_episodes_state, selected_episodes_display]
         )
-        download_button.click(
-            fn=start_download_process, 
-            inputs=[download_url_input, selected_episodes_state], 
-            outputs=output_text
+        # Le statut est mis à jour en continu ; "Annuler" arrête les téléchargements que personne d'autre ne suit.
+        download_event = download_button.click(
+            fn=start_download_process,
+            inputs=[download_url_input, selected_episodes_state, download_concurrency_slider,
+                    upload_after_download_checkbox, pipeline_upload_concurrency_slider, fb_config_state,
+                    link_policy_dropdown, max_minutes_input, min_speed_input, quality_dropdown],
+            outputs=output_text,
+            concurrency_limit=concurrency, concurrency_id="downloads"
         )
+        cancel_download_button.click(fn=None, cancels=[download_event])
 
         # Navigation pour l'onglet "Téléchargement"
         back_to_episodes_btn_from_download.click(lambda: gr.update(selected=2), None, tabs)
         proceed_to_existing_files_btn.click(lambda: gr.update(selected=4), None, tabs)
 
         # Écouteurs d'événements pour le nouvel onglet "Fichiers existants"
-        list_files_btn.click(fn=list_existing_videos, outputs=existing_files_checkbox_group)
+        list_files_inputs = [files_search_input, files_page_input]
+        list_files_outputs = [existing_files_checkbox_group, files_page_info]
+        list_files_btn.click(fn=list_existing_videos, inputs=list_files_inputs, outputs=list_files_outputs)
+        files_search_input.submit(fn=lambda search: list_existing_videos(search, 1), inputs=files_search_input, outputs=list_files_outputs)
+        files_page_input.submit(fn=list_existing_videos, inputs=list_files_inputs, outputs=list_files_outputs)
         existing_files_checkbox_group.change(
             fn=lambda s: gr.update(interactive=bool(s)), 
             inputs=existing_files_checkbox_group, 
@@ -441,39 +630,27 @@ def create_gui():
         )
 
         # Écouteurs d'événements pour le nouvel onglet "Upload vers Facebook"
-        def upload_videos_to_facebook(files_to_upload, title, description, fb_config):
+        def upload_videos_to_facebook(files_to_upload, title, description, fb_config, concurrency):
             if not files_to_upload:
                 return "Aucun fichier sélectionné pour l'upload."
             if not fb_config.get("access_token") or not fb_config.get("page_id"):
                 return "Erreur: La configuration de l'API Facebook est incomplète. Veuillez la remplir dans l'onglet 'Configuration FB API'."
-            
+
+            # Upload résumable par morceaux (voir upload.py) : un upload interrompu reprend là où il s'est arrêté.
+            filepaths = [os.path.join("output", filename) for filename in files_to_upload]
             results = []
-            for filename in files_to_upload:
-                filepath = os.path.join("output", filename) # Ensure 'output' is the correct directory
-                
-                # Facebook Graph API endpoint for video uploads
-                upload_url = f"https://graph.facebook.com/v18.0/{fb_config['page_id']}/videos"
-                
-                params = {
-                    'access_token': fb_config['access_token'],
-                    'title': title if title else filename, # Use provided title or filename
-                    'description': description # Use provided description
-                }
-                
-                try:
-                    with open(filepath, 'rb') as video_file:
-                        files = {'source': video_file}
-                        response = requests.post(upload_url, params=params, files=files)
-                        response.raise_for_status() # Raise an exception for HTTP errors
-                        
-                        results.append(f"✅ Upload de '{filename}' réussi. Réponse: {response.json()}")
-                except requests.exceptions.RequestException as e:
-                    results.append(f"❌ Échec de l'upload de '{filename}': {e}")
+            for filepath, video_id, error in upload.upload_files(filepaths, fb_config['page_id'], fb_config['access_token'],
+                                                                 title, description, int(concurrency)):
+                filename = os.path.relpath(filepath, "output")
+                if error:
+                    results.append(f"❌ Échec de l'upload de '{filename}': {error}")
+                else:
+                    results.append(f"✅ Upload de '{filename}' réussi. ID de la vidéo : {video_id}")
             return "\n".join(results)
 
         upload_to_fb_button.click(
             fn=upload_videos_to_facebook,
-            inputs=[selected_files_to_upload_state, video_title_input, video_description_input, fb_config_state],
+            inputs=[selected_files_to_upload_state, video_title_input, video_description_input, fb_config_state, upload_concurrency_slider],
             outputs=upload_output_text
         )
         back_from_upload_btn.click(lambda: gr.update(selected=4), None, tabs)
@@ -508,7 +685,27 @@ def create_gui():
         back_from_faq_btn.click(lambda: gr.update(selected=6), None, tabs)
 
     print("Lancement de l'interface Gradio...")
+    demo.queue(default_concurrency_limit=concurrency)
     demo.launch(debug=True,share=True)
 
 if __name__ == "__main__":
-    create_gui()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Anime3rb Downloader (interface Gradio)")
+    parser.add_argument("--metrics-port", type=int, help="expose les métriques Prometheus sur ce port")
+    parser.add_argument("--profile", metavar="DIR", help="écrit les profils cProfile de chaque étape dans DIR")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="demandes traitées en même temps, tous utilisateurs confondus")
+    parser.add_argument("--max-downloads", type=int, default=registry.DEFAULT_WORKERS,
+                        help="téléchargements simultanés sur tout le serveur")
+    parser.add_argument("--prefetch", type=int, default=prefetch.PREFETCH_TOP, metavar="N",
+                        help="précharge la page et la couverture des N premiers résultats de recherche (0 : désactivé)")
+    parser.add_argument("--max-bandwidth", type=float, default=0, metavar="KBPS",
+                        help="débit maximal de tous les téléchargements du serveur, en Ko/s (0 : illimité)")
+    parser.add_argument("--bandwidth-schedule", metavar="WINDOWS",
+                        help="débits par plage horaire remplaçant --max-bandwidth, ex. \"01:00-07:00=0,07:00-01:00=2048\"")
+    args = parser.parse_args()
+    try:
+        schedule = bandwidth.parse_schedule(args.bandwidth_schedule)
+    except ValueError as e:
+        parser.error(str(e))
+    create_gui(args.metrics_port, args.profile, args.concurrency, args.max_downloads, args.prefetch,
+               args.max_bandwidth, schedule)
\ No newline at end of file
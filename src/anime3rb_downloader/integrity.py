@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+
+# --- Inline integrity checks ---
+# The content hash of a video is the sha256 of the concatenated sha256 digests of its
+# 4 MB blocks (the scheme Dropbox uses for content_hash). Unlike a plain sha256 it can
+# be computed while segments are written out of order: each connection hashes the
+# blocks its byte range covers as the bytes stream through the IOEngine, and the file
+# is never read back. Only blocks no stream covered from their first byte (a resumed
+# segment, a range not aligned on BLOCK_SIZE) are read from disk when the download ends.
+# The hash does not depend on how the file was split, so it identifies the content:
+# the library uses it to find an episode already held under another name.
+
+BLOCK_SIZE = 4 * 1024 * 1024
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+class IntegrityError(IOError):
+    """The bytes on disk do not match what the server announced; the download is retried from scratch."""
+
+
+class ContentHasher:
+    """Collects per-block digests from concurrent streams. Safe to share between threads."""
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.blocks = {}
+        self.hexdigest = None
+        self._lock = threading.Lock()
+
+    def stream(self, offset):
+        """Returns a BlockStream hashing the bytes written sequentially from `offset`."""
+        return BlockStream(self, offset)
+
+    def reset(self):
+        with self._lock:
+            self.blocks.clear()
+            self.hexdigest = None
+
+    def _store(self, index, digest):
+        with self._lock:
+            self.blocks[index] = digest
+
+    def finish(self, path):
+        """
+        Hashes from disk the blocks of `path` no stream covered and returns (and keeps in
+        `hexdigest`) the content hash of the file.
+        """
+        size = os.path.getsize(path)
+        count = -(-size // self.block_size)
+        with self._lock:
+            missing = [index for index in range(count) if index not in self.blocks]
+        if missing:
+            buffer = memoryview(bytearray(READ_BUFFER_SIZE))
+            with open(path, "rb", buffering=0) as f:
+                for index in missing:
+                    f.seek(index * self.block_size)
+                    digest = hashlib.sha256()
+                    remaining = min(self.block_size, size - index * self.block_size)
+                    while remaining:
+                        n = f.readinto(buffer[:min(len(buffer), remaining)])
+                        if not n:
+                            raise IntegrityError(f"{path} shrank while it was being hashed")
+                        digest.update(buffer[:n])
+                        remaining -= n
+                    self._store(index, digest.digest())
+        with self._lock:
+            self.hexdigest = hashlib.sha256(b"".join(self.blocks[index] for index in range(count))).hexdigest()
+        return self.hexdigest
+
+
+class BlockStream:
+    """Hashes one sequential stream of writes. A block is only recorded if the stream covered all of it."""
+
+    def __init__(self, hasher, offset):
+        self.hasher = hasher
+        self.position = offset
+        # A stream starting mid-block cannot hash that block; it starts at the next boundary.
+        self._digest = hashlib.sha256() if offset % hasher.block_size == 0 else None
+
+    def update(self, data):
+        view = memoryview(data)
+        block_size = self.hasher.block_size
+        while view:
+            block_end = (self.position // block_size + 1) * block_size
+            take = min(len(view), block_end - self.position)
+            if self._digest is not None:
+                self._digest.update(view[:take])
+            self.position += take
+            view = view[take:]
+            if self.position == block_end:
+                if self._digest is not None:
+                    self.hasher._store(self.position // block_size - 1, self._digest.digest())
+                self._digest = hashlib.sha256()
+
+    def close(self, at_end_of_file):
+        """Records the trailing partial block once the stream has reached the end of the file."""
+        if at_end_of_file and self._digest is not None and self.position % self.hasher.block_size:
+            self.hasher._store(self.position // self.hasher.block_size, self._digest.digest())
+
+
+def content_hash(path, block_size=BLOCK_SIZE):
+    """Content hash of a file already on disk (reads it)."""
+    return ContentHasher(block_size).finish(path)
+
+
+def verify_size(path, segments):
+    """
+    Raises IntegrityError unless every segment is complete and `path` has the size they
+    describe (segments as in segmented.py; an unknown size, end -1, is not checked).
+    """
+    if not segments:
+        return
+    incomplete = [segment for segment in segments if segment[1] >= 0 and segment[2] <= segment[1]]
+    if incomplete:
+        raise IntegrityError(f"{os.path.basename(path)}: {len(incomplete)} segment(s) incomplete")
+    if segments[-1][1] >= 0:
+        expected, actual = segments[-1][1] + 1, os.path.getsize(path)
+        if actual != expected:
+            raise IntegrityError(f"{os.path.basename(path)}: {actual} bytes on disk, {expected} announced")
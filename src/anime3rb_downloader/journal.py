@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from anime3rb_downloader.segmented import download_resumable, segments_written, DEFAULT_CONNECTIONS
+
+# --- Persistent download journal ---
+# One row per (title, episode): the resolved link, the target filename, the byte
+# segments already flushed to disk and whether the episode is complete. It lives next
+# to the downloads so that a rerun after a crash resumes instead of starting over.
+
+DEFAULT_JOURNAL_PATH = os.path.join("output", ".journal.sqlite3")
+
+
+class DownloadJournal:
+    """
+    Crash-safe record of per-episode download state, backed by sqlite.
+    Safe to share between download threads.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS episodes (
+                title TEXT NOT NULL,
+                episode TEXT NOT NULL,
+                link TEXT,
+                filename TEXT,
+                segments TEXT,
+                bytes_written INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (title, episode)
+            )"""
+        )
+
+    def get(self, title, episode):
+        """Returns the journal entry of an episode as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT link, filename, segments, bytes_written, done FROM episodes WHERE title = ? AND episode = ?",
+                (title, str(episode)),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "link": row[0],
+            "filename": row[1],
+            "segments": json.loads(row[2]) if row[2] else None,
+            "bytes_written": row[3],
+            "done": bool(row[4]),
+        }
+
+    def is_done(self, title, episode):
+        """True when the episode finished downloading and its file is still on disk."""
+        entry = self.get(title, episode)
+        return bool(entry and entry["done"] and entry["filename"] and os.path.exists(entry["filename"]))
+
+    def done_episodes(self, title):
+        """Returns the episodes (as strings) of `title` that are done and still on disk, in one query."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT episode, filename FROM episodes WHERE title = ? AND done = 1", (title,)
+            ).fetchall()
+        return {episode for episode, filename in rows if filename and os.path.exists(filename)}
+
+    def record_link(self, title, episode, link, filename):
+        """Stores the resolved download link and target file of an episode."""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO episodes (title, episode, link, filename, updated_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (title, episode) DO UPDATE SET link = excluded.link,
+                   filename = excluded.filename, done = 0, updated_at = excluded.updated_at""",
+                (title, str(episode), link, filename, time.time()),
+            )
+
+    def save_segments(self, title, episode, segments):
+        """Stores the segments (see segmented.py) whose bytes are flushed to disk."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE episodes SET segments = ?, bytes_written = ?, updated_at = ? WHERE title = ? AND episode = ?",
+                (json.dumps(segments), segments_written(segments), time.time(), title, str(episode)),
+            )
+
+    def mark_done(self, title, episode):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE episodes SET done = 1, updated_at = ? WHERE title = ? AND episode = ?",
+                (time.time(), title, str(episode)),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def download_with_journal(journal, title, episode, url, path, session, headers=None,
+                          connections=DEFAULT_CONNECTIONS, progress_callback=None, hasher=None, reuse=None,
+                          **retry_options):
+    """
+    Downloads an episode to `path`, resuming from the journal's last checkpoint if a
+    previous run was interrupted. Returns True on success (or if already done).
+    `hasher` (integrity.ContentHasher) is passed to download_resumable. `reuse(title, episode, path, url)`,
+    when given, is tried first: it returns the content hash of a copy of the episode it put
+    at `path` (see library.reuse_held_copy), or None to download. It is also how an episode
+    done under another file name gets a copy at `path`.
+    `retry_options` (max_retries, retry_delay) are passed to download_resumable.
+    """
+    entry = journal.get(title, episode)
+    if journal.is_done(title, episode) and (entry["filename"] == path or not reuse):
+        return True
+    segments = entry["segments"] if entry and entry["filename"] == path else None
+    journal.record_link(title, episode, url, path)
+    checksum = reuse(title, episode, path, url) if reuse else None
+    if checksum:
+        if hasher:
+            hasher.hexdigest = checksum
+        journal.mark_done(title, episode)
+        return True
+    done = download_resumable(
+        url, path, session, headers, connections, progress_callback, segments,
+        on_checkpoint=lambda segs: journal.save_segments(title, episode, segs), hasher=hasher, **retry_options,
+    )
+    if done:
+        journal.mark_done(title, episode)
+    return done
@@ -0,0 +1,319 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from anime3rb_downloader.integrity import content_hash
+
+# --- Local library index ---
+# One row per downloaded video: title, episode, quality, size, checksum and the link
+# it came from. Downloads register their file as they complete (in one transaction),
+# so listing, searching and paginating the library never touches the disk.
+# The checksum is the content hash computed while the file was downloaded (see
+# integrity.py). It lets a download reuse a copy of the episode already held in the
+# same quality under another name, and lets identical files share their disk blocks
+# (hard links).
+# reconcile() catches files added, removed or replaced behind our back: it only lists
+# the directories whose mtime changed since the last pass, so a library of tens of
+# thousands of files costs one stat per directory when nothing moved.
+
+DEFAULT_LIBRARY_PATH = os.path.join("output", ".library.sqlite3")
+DEFAULT_ROOT = "output"
+VIDEO_EXTENSIONS = (".mp4", ".mkv")
+PAGE_SIZE = 50
+
+# File names written by the CLI ("naruto - Episode 3 [END].mp4") and the GUI ("naruto-ep-3.mp4").
+_filename_patterns = (
+    re.compile(r"^(?P<title>.+?) - Episode (?P<episode>\d+)"),
+    re.compile(r"^(?P<title>.+?)-ep-(?P<episode>\d+)"),
+)
+_quality_re = re.compile(r"(?<!\d)(\d{3,4})p(?![a-z])", re.IGNORECASE)
+# Quality suffix of the titles the GUI gives non-default qualities ("naruto-720p").
+_title_quality_re = re.compile(r"-\d{3,4}p$", re.IGNORECASE)
+
+
+def parse_video_filename(filename):
+    """Returns (title, episode) guessed from a downloaded file's name, or (stem, None)."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    for pattern in _filename_patterns:
+        match = pattern.match(stem)
+        if match:
+            return match.group("title"), int(match.group("episode"))
+    return stem, None
+
+
+def quality_from_url(url):
+    """Returns the quality (e.g. 720) named in a download link, or None."""
+    match = _quality_re.search(os.path.basename((url or "").split("?")[0]))
+    return int(match.group(1)) if match else None
+
+
+class Library:
+    """sqlite index of the videos under `root`. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_LIBRARY_PATH, root=DEFAULT_ROOT):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                dir TEXT NOT NULL,
+                title TEXT NOT NULL,
+                episode INTEGER,
+                quality INTEGER,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                checksum TEXT,
+                source_url TEXT,
+                added_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+            CREATE INDEX IF NOT EXISTS files_title_episode ON files (title, episode);
+            CREATE INDEX IF NOT EXISTS files_added_at ON files (added_at);
+            CREATE INDEX IF NOT EXISTS files_checksum ON files (checksum);
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL
+            );"""
+        )
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _relative_dir(self, path):
+        return self._relative(os.path.dirname(os.path.abspath(path)) or ".")
+
+    def add(self, path, title=None, episode=None, quality=None, source_url=None, checksum=None):
+        """
+        Registers (or updates) a completed video. Missing title/episode are guessed from the
+        file name and the quality from `source_url`; `checksum` is the content hash, if known.
+        """
+        stat = os.stat(path)
+        guessed_title, guessed_episode = parse_video_filename(path)
+        with self._lock:
+            # The directory's mtime is left alone, so the next reconcile still rescans it
+            # and picks up anything else that changed there meanwhile.
+            self._conn.execute(
+                """INSERT OR REPLACE INTO files (path, dir, title, episode, quality, size, mtime, checksum, source_url,
+                   added_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (self._relative(path), self._relative_dir(path), title or guessed_title,
+                 int(episode) if episode is not None else guessed_episode,
+                 quality if quality is not None else quality_from_url(source_url), stat.st_size, stat.st_mtime,
+                 checksum, source_url, time.time()),
+            )
+
+    def remove(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (self._relative(path),))
+
+    def get(self, path):
+        """Returns the entry of a file (path relative to root) as a dict, or None."""
+        rows, _ = self._select("WHERE path = ?", (path,), limit=1)
+        return rows[0] if rows else None
+
+    def find(self, title, episode):
+        """Returns the entries of one episode of a title."""
+        rows, _ = self._select("WHERE title = ? AND episode = ?", (title, int(episode)))
+        return rows
+
+    def find_checksum(self, checksum):
+        """Returns the entries whose content hash is `checksum`."""
+        rows, _ = self._select("WHERE checksum = ?", (checksum,))
+        return rows
+
+    def held_copy(self, title, episode, quality):
+        """
+        Returns an entry of the episode in `quality` whose file is still on disk and unchanged
+        since it was hashed, or None. The title may carry the GUI's quality suffix or not.
+        """
+        base = _title_quality_re.sub("", title)
+        rows, _ = self._select("WHERE title IN (?, ?) AND episode = ? AND quality = ?",
+                               (base, f"{base}-{quality}p", int(episode), int(quality)))
+        for entry in rows:
+            if entry["checksum"] and self._unchanged(entry):
+                return entry
+        return None
+
+    def verify(self, path):
+        """Hashes a file (path relative to root) whose checksum is unknown, stores and returns it."""
+        full_path = os.path.join(self.root, path)
+        checksum = content_hash(full_path)
+        stat = os.stat(full_path)
+        with self._lock:
+            self._conn.execute("UPDATE files SET checksum = ?, size = ?, mtime = ? WHERE path = ?",
+                               (checksum, stat.st_size, stat.st_mtime, path))
+        return checksum
+
+    def _unchanged(self, entry):
+        try:
+            stat = os.stat(os.path.join(self.root, entry["path"]))
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime) == (entry["size"], entry["mtime"])
+
+    def query(self, search="", page=1, page_size=PAGE_SIZE):
+        """
+        Returns (entries, total) for one page of the library, newest first, optionally
+        filtered by a substring of the title or file name.
+        """
+        where, params = "", ()
+        if search:
+            where = "WHERE title LIKE ? OR path LIKE ?"
+            params = (f"%{search}%", f"%{search}%")
+        return self._select(where, params, limit=page_size, offset=(max(1, page) - 1) * page_size, count=True)
+
+    def _select(self, where, params, limit=None, offset=0, count=False):
+        keys = ("path", "title", "episode", "quality", "size", "mtime", "checksum", "source_url", "added_at")
+        sql = f"SELECT {', '.join(keys)} FROM files {where} ORDER BY added_at DESC, path"
+        if limit:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            total = self._conn.execute(f"SELECT COUNT(*) FROM files {where}", params).fetchone()[0] if count else None
+        return [dict(zip(keys, row)) for row in rows], total
+
+    def reconcile(self):
+        """
+        Brings the index in line with the disk, rescanning only directories whose mtime
+        changed. Returns {"added": n, "removed": n, "updated": n, "scanned_dirs": n}.
+        """
+        stats = {"added": 0, "removed": 0, "updated": 0, "scanned_dirs": 0}
+        if not os.path.isdir(self.root):
+            return stats
+        with self._lock:
+            known_dirs = dict(self._conn.execute("SELECT path, mtime FROM dirs").fetchall())
+        seen_dirs = set()
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            relative_dir = self._relative(directory)
+            seen_dirs.add(relative_dir)
+            try:
+                mtime = os.stat(directory).st_mtime
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            pending.extend(entry.path for entry in entries
+                           if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."))
+            if known_dirs.get(relative_dir) == mtime:
+                continue
+            stats["scanned_dirs"] += 1
+            self._reconcile_dir(directory, relative_dir, entries, mtime, stats)
+
+        gone = set(known_dirs) - seen_dirs
+        if gone:
+            with self._lock, self._conn:
+                self._conn.execute("BEGIN")
+                for relative_dir in gone:
+                    self._conn.execute("DELETE FROM dirs WHERE path = ?", (relative_dir,))
+                    stats["removed"] += self._conn.execute("DELETE FROM files WHERE dir = ?", (relative_dir,)).rowcount
+        return stats
+
+    def _reconcile_dir(self, directory, relative_dir, entries, mtime, stats):
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+        on_disk = {}
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(VIDEO_EXTENSIONS):
+                stat = entry.stat()
+                on_disk[prefix + entry.name] = (entry.path, stat.st_size, stat.st_mtime)
+        with self._lock:
+            indexed = {path: (size, file_mtime) for path, size, file_mtime in self._conn.execute(
+                "SELECT path, size, mtime FROM files WHERE dir = ?", (relative_dir,))}
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for path in set(indexed) - set(on_disk):
+                self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                stats["removed"] += 1
+            for path, (full_path, size, file_mtime) in on_disk.items():
+                if path not in indexed:
+                    title, episode = parse_video_filename(path)
+                    # The checksum of a foreign file is computed lazily (see verify/dedup), not here.
+                    self._conn.execute(
+                        """INSERT INTO files (path, dir, title, episode, quality, size, mtime, added_at)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (path, relative_dir, title, episode, quality_from_url(path), size, file_mtime, now),
+                    )
+                    stats["added"] += 1
+                elif indexed[path] != (size, file_mtime):
+                    self._conn.execute("UPDATE files SET size = ?, mtime = ?, checksum = NULL WHERE path = ?",
+                                       (size, file_mtime, path))
+                    stats["updated"] += 1
+            self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)", (relative_dir, mtime))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_library = None
+_default_library_lock = threading.Lock()
+
+
+def get_library():
+    """Returns the process-wide Library, creating it on first use."""
+    global _default_library
+    with _default_library_lock:
+        if _default_library is None:
+            _default_library = Library()
+        return _default_library
+
+
+def _hard_link(source, path):
+    # Replaces `path` atomically by a hard link to `source`.
+    temporary = path + ".link"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    os.link(source, temporary)
+    os.replace(temporary, path)
+
+
+def reuse_held_copy(title, episode, path, url=None, library=None):
+    """
+    If the library holds the episode under another name, in the quality of the download
+    link `url`, hard-links it to `path` instead of downloading it again. Returns the
+    content hash of the copy, or None (always when the link does not name its quality).
+    """
+    quality = quality_from_url(url)
+    if quality is None:
+        return None
+    library = library or get_library()
+    try:
+        entry = library.held_copy(title, episode, quality)
+        if entry is None:
+            return None
+        source = os.path.join(library.root, entry["path"])
+        if os.path.abspath(source) != os.path.abspath(path):
+            _hard_link(source, path)
+        print(f"Episode {episode} of {title} is already held as {entry['path']}, not downloading it again.")
+        return entry["checksum"]
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not reuse the held copy of {title} episode {episode}: {e}")
+        return None
+
+
+def register_download(path, title=None, episode=None, source_url=None, checksum=None, library=None):
+    """
+    Adds a finished download to the library. When another file has the same content hash,
+    the new file is replaced by a hard link to it. A failure is reported but never fails the download.
+    """
+    library = library or get_library()
+    try:
+        if checksum:
+            for entry in library.find_checksum(checksum):
+                source = os.path.join(library.root, entry["path"])
+                if os.path.abspath(source) != os.path.abspath(path) and library._unchanged(entry):
+                    if not os.path.samefile(source, path):
+                        _hard_link(source, path)
+                        print(f"{os.path.basename(path)} has the same content as {entry['path']}, linked to it.")
+                    break
+        library.add(path, title, episode, source_url=source_url, checksum=checksum)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not add {path} to the library: {e}")
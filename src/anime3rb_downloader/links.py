@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+
+from anime3rb_downloader import ratelimit
+
+# --- Resolved download link store ---
+# Resolving a download link costs a full episode page fetch + parse. The links are
+# signed CDN URLs that stay valid for a while, so we keep them per
+# (anime slug, episode, quality) and reuse them until they expire. Expiry is read
+# from the URL's query string when it carries one, otherwise a HEAD request tells
+# whether the link still works. The qualities each episode page offered are kept
+# too, so that a lookup only serves the best offered quality of the caller's
+# preference order (the CLI and the GUI prefer different ones).
+
+DEFAULT_LINKS_PATH = os.path.join("output", ".links.sqlite3")
+# Links expiring within this many seconds are treated as already expired.
+EXPIRY_MARGIN = 5 * 60
+HEAD_TIMEOUT = 10
+
+# Query parameters holding an absolute unix expiry timestamp.
+_ABSOLUTE_EXPIRY_PARAMS = ("expires", "expire", "expiry", "exp", "e", "x-expires")
+# (date parameter, lifetime parameter) pairs used by S3/GCS style presigned URLs.
+_RELATIVE_EXPIRY_PARAMS = (("x-amz-date", "x-amz-expires"), ("x-goog-date", "x-goog-expires"))
+
+
+def link_expiry(url):
+    """Returns the unix time at which a signed URL expires, or None if the URL does not say."""
+    params = {key.lower(): values[0] for key, values in parse_qs(urlparse(url).query).items() if values}
+    for name in _ABSOLUTE_EXPIRY_PARAMS:
+        value = params.get(name, "")
+        if value.isdigit():
+            timestamp = int(value)
+            # Some CDNs use milliseconds.
+            return timestamp / 1000 if timestamp > 10 ** 11 else timestamp
+    for date_name, lifetime_name in _RELATIVE_EXPIRY_PARAMS:
+        if date_name in params and params.get(lifetime_name, "").isdigit():
+            try:
+                signed_at = datetime.strptime(params[date_name], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            return signed_at.timestamp() + int(params[lifetime_name])
+    return None
+
+
+def is_link_fresh(url, expires_at=None, session=None, headers=None, margin=EXPIRY_MARGIN):
+    """
+    True if `url` can still be downloaded. Uses the known expiry time when there is one,
+    and otherwise (if a session is given) a HEAD request.
+    """
+    if expires_at is None:
+        expires_at = link_expiry(url)
+    if expires_at is not None:
+        return expires_at - margin > time.time()
+    if session is None:
+        return True
+    try:
+        response = ratelimit.head(session, url, ratelimit.VIDEO, headers=headers, allow_redirects=True,
+                                  timeout=HEAD_TIMEOUT, max_retries=1)
+        return response.status_code < 400
+    except Exception as e:
+        print(f"HEAD check failed for {url}: {e}")
+        return False
+
+
+class LinkStore:
+    """sqlite-backed store of resolved download links. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_LINKS_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS links (
+                slug TEXT NOT NULL,
+                episode TEXT NOT NULL,
+                quality TEXT NOT NULL,
+                url TEXT NOT NULL,
+                expires_at REAL,
+                resolved_at REAL NOT NULL,
+                PRIMARY KEY (slug, episode, quality)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS offers (
+                slug TEXT NOT NULL,
+                episode TEXT NOT NULL,
+                qualities TEXT NOT NULL,
+                PRIMARY KEY (slug, episode)
+            )"""
+        )
+
+    def put(self, slug, episode, quality, url):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO links (slug, episode, quality, url, expires_at, resolved_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (slug, str(episode), str(quality), url, link_expiry(url), time.time()),
+            )
+
+    def put_offered(self, slug, episode, qualities):
+        """Records the qualities the episode page offers."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO offers (slug, episode, qualities) VALUES (?, ?, ?)",
+                (slug, str(episode), ",".join(str(quality) for quality in qualities)),
+            )
+
+    def offered(self, slug, episode):
+        """Qualities the episode page offered when last resolved, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT qualities FROM offers WHERE slug = ? AND episode = ?", (slug, str(episode))
+            ).fetchone()
+        if row is None:
+            return None
+        return [int(quality) for quality in row[0].split(",") if quality]
+
+    def get(self, slug, episode, quality, session=None, headers=None):
+        """Returns the stored link if it is still fresh (see is_link_fresh), else drops it and returns None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, expires_at FROM links WHERE slug = ? AND episode = ? AND quality = ?",
+                (slug, str(episode), str(quality)),
+            ).fetchone()
+        if not row:
+            return None
+        if is_link_fresh(row[0], row[1], session, headers):
+            return row[0]
+        self.invalidate(slug, episode, quality)
+        return None
+
+    def lookup(self, slug, episode, qualities, session=None, headers=None):
+        """
+        Returns (quality, url) of the first quality in `qualities` the page offers if its
+        stored link is fresh, else (None, None). When the offered qualities are not known,
+        only the first of `qualities` is served.
+        """
+        offered = self.offered(slug, episode)
+        for quality in qualities:
+            if offered is not None and int(quality) not in offered:
+                continue
+            url = self.get(slug, episode, quality, session, headers)
+            return (quality, url) if url else (None, None)
+        return None, None
+
+    def invalidate(self, slug, episode, quality=None):
+        """Forgets the link of one quality, or of every quality of the episode."""
+        with self._lock:
+            if quality is None:
+                self._conn.execute("DELETE FROM links WHERE slug = ? AND episode = ?", (slug, str(episode)))
+            else:
+                self._conn.execute(
+                    "DELETE FROM links WHERE slug = ? AND episode = ? AND quality = ?",
+                    (slug, str(episode), str(quality)),
+                )
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_link_store():
+    """Returns the process-wide LinkStore, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LinkStore()
+        return _default_store
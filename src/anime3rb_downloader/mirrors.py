@@ -0,0 +1,241 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from anime3rb_downloader import bandwidth, ratelimit
+
+# --- Link selection ---
+# An episode page usually offers several links (qualities, sometimes servers). Instead
+# of matching the first preferred label, a LinkPolicy can rank them:
+#   * every candidate is HEAD-requested in parallel for its size (dead links are dropped),
+#   * optionally the first `probe_bytes` of each are fetched to measure throughput,
+#   * the candidates are ordered by the policy:
+#       quality   preferred quality first (the label order), fastest mirror first within a quality
+#       deadline  highest quality expected to finish within `max_minutes`, then quickest to finish
+#       smallest  smallest file first
+#       fastest   shortest expected download time first
+# The best link is downloaded; the others are kept as fallbacks. With `min_speed` set,
+# a ThroughputWatchdog aborts a download whose rate stays below it and the next
+# candidate is tried (the last one is never abandoned).
+
+QUALITY = "quality"
+DEADLINE = "deadline"
+SMALLEST = "smallest"
+FASTEST = "fastest"
+POLICIES = (QUALITY, DEADLINE, SMALLEST, FASTEST)
+
+DEFAULT_QUALITIES = (1080, 720, 480)
+PROBE_BYTES = 2 * 1024 * 1024
+PROBE_TIMEOUT = 20
+HEAD_TIMEOUT = 10
+# A download is judged on its rate over the last WATCH_WINDOW seconds, once WATCH_GRACE have passed.
+WATCH_WINDOW = 10.0
+WATCH_GRACE = 5.0
+
+_quality_re = re.compile(r"(\d{3,4})\s*p", re.IGNORECASE)
+_label_size_re = re.compile(r"([\d.]+)\s*([KMG])B", re.IGNORECASE)
+
+
+class SlowDownload(Exception):
+    """Raised (from a progress callback) when a download stays below the minimum throughput."""
+
+
+class LinkPolicy:
+    """How get_download_link picks among the links of an episode page (see the module comment)."""
+
+    def __init__(self, name=QUALITY, qualities=DEFAULT_QUALITIES, max_minutes=None, probe_bytes=None, min_speed=0):
+        if name not in POLICIES:
+            raise ValueError(f"Unknown link policy {name!r} (expected one of {', '.join(POLICIES)})")
+        self.name = name
+        self.qualities = tuple(int(q) for q in qualities)
+        self.max_minutes = max_minutes
+        # The deadline and fastest policies need a throughput estimate.
+        if probe_bytes is None:
+            probe_bytes = PROBE_BYTES if name in (DEADLINE, FASTEST) else 0
+        self.probe_bytes = probe_bytes
+        # Bytes per second; 0 disables switching links mid-download.
+        self.min_speed = min_speed
+
+    def __repr__(self):
+        return f"LinkPolicy({self.name!r}, max_minutes={self.max_minutes}, probe_bytes={self.probe_bytes})"
+
+
+def label_size(label):
+    """Size announced in an option label such as "[720p] 190 MB", in bytes, or None."""
+    match = _label_size_re.search(label or "")
+    if not match:
+        return None
+    return int(float(match.group(1)) * 1024 ** "KMG".index(match.group(2).upper()) * 1024)
+
+
+def candidates_from_options(options, qualities=DEFAULT_QUALITIES):
+    """
+    Turns [label_text, href] download options into candidate dicts (url, label, quality,
+    size), skipping HEVC links and qualities not in `qualities`.
+    """
+    candidates = []
+    for label, href in options or ():
+        if not href or "hevc" in (label or "").lower():
+            continue
+        match = _quality_re.search(label or "")
+        quality = int(match.group(1)) if match else None
+        if quality is not None and quality not in qualities:
+            continue
+        candidates.append({"url": href, "label": label, "quality": quality, "size": label_size(label),
+                           "throughput": None})
+    return candidates
+
+
+def probe(candidate, session, headers=None, probe_bytes=0):
+    """
+    HEADs a candidate for its size and, with `probe_bytes`, times a ranged GET of its first
+    bytes. Fills in size/throughput and returns False if the link does not work.
+    """
+    try:
+        response = ratelimit.head(session, candidate["url"], ratelimit.VIDEO, headers=headers, allow_redirects=True,
+                                  timeout=HEAD_TIMEOUT, max_retries=1)
+        if response.status_code >= 400:
+            return False
+        length = response.headers.get("content-length")
+        if length and length.isdigit() and int(length) > 0:
+            candidate["size"] = int(length)
+        if probe_bytes:
+            range_headers = dict(headers or {})
+            range_headers["Range"] = f"bytes=0-{probe_bytes - 1}"
+            started = time.perf_counter()
+            response = ratelimit.get(session, candidate["url"], ratelimit.VIDEO, headers=range_headers, stream=True,
+                                     timeout=PROBE_TIMEOUT, max_retries=1)
+            try:
+                if response.status_code >= 400:
+                    return False
+                received = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    received += len(chunk)
+                    if received >= probe_bytes:
+                        break
+            finally:
+                response.close()
+            candidate["throughput"] = received / max(time.perf_counter() - started, 1e-6)
+        return True
+    except Exception as e:
+        print(f"Probe of {candidate['url']} failed: {e}")
+        return False
+
+
+def expected_seconds(candidate):
+    if candidate["size"] and candidate["throughput"]:
+        return candidate["size"] / candidate["throughput"]
+    return None
+
+
+def rank(candidates, policy, session, headers=None, qualities=None):
+    """
+    Probes the candidates in parallel and returns the working ones, best first, according to
+    `policy`; `qualities` overrides the policy's quality preference order.
+    """
+    qualities = tuple(qualities or policy.qualities)
+    if not candidates:
+        return []
+    with ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        alive = list(executor.map(lambda c: probe(c, session, headers, policy.probe_bytes), candidates))
+    candidates = [candidate for candidate, ok in zip(candidates, alive) if ok]
+
+    def preference(candidate):
+        quality = candidate["quality"]
+        return qualities.index(quality) if quality in qualities else len(qualities)
+
+    def speed(candidate):
+        return -(candidate["throughput"] or 0)
+
+    def duration(candidate):
+        seconds = expected_seconds(candidate)
+        return seconds if seconds is not None else float("inf")
+
+    if policy.name == SMALLEST:
+        return sorted(candidates, key=lambda c: (c["size"] is None, c["size"] or 0, preference(c)))
+    if policy.name == FASTEST:
+        return sorted(candidates, key=lambda c: (duration(c), preference(c)))
+    if policy.name == DEADLINE and policy.max_minutes:
+        limit = policy.max_minutes * 60
+        in_time = [c for c in candidates if duration(c) <= limit]
+        late = [c for c in candidates if duration(c) > limit]
+        return (sorted(in_time, key=lambda c: (-(c["quality"] or 0), duration(c)))
+                + sorted(late, key=duration))
+    return sorted(candidates, key=lambda c: (preference(c), speed(c)))
+
+
+# Fallback links of the links handed out by get_download_link, for download_racing().
+_fallbacks = {}
+_fallbacks_lock = threading.Lock()
+
+
+def remember_fallbacks(url, fallbacks, min_speed=0):
+    with _fallbacks_lock:
+        _fallbacks[url] = (list(fallbacks), min_speed)
+
+
+def candidate_links(url):
+    """Returns ([url, fallback links...], min_speed) for a link chosen by rank()."""
+    with _fallbacks_lock:
+        fallbacks, min_speed = _fallbacks.get(url, ([], 0))
+    return [url] + fallbacks, min_speed
+
+
+class ThroughputWatchdog:
+    """Progress-callback wrapper raising SlowDownload when the rate over `window` seconds drops below `min_speed`."""
+
+    def __init__(self, min_speed, window=WATCH_WINDOW, grace=WATCH_GRACE):
+        self.min_speed = min_speed
+        self.window = window
+        self.grace = grace
+        self.tripped = None
+        self._samples = deque()
+        self._started = None
+        self._lock = threading.Lock()
+
+    def wrap(self, callback):
+        def watched(downloaded, total):
+            self.check(downloaded)
+            if callback:
+                callback(downloaded, total)
+        return watched
+
+    def check(self, downloaded):
+        with self._lock:
+            if self.tripped:
+                # Every segment thread stops at its next progress report.
+                raise SlowDownload(self.tripped)
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            self._samples.append((now, downloaded))
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+            if now - self._started < self.grace + self.window:
+                return
+            first_time, first_bytes = self._samples[0]
+            rate = (downloaded - first_bytes) / max(now - first_time, 1e-6)
+            # A link held back by the bandwidth cap is not a slow link.
+            share = bandwidth.governor.fair_share()
+            min_speed = min(self.min_speed, share / 2) if share else self.min_speed
+            if now - first_time >= self.window / 2 and rate < min_speed:
+                self.tripped = f"{rate / 1024:.0f} KB/s over the last {self.window:g}s, below {min_speed / 1024:.0f} KB/s"
+                raise SlowDownload(self.tripped)
+
+
+def download_racing(links, attempt, min_speed=0):
+    """
+    Calls attempt(link, wrap) for each link in turn until one does not raise SlowDownload;
+    `wrap(progress_callback)` returns the callback under a ThroughputWatchdog (except for
+    the last link, which always runs to the end). Returns (attempt's result, link).
+    """
+    for index, link in enumerate(links):
+        last = index == len(links) - 1
+        watchdog = ThroughputWatchdog(min_speed) if min_speed and not last else None
+        try:
+            return attempt(link, watchdog.wrap if watchdog else (lambda callback: callback)), link
+        except SlowDownload as e:
+            print(f"Download too slow ({e}), switching to the next link.")
+    return None, None
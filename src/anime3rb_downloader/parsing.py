@@ -0,0 +1,131 @@
+import html
+import re
+
+from anime3rb_downloader import telemetry
+
+# --- HTML parsing layer ---
+# Every anime3rb page we scrape only needs a small part of the document, so the
+# extractors below either parse just that part (SoupStrainer) or skip the tree
+# entirely (episode links and the episode count are found with a regex). lxml is
+# used when installed (pip install anime3rb_downloader[fast]); html.parser is the
+# fallback. BeautifulSoup is only imported by the first tree-based extractor, so a
+# run that only needs the regex ones never pays for it.
+
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+DOWNLOAD_LINKS_CLASS = "flex-grow flex flex-wrap gap-4 justify-center"
+EPISODE_COUNT_CLASS = "text-lg leading-relaxed"
+
+# <a ... rel="next" ...> of a paginated listing (Laravel pagination), and an href in it.
+_next_page_re = re.compile(r"""<a\b[^>]*\brel=["']next["'][^>]*>""")
+_href_re = re.compile(r"""\bhref=["']([^"']+)["']""")
+_episode_count_re = re.compile(r"""<p\b[^>]*\bclass=["']%s["'][^>]*>\s*([^<]*?)\s*</p>""" % re.escape(EPISODE_COUNT_CLASS))
+_strainers = None
+
+
+def strainer(name):
+    """Returns the SoupStrainer "download_links", "episode_count" or "search_cards", built on first use."""
+    global _strainers
+    if _strainers is None:
+        from bs4 import SoupStrainer
+
+        _strainers = {
+            "download_links": SoupStrainer("div", class_=DOWNLOAD_LINKS_CLASS),
+            "episode_count": SoupStrainer("p", class_=EPISODE_COUNT_CLASS),
+            "search_cards": SoupStrainer("a", class_=lambda x: x and "simple-title-card" in x),
+        }
+    return _strainers[name]
+
+
+def parse_html(content, parse_only=None, parser=None):
+    """Parses `content` with the fastest available backend, optionally only the parts matched by `parse_only`."""
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(content, parser or PARSER, parse_only=parse_only)
+
+
+def find_download_links_holder(content, parser=None):
+    """Returns the <div> holding the download <label>/<a> pairs of an episode page, or None."""
+    soup = parse_html(content, strainer("download_links"), parser)
+    return soup.find("div", class_=DOWNLOAD_LINKS_CLASS)
+
+
+@telemetry.timed(telemetry.PARSE, kind="download_options")
+def extract_download_options(content, parser=None):
+    """
+    Returns [label_text, href] for each download option of an episode page
+    (href is None when the label has no link next to it), or None if the page has no download links.
+    """
+    holder = find_download_links_holder(content, parser)
+    if not holder:
+        return None
+    options = []
+    for label in holder.find_all("label"):
+        link_tag = label.parent.find("a") if label.parent else None
+        href = link_tag["href"] if link_tag and link_tag.has_attr("href") else None
+        options.append([label.text, href])
+    return options
+
+
+@telemetry.timed(telemetry.PARSE, kind="episode_count")
+def find_episode_count_paragraphs(content, parser=None):
+    """Returns the <p class="text-lg leading-relaxed"> tags of a title page (the 2nd one holds the episode count)."""
+    return parse_html(content, strainer("episode_count"), parser).find_all("p", class_=EPISODE_COUNT_CLASS)
+
+
+@telemetry.timed(telemetry.PARSE, kind="episode_count")
+def find_episode_count(content):
+    """
+    Returns the episode count of a title page (the 2nd <p class="text-lg leading-relaxed">),
+    or None. Scans the raw HTML with a regex, and only parses the paragraphs when the
+    markup is not what the regex expects (e.g. tags inside the paragraph).
+    """
+    text = content.decode("utf-8", errors="replace") if isinstance(content, bytes) else content
+    paragraphs = _episode_count_re.findall(text)
+    try:
+        return int(paragraphs[1])
+    except (IndexError, ValueError):
+        pass
+    try:
+        return int(find_episode_count_paragraphs(content)[1].text.strip())
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+@telemetry.timed(telemetry.PARSE, kind="search")
+def find_search_cards(content, parser=None):
+    """Returns the <a class="simple-title-card ..."> tags of a search results page."""
+    return parse_html(content, strainer("search_cards"), parser).find_all("a")
+
+
+def iter_episode_links(content, anime_id):
+    """
+    Yields (ep_nbr, ep_link) for every episode <a> of a title page, in page order, as
+    the raw HTML is scanned (no tree, no list).
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    pattern = re.compile(
+        r"""<a\b[^>]*?\bhref=["'](https://anime3rb\.com/episode/%s/(\d+)[^"'\s>]*)["']""" % re.escape(anime_id)
+    )
+    for match in pattern.finditer(content):
+        yield match.group(2), match.group(1)
+
+
+@telemetry.timed(telemetry.PARSE, kind="episode_list")
+def find_episode_links(content, anime_id):
+    """Returns (ep_nbr, ep_link) for every episode <a> of a title page, in page order."""
+    return list(iter_episode_links(content, anime_id))
+
+
+def find_next_page(content):
+    """Returns the href of the "next page" link (rel="next") of a paginated listing, or None."""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    link = _next_page_re.search(content)
+    href = _href_re.search(link.group(0)) if link else None
+    return html.unescape(href.group(1)) if href else None
@@ -0,0 +1,73 @@
+import queue
+import threading
+
+from anime3rb_downloader import telemetry
+
+# --- Link resolution pipeline ---
+# Resolves episode pages on a small pool of threads and hands each result to the
+# download stage as soon as it is ready. The hand-off queue is bounded: when the
+# downloader falls behind, resolver threads block on it instead of scraping further
+# ahead, so signed links are not resolved long before they are used. The items are
+# pulled from their iterable as workers free up, so a lazy enumeration (see
+# core.iter_episodes) is only walked as far as resolution has got.
+
+DEFAULT_RESOLVE_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+def resolve_stream(items, resolve, workers=DEFAULT_RESOLVE_WORKERS, maxsize=DEFAULT_QUEUE_SIZE):
+    """
+    Generator yielding (item, resolve(item)) pairs in completion order.
+    At most `workers` items are being resolved and `maxsize` results are waiting
+    to be consumed at any time. Exceptions raised by `resolve` are printed and
+    yielded as a None result; one raised by `items` ends the stream.
+    """
+    if hasattr(items, "__len__"):
+        workers = min(workers, len(items))
+    workers = max(1, workers)
+    items = iter(items)
+    items_lock = threading.Lock()
+    results = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def worker():
+        try:
+            while not stopped.is_set():
+                try:
+                    with items_lock:
+                        item = next(items, _DONE)
+                except Exception as e:
+                    print(f"Error listing items to resolve: {e}")
+                    break
+                if item is _DONE:
+                    break
+                try:
+                    with telemetry.span(telemetry.RESOLVE) as event:
+                        result = resolve(item)
+                        event["ok"] = result is not None
+                except Exception as e:
+                    print(f"Error resolving {item}: {e}")
+                    result = None
+                results.put((item, result))
+        finally:
+            results.put(_DONE)
+
+    for _ in range(workers):
+        threading.Thread(target=worker, daemon=True).start()
+
+    finished = 0
+    try:
+        while finished < workers:
+            got = results.get()
+            if got is _DONE:
+                finished += 1
+                continue
+            yield got
+    finally:
+        # The consumer stopped early: let in-flight resolutions finish and unblock them.
+        stopped.set()
+        while finished < workers:
+            if results.get() is _DONE:
+                finished += 1
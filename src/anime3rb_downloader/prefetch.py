@@ -0,0 +1,206 @@
+import hashlib
+import io
+import itertools
+import os
+import threading
+
+from anime3rb_downloader import core, ratelimit
+from anime3rb_downloader.scheduler import Scheduler, PENDING, RUNNING
+
+# --- Search result prefetch ---
+# While the user reads a list of search results, the title pages of the first
+# PREFETCH_TOP results are fetched and parsed in the background (their episode lists
+# land in the page cache, see cache.py) and their covers are stored in a local
+# thumbnail cache, so that opening a result's details and episodes needs no request.
+# Prefetches run on a small Scheduler of their own, the latest search first, as
+# background requests of the rate limiter (see ratelimit.background): they only use
+# the capacity the user's own requests leave spare. A page the user asks for while it
+# is being prefetched is waited for, not fetched twice.
+
+PREFETCH_TOP = 5
+PREFETCH_WORKERS = 4
+
+DEFAULT_THUMBNAIL_DIR = os.path.join("output", ".thumbnails")
+THUMBNAIL_MAX_BYTES = 16 * 1024 * 1024
+# Covers are scaled down to fit this box (the GUI shows them 300 px high) when Pillow
+# is installed (it comes with gradio); otherwise they are stored as downloaded.
+THUMBNAIL_SIZE = (300, 450)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+
+def thumbnail_bytes(data, size=THUMBNAIL_SIZE):
+    """Returns (bytes, extension) of `data` scaled down to fit `size`, or None if it cannot be."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(size)
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=85)
+    except Exception:
+        return None
+    return out.getvalue(), ".jpg"
+
+
+class ThumbnailCache:
+    """Directory of cover thumbnails keyed by image URL, least recently used evicted past max_bytes."""
+
+    def __init__(self, directory=DEFAULT_THUMBNAIL_DIR, max_bytes=THUMBNAIL_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _name(self, url):
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def get(self, url):
+        """Returns the local path of the cached thumbnail of `url`, or None."""
+        name = self._name(url)
+        for extension in IMAGE_EXTENSIONS:
+            path = os.path.join(self.directory, name + extension)
+            try:
+                # The mtime records the last use, for eviction.
+                os.utime(path)
+            except OSError:
+                continue
+            return path
+        return None
+
+    def fetch(self, url, refresh=False):
+        """Returns the local path of the thumbnail of `url`, downloading it if needed; None on failure."""
+        if not refresh:
+            path = self.get(url)
+            if path:
+                return path
+        with self._lock:
+            done = self._inflight.get(url)
+            owner = done is None
+            if owner:
+                done = self._inflight[url] = threading.Event()
+        if not owner:
+            # Already being downloaded (by a prefetch, say): wait for it.
+            done.wait()
+            return self.get(url)
+        try:
+            return self._download(url)
+        except Exception as e:
+            print(f"Failed to fetch cover {url}: {e}")
+            return None
+        finally:
+            with self._lock:
+                del self._inflight[url]
+            done.set()
+
+    def _download(self, url):
+        response = core.fetch(url)
+        response.raise_for_status()
+        data, extension = response.content, os.path.splitext(url.split("?")[0])[1].lower()
+        thumbnail = thumbnail_bytes(data)
+        if thumbnail:
+            data, extension = thumbnail
+        elif extension not in IMAGE_EXTENSIONS:
+            extension = ".jpg"
+        path = os.path.join(self.directory, self._name(url) + extension)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._evict()
+        return path
+
+    def _evict(self):
+        # Drops the least recently used thumbnails until under max_bytes.
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(IMAGE_EXTENSIONS):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+
+class Prefetcher:
+    """Prefetches search results in the background. Safe to share between threads."""
+
+    def __init__(self, workers=PREFETCH_WORKERS, thumbnails=None):
+        self.scheduler = Scheduler(workers)
+        self.thumbnails = thumbnails or ThumbnailCache()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._searches = itertools.count()
+
+    def prefetch(self, anime_map, top=PREFETCH_TOP, refresh=False):
+        """
+        Queues the episode list and the cover of the first `top` results of `anime_map`
+        (as returned by core.search) and returns at once. `refresh=True` scrapes the
+        title pages again instead of reusing the page cache.
+        """
+        # Lower priorities run first: a newer search goes ahead of older ones.
+        priority = -next(self._searches)
+        for data in list(anime_map.values())[:top]:
+            if data.get("url"):
+                self._submit(("episode_list", data["url"]), priority, core.episode_list, data["url"], refresh)
+            if data.get("image"):
+                self._submit(("cover", data["image"]), priority, self.thumbnails.fetch, data["image"], refresh)
+
+    def _submit(self, key, priority, fn, *args):
+        with self._lock:
+            job = self._jobs.get(key)
+            if job and job.state in (PENDING, RUNNING):
+                self.scheduler.reprioritize(job, min(job.priority, priority))
+                return
+            self._jobs[key] = self.scheduler.submit(self._run, key, fn, *args, priority=priority, key=key)
+
+    def _run(self, key, fn, *args):
+        try:
+            with ratelimit.background():
+                return fn(*args)
+        finally:
+            with self._lock:
+                self._jobs.pop(key, None)
+
+    def _wait(self, key):
+        # A pending prefetch is dropped (the caller fetches now); a running one is waited for.
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return
+        if job.state == PENDING:
+            self.scheduler.cancel(job)
+        if job.state == RUNNING:
+            job.wait()
+
+    def episode_list(self, url, refresh=False):
+        """core.episode_list, waiting for a prefetch of the same page instead of fetching it again."""
+        if not refresh:
+            self._wait(("episode_list", url))
+        return core.episode_list(url, refresh)
+
+    def cover(self, url):
+        """Local path of the cover at `url` (fetched now if not prefetched yet), or None."""
+        return self.thumbnails.fetch(url) if url else None
+
+
+_default_prefetcher = None
+_default_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Returns the process-wide Prefetcher, creating it on first use."""
+    global _default_prefetcher
+    with _default_prefetcher_lock:
+        if _default_prefetcher is None:
+            _default_prefetcher = Prefetcher()
+        return _default_prefetcher
@@ -0,0 +1,210 @@
+import contextlib
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from anime3rb_downloader import telemetry
+
+# --- Adaptive per-host rate limiter ---
+# Every request to anime3rb or the CDN goes through get()/request() below. Per host
+# and per budget ("page" for scraping, including the conditional requests of
+# follow/sync, "video" for transfers, "upload" for the Graph API) it applies:
+#   * a token bucket (steady request rate + burst),
+#   * an AIMD concurrency limit: halved on 429/503, grown back by ~1 per
+#     `limit` successful requests, between 1 and max_concurrency,
+#   * retries with jittered exponential backoff, honouring Retry-After.
+# Requests made inside a background() block (prefetching) share the same limits but
+# only use spare capacity: they wait while a foreground request is waiting, and leave
+# a token and a concurrency slot for the next one.
+
+PAGE = "page"
+VIDEO = "video"
+UPLOAD = "upload"
+
+# rate: requests per second, burst: bucket size, max_concurrency: in-flight requests per host.
+BUDGETS = {
+    PAGE: {"rate": 2.0, "burst": 4, "max_concurrency": 4},
+    VIDEO: {"rate": 20.0, "burst": 20, "max_concurrency": 32},
+    UPLOAD: {"rate": 10.0, "burst": 10, "max_concurrency": 8},
+}
+MAX_RETRIES = 4
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+THROTTLE_STATUSES = (429, 503)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def background():
+    """Marks the requests made by the calling thread inside the block as background ones."""
+    previous = getattr(_local, "background", False)
+    _local.background = True
+    try:
+        yield
+    finally:
+        _local.background = previous
+
+
+def retry_after_seconds(response):
+    """Returns the delay requested by a Retry-After header (seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=RETRY_DELAY, cap=MAX_RETRY_DELAY):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HostLimiter:
+    """Token bucket + AIMD concurrency limit for one (budget, host) pair."""
+
+    def __init__(self, rate, burst, max_concurrency):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.waiting = 0
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self, background=False):
+        """
+        Waits for a token and a concurrency slot. A `background` caller also waits while
+        a foreground caller is waiting, and leaves one token and one slot spare.
+        """
+        reserve = 1 if background else 0
+        with self._cond:
+            if not background:
+                self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if now < self.blocked_until:
+                        wait = self.blocked_until - now
+                    elif background and self.waiting:
+                        # Woken when the foreground caller gets through.
+                        wait = None
+                    elif self.in_flight >= max(1, int(self.limit) - reserve):
+                        # Woken by release().
+                        wait = None
+                    elif self.tokens < 1 + reserve:
+                        wait = (1 + reserve - self.tokens) / self.rate
+                    else:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    self._cond.wait(wait)
+            finally:
+                if not background:
+                    self.waiting -= 1
+                    self._cond.notify_all()
+
+    def release(self, throttled=False, retry_after=None):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class RateLimiter:
+    """Keeps one HostLimiter per (budget, host). Safe to share between threads."""
+
+    def __init__(self, budgets=None):
+        self.budgets = {name: dict(settings) for name, settings in (budgets or BUDGETS).items()}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, budget, **settings):
+        """Changes the rate/burst/max_concurrency of a budget; applies to hosts seen afterwards."""
+        with self._lock:
+            self.budgets.setdefault(budget, dict(BUDGETS[PAGE])).update(settings)
+            self._hosts = {key: host for key, host in self._hosts.items() if key[0] != budget}
+
+    def host(self, budget, url):
+        key = (budget, urlparse(url).netloc)
+        with self._lock:
+            if key not in self._hosts:
+                self._hosts[key] = HostLimiter(**self.budgets[budget])
+            return self._hosts[key]
+
+    def request(self, session, method, url, budget=PAGE, max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, **kwargs):
+        """
+        Sends a request through the limiter, retrying throttled, failed (5xx) and
+        dropped requests. Returns the last response, or raises the last connection error.
+        Emits one telemetry "fetch" event per call (time to response headers for streams).
+        """
+        # Imported here rather than at the top so that importing the package stays fast;
+        # `session` is a requests session, so requests is already loaded by now.
+        import requests
+
+        host = self.host(budget, url)
+        with telemetry.span(telemetry.FETCH, kind=budget, host=urlparse(url).netloc) as event:
+            for attempt in range(max_retries + 1):
+                event["attempts"] = attempt + 1
+                host.acquire(getattr(_local, "background", False))
+                try:
+                    response = session.request(method, url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    host.release()
+                    if attempt == max_retries:
+                        raise
+                    print(f"Request to {url} failed ({e}), retrying...")
+                    time.sleep(backoff_delay(attempt, retry_delay))
+                    continue
+
+                throttled = response.status_code in THROTTLE_STATUSES
+                retry_after = retry_after_seconds(response) if throttled else None
+                host.release(throttled, retry_after)
+                if throttled:
+                    event["throttled"] = event.get("throttled", 0) + 1
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    event["status"] = response.status_code
+                    event["ok"] = response.status_code < 400
+                    if not kwargs.get("stream"):
+                        event["bytes"] = len(response.content)
+                    return response
+                response.close()
+                delay = retry_after if retry_after is not None else backoff_delay(attempt, retry_delay)
+                print(f"{url} answered {response.status_code}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+
+limiter = RateLimiter()
+
+
+def get(session, url, budget=PAGE, **kwargs):
+    """Rate-limited session.get(url, **kwargs) through the shared limiter."""
+    return limiter.request(session, "GET", url, budget, **kwargs)
+
+
+def post(session, url, budget=PAGE, **kwargs):
+    """Rate-limited session.post(url, **kwargs) through the shared limiter."""
+    return limiter.request(session, "POST", url, budget, **kwargs)
+
+
+def head(session, url, budget=PAGE, **kwargs):
+    """Rate-limited session.head(url, **kwargs) through the shared limiter."""
+    kwargs.setdefault("allow_redirects", False)
+    return limiter.request(session, "HEAD", url, budget, **kwargs)
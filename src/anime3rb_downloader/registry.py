@@ -0,0 +1,197 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+from anime3rb_downloader.scheduler import Scheduler, JobCancelled
+
+# --- Shared download registry ---
+# Server-wide table of in-flight downloads, keyed by (title, episode, quality), so
+# that concurrent requests for the same episode (two users of the GUI, say) attach
+# to one download instead of fetching it twice. Each SharedDownload runs as a job of
+# the registry's own Scheduler, whose worker count caps the downloads running on the
+# whole server, and records its progress (bytes, total, recent throughput) for any
+# number of watchers to poll; listeners are called when it finishes. A request detaches from its downloads when it ends or
+# is abandoned; a download nobody watches any more is cancelled. Finished downloads
+# leave the table: asking again later starts afresh (and the journal/library turn
+# an already complete episode into a no-op).
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+DEFAULT_WORKERS = 3
+# Throughput is measured over the last RATE_WINDOW seconds of progress.
+RATE_WINDOW = 5.0
+
+
+class SharedDownload:
+    """One in-flight download and its progress, shared by every request watching it."""
+
+    def __init__(self, key, label=None):
+        self.key = key
+        self.label = label or str(key)
+        self.state = QUEUED
+        self.downloaded = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.watchers = 0
+        self.job = None
+        self.started = None
+        self.ended = None
+        self._samples = deque()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        return self.state in FINISHED
+
+    def progress(self, downloaded, total):
+        """Progress callback of the download: records (downloaded, total) bytes."""
+        now = time.monotonic()
+        with self._lock:
+            self.downloaded = downloaded
+            self.total = total or None
+            self._samples.append((now, downloaded))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+
+    def rate(self):
+        """Bytes per second over the last RATE_WINDOW seconds (0 once finished)."""
+        if self.state != RUNNING:
+            return 0.0
+        with self._lock:
+            if len(self._samples) < 2:
+                return 0.0
+            (first_time, first_bytes), (last_time, last_bytes) = self._samples[0], self._samples[-1]
+        # A download that stopped reporting is not still going at its last rate.
+        elapsed = max(time.monotonic(), last_time) - first_time
+        return (last_bytes - first_bytes) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Seconds left at the current rate, or None when unknown."""
+        rate = self.rate()
+        if not (self.total and rate):
+            return None
+        return max(0.0, (self.total - self.downloaded) / rate)
+
+    def add_listener(self, fn):
+        """Calls fn(download) once the download has finished (at once if it already has)."""
+        with self._lock:
+            if not self.finished:
+                self._listeners.append(fn)
+                return
+        fn(self)
+
+    def wait(self, timeout=None):
+        """Blocks until the download has finished; returns True if it has."""
+        return self._finished.wait(timeout)
+
+    def __repr__(self):
+        return f"SharedDownload({self.key!r}, state={self.state}, watchers={self.watchers})"
+
+
+class DownloadRegistry:
+    """Dedups downloads by key and runs them on `workers` threads. Safe to share between threads."""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self.scheduler = Scheduler(workers)
+        self._downloads = {}
+        self._lock = threading.Lock()
+        self._requests = itertools.count()
+
+    def next_request(self):
+        """Number of a new request; use it in `priority` to serve requests first come, first served."""
+        return next(self._requests)
+
+    def get(self, key):
+        """Returns the in-flight download of `key`, or None."""
+        with self._lock:
+            return self._downloads.get(key)
+
+    def attach(self, key, fn, *args, priority=0, label=None, **kwargs):
+        """
+        Returns (download, created): the in-flight download of `key`, or a new one running
+        fn(*args, progress_callback=download.progress, **kwargs) on the registry's workers
+        at `priority`. Either way the caller becomes one of its watchers (see detach).
+        `fn` returns True on success.
+        """
+        while True:
+            with self._lock:
+                download = self._downloads.get(key)
+                if download is None or not download.job.cancelled:
+                    created = download is None
+                    if created:
+                        download = self._downloads[key] = SharedDownload(key, label)
+                        download.job = self.scheduler.submit(self._run, download, fn, args, kwargs, priority=priority,
+                                                             key=key)
+                    download.watchers += 1
+                    return download, created
+            # A cancelled download may still be writing its file: start afresh once it has stopped.
+            download.wait()
+
+    def detach(self, download):
+        """Stops watching `download`; it is cancelled once nobody watches it."""
+        with self._lock:
+            download.watchers -= 1
+            if download.watchers > 0 or download.finished:
+                return
+            # Cancelled under the lock, so that no request attaches to it in between.
+            self.scheduler.cancel(download.job)
+        if download.job.state == CANCELLED and not download.started:
+            # It never started, so _run will not finish it.
+            self._finish(download, CANCELLED)
+
+    def downloads(self):
+        """Snapshot of the in-flight downloads."""
+        with self._lock:
+            return list(self._downloads.values())
+
+    def _run(self, download, fn, args, kwargs):
+        download.state = RUNNING
+        download.started = time.monotonic()
+        state = FAILED
+        try:
+            download.result = fn(*args, progress_callback=download.progress, **kwargs)
+            state = DONE if download.result else FAILED
+        except JobCancelled:
+            state = CANCELLED
+            raise
+        except Exception as e:
+            download.error = e
+            raise
+        finally:
+            self._finish(download, state)
+        return download.result
+
+    def _finish(self, download, state):
+        with self._lock:
+            if self._downloads.get(download.key) is download:
+                del self._downloads[download.key]
+        with download._lock:
+            download.state = state
+            download.ended = time.monotonic()
+            listeners, download._listeners = download._listeners, []
+        download._finished.set()
+        for fn in listeners:
+            fn(download)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry(workers=None):
+    """Returns the process-wide DownloadRegistry, creating it (with `workers`) on first use."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = DownloadRegistry(workers or DEFAULT_WORKERS)
+        return _default_registry
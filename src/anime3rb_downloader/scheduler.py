@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import threading
+
+# --- Download scheduler ---
+# A fixed pool of worker threads fed by a priority queue. Workers sleep on a
+# condition variable and are woken as soon as a job is submitted, so there is
+# no polling anywhere. Lower priority values run first.
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job (see Job.check_cancelled) once it has been cancelled."""
+
+
+def current_job():
+    """Returns the Job running on the calling worker thread, or None."""
+    return getattr(_local, "job", None)
+
+
+class Job:
+    """A unit of work submitted to a Scheduler."""
+
+    def __init__(self, fn, args, kwargs, priority, key):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.key = key
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self._seq = None
+        self._cancel_requested = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_requested.is_set()
+
+    def check_cancelled(self):
+        """
+        Called by long-running job code (e.g. from a download progress callback)
+        to stop as soon as the job has been cancelled.
+        """
+        if self._cancel_requested.is_set():
+            raise JobCancelled(f"Job {self.key} cancelled")
+
+    def wait(self, timeout=None):
+        """Blocks until the job has finished, failed or been cancelled, and returns its result."""
+        self._finished.wait(timeout)
+        return self.result
+
+    def __repr__(self):
+        return f"Job(key={self.key!r}, priority={self.priority}, state={self.state})"
+
+
+class Scheduler:
+    """
+    Runs submitted jobs on `workers` threads in priority order.
+    When `max_pending` is set, submit() blocks while that many jobs are waiting,
+    which propagates backpressure to whatever produces the jobs.
+    """
+
+    def __init__(self, workers=3, max_pending=None):
+        self.max_pending = max_pending
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._unfinished = 0
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=0, key=None, **kwargs):
+        """Queues fn(*args, **kwargs) and returns its Job."""
+        job = Job(fn, args, kwargs, priority, key)
+        with self._cond:
+            while self.max_pending and self._pending >= self.max_pending and not self._shutdown:
+                self._cond.wait()
+            if self._shutdown:
+                raise RuntimeError("Scheduler is shut down")
+            self._push(job)
+            self._pending += 1
+            self._unfinished += 1
+            self._cond.notify_all()
+        return job
+
+    def reprioritize(self, job, priority):
+        """Moves a pending job to a new priority; returns False if it already started."""
+        with self._cond:
+            if job.state != PENDING:
+                return False
+            job.priority = priority
+            # The old heap entry becomes stale and is skipped when popped.
+            self._push(job)
+            return True
+
+    def cancel(self, job):
+        """
+        Cancels a job. A pending job is dropped immediately; a running job is
+        asked to stop and ends at its next check_cancelled() call.
+        """
+        with self._cond:
+            job._cancel_requested.set()
+            if job.state == PENDING:
+                self._pending -= 1
+                self._finish(job, CANCELLED)
+                self._cond.notify_all()
+                return True
+            return job.state == RUNNING
+
+    def find(self, key):
+        """Returns the pending job with the given key, or None."""
+        with self._cond:
+            for _, _, job in self._heap:
+                if job.key == key and job.state == PENDING:
+                    return job
+        return None
+
+    def join(self):
+        """Blocks until every submitted job has finished."""
+        with self._cond:
+            while self._unfinished:
+                self._cond.wait()
+
+    def shutdown(self, cancel_pending=False):
+        """Stops the workers once the queue is drained (or immediately, dropping pending jobs)."""
+        with self._cond:
+            if cancel_pending:
+                while self._heap:
+                    _, seq, job = heapq.heappop(self._heap)
+                    if job.state == PENDING and seq == job._seq:
+                        job._cancel_requested.set()
+                        self._pending -= 1
+                        self._finish(job, CANCELLED)
+            self._shutdown = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _push(self, job):
+        job._seq = next(self._counter)
+        heapq.heappush(self._heap, (job.priority, job._seq, job))
+
+    def _finish(self, job, state):
+        # Caller holds self._cond.
+        job.state = state
+        self._unfinished -= 1
+        job._finished.set()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                while self._heap:
+                    _, seq, job = heapq.heappop(self._heap)
+                    if job.state == PENDING and seq == job._seq:
+                        job.state = RUNNING
+                        self._pending -= 1
+                        self._cond.notify_all()
+                        return job
+                if self._shutdown:
+                    return None
+                self._cond.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            _local.job = job
+            try:
+                job.result = job.fn(*job.args, **job.kwargs)
+                state = DONE
+            except JobCancelled:
+                state = CANCELLED
+            except Exception as e:
+                print(f"Job {job.key} failed: {e}")
+                job.error = e
+                state = FAILED
+            _local.job = None
+            with self._cond:
+                self._finish(job, state)
+                self._cond.notify_all()
@@ -0,0 +1,339 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from anime3rb_downloader import fastio, integrity, ratelimit, telemetry
+
+# --- Segmented (multi-connection) download engine ---
+# Splits a file into byte ranges and fetches them in parallel, each range being
+# written at its own offset in a preallocated output file.
+#
+# Progress is tracked as a list of [start, end, next_offset] segments (end inclusive,
+# -1 when the size is unknown). A segment is complete once next_offset > end. The
+# same list is handed to `on_checkpoint` so callers can persist it and resume later.
+#
+# Bytes are moved to disk by a fastio.IOEngine (buffer size, preallocation and
+# progress rate); every download function takes an optional `engine`. An optional
+# integrity.ContentHasher hashes the bytes as they are written; segments are aligned on
+# its block size so that each connection hashes whole blocks.
+
+DEFAULT_CONNECTIONS = 4
+MIN_SEGMENT_SIZE = 2 * 1024 * 1024
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+PART_SUFFIX = ".part"
+
+_content_range_re = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class RangeNotSupported(Exception):
+    """Raised when the server ignores the Range header of a segment request."""
+
+
+def _resolve_session(session):
+    # `session` is either a requests session or a callable returning the calling thread's one.
+    return session() if callable(session) else session
+
+
+def probe_range_support(session, url, headers=None):
+    """
+    Asks the server for the first byte of the file.
+    Returns a tuple (total_size, accepts_ranges); total_size is 0 when unknown.
+    """
+    probe_headers = dict(headers or {})
+    probe_headers["Range"] = "bytes=0-0"
+    response = ratelimit.get(_resolve_session(session), url, ratelimit.VIDEO, headers=probe_headers, stream=True)
+    try:
+        if response.status_code == 206:
+            match = _content_range_re.match(response.headers.get("content-range", ""))
+            if match and match.group(3) != "*":
+                return int(match.group(3)), True
+            return 0, False
+        if response.status_code == 200:
+            return int(response.headers.get("content-length", 0)), False
+        response.raise_for_status()
+        return 0, False
+    finally:
+        response.close()
+
+
+def split_ranges(total_size, connections, min_segment_size=MIN_SEGMENT_SIZE, align=1):
+    """
+    Splits [0, total_size) into at most `connections` inclusive (start, end) byte ranges,
+    none smaller than `min_segment_size` (except the last one), each starting on a
+    multiple of `align`.
+    """
+    if total_size <= 0:
+        return []
+    count = max(1, min(connections, total_size // max(min_segment_size, 1) or 1))
+    segment_size = -(-total_size // count)
+    segment_size = -(-segment_size // align) * align
+    return [(start, min(start + segment_size, total_size) - 1) for start in range(0, total_size, segment_size)]
+
+
+def segments_total(segments):
+    """Returns the file size described by a segment list, or 0 if unknown."""
+    if not segments or segments[-1][1] < 0:
+        return 0
+    return segments[-1][1] + 1
+
+
+def segments_written(segments):
+    """Returns the number of bytes already written according to a segment list."""
+    return sum(next_offset - start for start, _, next_offset in segments)
+
+
+def _fetch_segment(session, url, headers, path, segment, on_bytes, on_checkpoint, engine, hasher, total_size):
+    start, end, offset = segment
+    if offset > end:
+        return
+    range_headers = dict(headers or {})
+    range_headers["Range"] = f"bytes={offset}-{end}"
+    response = ratelimit.get(_resolve_session(session), url, ratelimit.VIDEO, headers=range_headers, stream=True)
+    try:
+        if response.status_code != 206:
+            raise RangeNotSupported(f"Expected 206 for range {offset}-{end}, got {response.status_code}")
+
+        with open(path, "r+b") as f:
+            def commit():
+                # segment[2] only ever holds offsets that are already on disk.
+                segment[2] = offset
+                if on_checkpoint:
+                    on_checkpoint()
+
+            def written(n):
+                nonlocal offset
+                offset += n
+                if on_bytes:
+                    on_bytes(n)
+                if offset - segment[2] >= CHECKPOINT_BYTES:
+                    _checkpoint(f, commit)
+
+            f.seek(offset)
+            stream = hasher.stream(offset) if hasher else None
+            engine.copy(response, f, end + 1 - offset, written, stream.update if stream else None)
+            _checkpoint(f, commit)
+        if offset <= end:
+            raise IOError(f"Short read for range {start}-{end}: stopped at offset {offset}")
+        if stream:
+            stream.close(at_end_of_file=end + 1 == total_size)
+    finally:
+        response.close()
+
+
+def _checkpoint(f, commit):
+    f.flush()
+    os.fsync(f.fileno())
+    commit()
+
+
+def download_segmented(url, path, session, headers=None, connections=DEFAULT_CONNECTIONS,
+                       progress_callback=None, segments=None, on_checkpoint=None, engine=None, hasher=None):
+    """
+    Downloads `url` into `path` over `connections` parallel Range requests.
+    `session` is a requests session able to pool at least `connections` connections
+    per host, or a callable returning a session for the calling thread (such as
+    SessionPool.get), which is then called from each segment thread.
+
+    `segments` resumes a previous attempt (see the module comment); it must describe
+    the same file size as the server reports, otherwise the download restarts.
+    `on_checkpoint(segments)` is called whenever written data has been flushed to disk.
+
+    Returns True on success, False when the server does not honour Range requests
+    (or the size is unknown) so the caller can fall back to a single-stream download.
+    `progress_callback(downloaded, total)` is called as bytes arrive, and `hasher`
+    (an integrity.ContentHasher) is fed the bytes as they are written.
+    """
+    engine = engine or fastio.engine
+    total_size, accepts_ranges = probe_range_support(session, url, headers)
+    if not accepts_ranges or total_size <= 0:
+        return False
+
+    if not segments or segments_total(segments) != total_size or not os.path.exists(path):
+        segments = [[start, end, start] for start, end in
+                    split_ranges(total_size, connections, align=hasher.block_size if hasher else 1)]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            engine.allocate(f, total_size)
+
+    lock = threading.Lock()
+    downloaded = [segments_written(segments)]
+
+    def on_bytes(n):
+        with lock:
+            downloaded[0] += n
+            if progress_callback:
+                progress_callback(downloaded[0], total_size)
+
+    def checkpoint():
+        if on_checkpoint:
+            with lock:
+                on_checkpoint([list(segment) for segment in segments])
+
+    pending = [segment for segment in segments if segment[2] <= segment[1]]
+    if not pending:
+        return True
+    with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        futures = [executor.submit(_fetch_segment, session, url, headers, path, segment, on_bytes, checkpoint, engine,
+                                   hasher, total_size)
+                   for segment in pending]
+        try:
+            for future in futures:
+                future.result()
+        except RangeNotSupported:
+            for future in futures:
+                future.cancel()
+            return False
+    return True
+
+
+def download_stream(url, path, session, headers=None, progress_callback=None, segments=None, on_checkpoint=None,
+                    engine=None, hasher=None):
+    """
+    Downloads `url` into `path` over a single streamed GET.
+    When `segments` records a previous partial attempt the download resumes from its
+    last checkpointed offset with a Range request, or restarts if the server ignores it.
+    Returns True on success, False on an HTTP error. Raises IOError if the body ends
+    before its announced length.
+    """
+    engine = engine or fastio.engine
+    offset = segments[0][2] if segments and os.path.exists(path) else 0
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+    response = ratelimit.get(_resolve_session(session), url, ratelimit.VIDEO, headers=request_headers, stream=True)
+    try:
+        if response.status_code == 200:
+            offset = 0
+        elif response.status_code != 206:
+            print(f"Failed to download video: {response.status_code}")
+            return False
+
+        total_size = offset + int(response.headers.get('content-length', 0))
+        segment = [0, total_size - 1 if total_size else -1, offset]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "r+b" if offset else "wb") as f:
+            if total_size:
+                engine.allocate(f, total_size)
+            else:
+                f.truncate(offset)
+            f.seek(offset)
+
+            def commit():
+                segment[2] = offset
+                if on_checkpoint:
+                    on_checkpoint([list(segment)])
+
+            def written(n):
+                nonlocal offset
+                offset += n
+                if progress_callback:
+                    progress_callback(offset, total_size)
+                if offset - segment[2] >= CHECKPOINT_BYTES:
+                    _checkpoint(f, commit)
+
+            stream = hasher.stream(offset) if hasher else None
+            engine.copy(response, f, total_size - offset if total_size else None, written,
+                        stream.update if stream else None)
+            _checkpoint(f, commit)
+        if total_size and offset < total_size:
+            raise IOError(f"Short read: stopped at offset {offset} of {total_size}")
+        if stream:
+            stream.close(at_end_of_file=True)
+        return True
+    finally:
+        response.close()
+
+
+def download_resumable(url, path, session, headers=None, connections=DEFAULT_CONNECTIONS,
+                       progress_callback=None, segments=None, on_checkpoint=None,
+                       max_retries=0, retry_delay=ratelimit.RETRY_DELAY, engine=None, hasher=None):
+    """
+    Downloads `url` to `path` through a `path + PART_SUFFIX` file that is only renamed
+    once complete, so an interrupted run never leaves a truncated file under the final name.
+    Uses parallel segments when possible and a single stream otherwise; both resume
+    from `segments` when given.
+
+    A dropped connection or short read is retried up to `max_retries` times with
+    jittered exponential backoff, resuming from the last checkpoint. Before the rename the
+    file is checked against the announced size (a mismatch is retried from scratch), and
+    when a `hasher` (integrity.ContentHasher) is given its content hash is completed and
+    left in hasher.hexdigest. Returns True on success, False if the server refuses the
+    link (HTTP error status). `progress_callback` is throttled to the engine's progress_interval.
+    Emits telemetry "download_start" and "download" (duration, bytes written) events.
+    """
+    import requests
+
+    engine = engine or fastio.engine
+    progress = engine.throttle(progress_callback)
+    part_path = path + PART_SUFFIX
+    latest = [segments]
+
+    def checkpoint(new_segments):
+        latest[0] = new_segments
+        if on_checkpoint:
+            on_checkpoint(new_segments)
+
+    filename = os.path.basename(path)
+    resumed_from = segments_written(segments) if segments else 0
+    telemetry.emit("download_start", file=filename, resumed_from=resumed_from)
+    with telemetry.span(telemetry.DOWNLOAD, file=filename) as event:
+        try:
+            for attempt in range(max_retries + 1):
+                event["attempts"] = attempt + 1
+                try:
+                    done = _download_part(url, part_path, session, headers, connections, progress, latest[0],
+                                          checkpoint, engine, hasher)
+                    if done:
+                        _verify(part_path, latest, hasher)
+                    break
+                except requests.HTTPError as e:
+                    if e.response is not None and 400 <= e.response.status_code < 500:
+                        print(f"Failed to download video: {e.response.status_code}")
+                        done = False
+                        break
+                    if attempt == max_retries:
+                        raise
+                except (requests.RequestException, IOError) as e:
+                    if attempt == max_retries:
+                        raise
+                    print(f"Download of {filename} interrupted ({e}), resuming...")
+                time.sleep(ratelimit.backoff_delay(attempt, retry_delay))
+        finally:
+            event["bytes"] = max(0, segments_written(latest[0]) - resumed_from) if latest[0] else 0
+        event["ok"] = done
+    if isinstance(progress, fastio.ProgressThrottle):
+        progress.flush()
+    if done:
+        os.replace(part_path, path)
+    return done
+
+
+def _verify(part_path, latest, hasher):
+    try:
+        integrity.verify_size(part_path, latest[0])
+    except integrity.IntegrityError:
+        # Every segment claims to be complete, so resuming would change nothing: start over.
+        latest[0] = None
+        if hasher:
+            hasher.reset()
+        raise
+    if hasher:
+        hasher.finish(part_path)
+
+
+def _download_part(url, part_path, session, headers, connections, progress_callback, segments, on_checkpoint, engine,
+                   hasher):
+    done = connections > 1 and download_segmented(url, part_path, session, headers, connections,
+                                                   progress_callback, segments, on_checkpoint, engine, hasher)
+    if not done:
+        # A multi-segment state cannot be resumed over a single stream.
+        single = segments if segments and len(segments) == 1 else None
+        done = download_stream(url, part_path, session, headers, progress_callback, single, on_checkpoint, engine,
+                               hasher)
+    return done
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+
+# --- Session pool ---
+# Each thread gets its own cloudscraper session (a requests.Session is not meant
+# to be shared between threads) with a connection pool sized for segmented
+# downloads. Cloudflare clearance cookies obtained by any session are shared with
+# the others and saved to disk, so a new process can reuse a still-valid clearance
+# instead of solving the challenge again.
+
+DEFAULT_CLEARANCE_PATH = os.path.join("output", ".cf_clearance.json")
+CLEARANCE_COOKIES = ("cf_clearance", "__cf_bm")
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+
+
+def tune_connection_pool(session, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    """Resizes the connection pools of every adapter mounted on `session`."""
+    for adapter in session.adapters.values():
+        adapter._pool_connections = pool_connections
+        adapter._pool_maxsize = pool_maxsize
+        adapter.init_poolmanager(pool_connections, pool_maxsize, block=adapter._pool_block)
+
+
+class SessionPool:
+    """Hands out one session per thread, all sharing (and persisting) Cloudflare clearance cookies."""
+
+    def __init__(self, clearance_path=DEFAULT_CLEARANCE_PATH, pool_connections=POOL_CONNECTIONS,
+                 pool_maxsize=POOL_MAXSIZE):
+        self.clearance_path = clearance_path
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._clearance = {}
+        self._version = 0
+        self._load()
+
+    def get(self):
+        """Returns the calling thread's session, with the latest shared clearance cookies."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            # Imported on first use: cloudscraper (and requests) take a while to import.
+            import cloudscraper
+
+            session = cloudscraper.create_scraper()
+            tune_connection_pool(session, self.pool_connections, self.pool_maxsize)
+            session.hooks["response"].append(self._on_response)
+            session.clearance_version = -1
+            self._local.session = session
+        if session.clearance_version != self._version:
+            with self._lock:
+                for name, cookie in self._clearance.items():
+                    session.cookies.set(name, cookie["value"], domain=cookie["domain"], path=cookie["path"],
+                                        expires=cookie["expires"])
+                session.clearance_version = self._version
+        return session
+
+    def clearance(self):
+        """Returns a copy of the shared clearance cookies (name -> attributes)."""
+        with self._lock:
+            return {name: dict(cookie) for name, cookie in self._clearance.items()}
+
+    def _on_response(self, response, *args, **kwargs):
+        # Runs for every response, including the requests cloudscraper makes to solve a challenge.
+        changed = False
+        for cookie in response.cookies:
+            if cookie.name not in CLEARANCE_COOKIES:
+                continue
+            with self._lock:
+                current = self._clearance.get(cookie.name)
+                if current and current["value"] == cookie.value:
+                    continue
+                self._clearance[cookie.name] = {
+                    "value": cookie.value,
+                    "domain": cookie.domain,
+                    "path": cookie.path,
+                    "expires": cookie.expires,
+                }
+                self._version += 1
+                changed = True
+        if changed:
+            self._save()
+        return response
+
+    def _load(self):
+        try:
+            with open(self.clearance_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self._clearance = {name: cookie for name, cookie in saved.items()
+                           if name in CLEARANCE_COOKIES and (not cookie.get("expires") or cookie["expires"] > now)}
+        self._version += 1
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps(self._clearance)
+        directory = os.path.dirname(self.clearance_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.clearance_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.clearance_path)
@@ -0,0 +1,264 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Telemetry ---
+# The hot paths (page fetch, parse, link resolution, download, upload) report
+# structured events to an in-process bus: a dict with "event", "time" and fields
+# such as "duration" (seconds), "bytes" and "ok". The Metrics subscriber aggregates
+# them into per-stage latency histograms and byte/event counters, served in
+# Prometheus text format by serve_metrics(). enable_profiling() additionally runs
+# each outermost stage under cProfile and dump_profiles() writes one .prof per stage.
+# The HTTP server and profiler modules are only imported when used, keeping this
+# module (imported by nearly every other one) cheap to load.
+
+FETCH = "fetch"
+PARSE = "parse"
+RESOLVE = "resolve"
+DOWNLOAD = "download"
+UPLOAD = "upload"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+METRICS_PREFIX = "anime3rb"
+
+_handlers = []
+_handlers_lock = threading.Lock()
+
+
+def subscribe(handler):
+    """Registers `handler(event)`, called synchronously for every emitted event."""
+    with _handlers_lock:
+        _handlers.append(handler)
+    return handler
+
+
+def unsubscribe(handler):
+    with _handlers_lock:
+        if handler in _handlers:
+            _handlers.remove(handler)
+
+
+def emit(event, **fields):
+    """Sends an event to every subscriber and returns it."""
+    record = {"event": event, "time": time.time(), **fields}
+    with _handlers_lock:
+        handlers = list(_handlers)
+    for handler in handlers:
+        try:
+            handler(record)
+        except Exception as e:
+            print(f"Telemetry handler {handler!r} failed: {e}")
+    return record
+
+
+@contextmanager
+def span(stage, **fields):
+    """
+    Times the enclosed block and emits `stage` with its duration when it exits.
+    The yielded dict is the event's fields: set "bytes", "ok"... on it from inside.
+    An exception marks the event ok=False (and is re-raised).
+    """
+    profile = _start_profile()
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["ok"] = False
+        fields.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _stop_profile(stage, profile)
+        fields.setdefault("ok", True)
+        emit(stage, duration=duration, **fields)
+
+
+def timed(stage, **fields):
+    """Decorator running each call of the function inside span(stage, **fields)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, **fields):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as exposed by Prometheus."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels):
+    body = ",".join(f'{name}="{value}"' for name, value in labels.items() if value not in (None, ""))
+    return "{" + body + "}" if body else ""
+
+
+class Metrics:
+    """Bus subscriber turning events into histograms and counters. Safe to share between threads."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix=METRICS_PREFIX):
+        self.buckets = buckets
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.events = {}
+        self.bytes = {}
+
+    def __call__(self, record):
+        stage = record["event"]
+        kind = record.get("kind", "")
+        outcome = "error" if record.get("ok") is False else "ok"
+        with self._lock:
+            self.events[(stage, outcome)] = self.events.get((stage, outcome), 0) + 1
+            if "duration" in record:
+                histogram = self.durations.get((stage, kind))
+                if histogram is None:
+                    histogram = self.durations[(stage, kind)] = Histogram(self.buckets)
+                histogram.observe(record["duration"])
+            if record.get("bytes"):
+                self.bytes[stage] = self.bytes.get(stage, 0) + record["bytes"]
+
+    def reset(self):
+        with self._lock:
+            self.durations.clear()
+            self.events.clear()
+            self.bytes.clear()
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            lines += [f"# HELP {p}_events_total Events emitted per stage and outcome.",
+                      f"# TYPE {p}_events_total counter"]
+            for (stage, outcome), count in sorted(self.events.items()):
+                lines.append(f"{p}_events_total{_labels(stage=stage, outcome=outcome)} {count}")
+
+            lines += [f"# HELP {p}_bytes_total Bytes transferred per stage.",
+                      f"# TYPE {p}_bytes_total counter"]
+            for stage, total in sorted(self.bytes.items()):
+                lines.append(f"{p}_bytes_total{_labels(stage=stage)} {total}")
+
+            lines += [f"# HELP {p}_stage_duration_seconds Latency of each stage.",
+                      f"# TYPE {p}_stage_duration_seconds histogram"]
+            for (stage, kind), histogram in sorted(self.durations.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{p}_stage_duration_seconds_bucket{_labels(stage=stage, kind=kind, le=bound)} {cumulative}")
+                lines.append(f"{p}_stage_duration_seconds_bucket{_labels(stage=stage, kind=kind, le='+Inf')} {histogram.count}")
+                lines.append(f"{p}_stage_duration_seconds_sum{_labels(stage=stage, kind=kind)} {histogram.sum}")
+                lines.append(f"{p}_stage_duration_seconds_count{_labels(stage=stage, kind=kind)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = subscribe(Metrics())
+
+
+def serve_metrics(port, host="127.0.0.1", source=None):
+    """
+    Serves `source.render()` (the process-wide metrics by default) at http://host:port/metrics
+    from a daemon thread. Returns the server; call shutdown() on it to stop.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    source = source or metrics
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = source.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# --- Optional cProfile hooks ---
+
+_profile_dir = None
+_profiles = {}
+_profiles_lock = threading.Lock()
+_profile_local = threading.local()
+
+
+def enable_profiling(output_dir):
+    """Profiles every outermost span from now on; see dump_profiles()."""
+    global _profile_dir
+    os.makedirs(output_dir, exist_ok=True)
+    _profile_dir = output_dir
+
+
+def disable_profiling():
+    global _profile_dir
+    _profile_dir = None
+
+
+def dump_profiles():
+    """Writes the accumulated stats of each stage to <output_dir>/<stage>.prof and returns the paths."""
+    if not _profile_dir:
+        return []
+    paths = []
+    with _profiles_lock:
+        for stage, stats in _profiles.items():
+            path = os.path.join(_profile_dir, f"{stage}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+    if paths:
+        print(f"Profiles written: {', '.join(paths)}")
+    return paths
+
+
+def _start_profile():
+    # Only the outermost span of a thread is profiled (profilers cannot be nested).
+    if not _profile_dir or getattr(_profile_local, "active", False):
+        return None
+    import cProfile
+
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is already running.
+        return None
+    _profile_local.active = True
+    return profile
+
+
+def _stop_profile(stage, profile):
+    if profile is None:
+        return
+    profile.disable()
+    _profile_local.active = False
+    with _profiles_lock:
+        if stage in _profiles:
+            _profiles[stage].add(profile)
+        else:
+            import pstats
+
+            _profiles[stage] = pstats.Stats(profile)
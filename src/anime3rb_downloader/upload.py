@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from anime3rb_downloader import ratelimit, telemetry
+
+# --- Resumable Facebook video upload ---
+# Uses the Graph API's resumable upload protocol instead of one multipart POST per file:
+#   start     POST /{page}/videos upload_phase=start, file_size      -> session id + first byte window
+#   transfer  POST upload_phase=transfer, start_offset, video_file_chunk -> next window
+#   finish    POST upload_phase=finish, title, description
+# Each chunk is read from disk only when it is sent and is retried on its own (dropped
+# connections and 5xx through the rate limiter, transient Graph errors here). The
+# session and the window the server asked for next are persisted after every chunk,
+# so an interrupted upload resumes where it stopped instead of starting over.
+
+GRAPH_URL = "https://graph-video.facebook.com/v18.0"
+DEFAULT_UPLOADS_PATH = os.path.join("output", ".uploads.sqlite3")
+# Files uploaded at the same time by upload_files().
+DEFAULT_UPLOAD_CONCURRENCY = 2
+CHUNK_RETRIES = 5
+UPLOAD_TIMEOUT = 300
+
+
+class GraphError(Exception):
+    """An error answered by the Graph API; `transient` is Facebook's is_transient flag."""
+
+    def __init__(self, message, status=None, error=None):
+        super().__init__(message)
+        self.status = status
+        self.error = error or {}
+        self.transient = bool(self.error.get("is_transient")) or (status or 0) >= 500
+
+
+class UploadStore:
+    """sqlite record of the upload sessions in progress. Safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_UPLOADS_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS uploads (
+                path TEXT NOT NULL,
+                page_id TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                video_id TEXT,
+                session_id TEXT,
+                start_offset INTEGER NOT NULL DEFAULT 0,
+                end_offset INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (path, page_id)
+            )"""
+        )
+
+    def get(self, path, page_id):
+        """Returns the upload entry of a file as a dict, or None."""
+        keys = ("size", "mtime", "video_id", "session_id", "start_offset", "end_offset", "done")
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(keys)} FROM uploads WHERE path = ? AND page_id = ?",
+                (os.path.abspath(path), page_id),
+            ).fetchone()
+        return dict(zip(keys, row)) if row else None
+
+    def start(self, path, page_id, size, mtime, video_id, session_id, start_offset, end_offset):
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO uploads (path, page_id, size, mtime, video_id, session_id, start_offset,
+                   end_offset, done, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)""",
+                (os.path.abspath(path), page_id, size, mtime, video_id, session_id, start_offset, end_offset,
+                 time.time()),
+            )
+
+    def save_offsets(self, path, page_id, start_offset, end_offset):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET start_offset = ?, end_offset = ?, updated_at = ? WHERE path = ? AND page_id = ?",
+                (start_offset, end_offset, time.time(), os.path.abspath(path), page_id),
+            )
+
+    def mark_done(self, path, page_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET done = 1, updated_at = ? WHERE path = ? AND page_id = ?",
+                (time.time(), os.path.abspath(path), page_id),
+            )
+
+    def discard(self, path, page_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM uploads WHERE path = ? AND page_id = ?", (os.path.abspath(path), page_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_upload_store():
+    """Returns the process-wide UploadStore, creating it on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = UploadStore()
+        return _default_store
+
+
+def graph_post(session, url, data, files=None, retries=CHUNK_RETRIES):
+    """
+    POSTs to the Graph API and returns the decoded answer. Dropped connections and 5xx
+    are retried by the rate limiter, transient Graph errors here; others raise GraphError.
+    """
+    for attempt in range(retries + 1):
+        response = ratelimit.post(session, url, ratelimit.UPLOAD, data=data, files=files, timeout=UPLOAD_TIMEOUT,
+                                  max_retries=retries)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code < 400 and "error" not in body:
+            return body
+        error = body.get("error") if isinstance(body.get("error"), dict) else {}
+        e = GraphError(error.get("message") or f"HTTP {response.status_code}", response.status_code, error)
+        if not e.transient or attempt == retries:
+            raise e
+        delay = ratelimit.backoff_delay(attempt)
+        print(f"Graph API error ({e}), retrying in {delay:.1f}s...")
+        time.sleep(delay)
+
+
+def _read_chunk(f, start, end):
+    f.seek(start)
+    chunk = bytearray(end - start)
+    view = memoryview(chunk)
+    n = 0
+    while n < len(chunk):
+        read = f.readinto(view[n:])
+        if not read:
+            break
+        n += read
+    return bytes(view[:n])
+
+
+def upload_video(path, page_id, access_token, title=None, description="", store=None, session=None,
+                 graph_url=GRAPH_URL, progress_callback=None):
+    """
+    Uploads a video to a Facebook Page with the resumable protocol and returns its video id.
+    An unfinished session of the same (unchanged) file is resumed; an already uploaded
+    file is not sent again. `progress_callback(sent, total)` is called after every chunk.
+    """
+    import requests
+
+    store = store or get_upload_store()
+    session = session or requests.Session()
+    url = f"{graph_url.rstrip('/')}/{page_id}/videos"
+    stat = os.stat(path)
+    size = stat.st_size
+
+    entry = store.get(path, page_id)
+    if entry and (entry["size"], entry["mtime"]) != (size, stat.st_mtime):
+        entry = None
+    if entry and entry["done"]:
+        print(f"{os.path.basename(path)} was already uploaded (video {entry['video_id']}).")
+        return entry["video_id"]
+
+    with telemetry.span(telemetry.UPLOAD, file=os.path.basename(path)) as event, open(path, "rb", buffering=0) as f:
+        for resuming in ((True, False) if entry else (False,)):
+            if not resuming:
+                started = graph_post(session, url, {"access_token": access_token, "upload_phase": "start",
+                                                    "file_size": size})
+                entry = {"video_id": started["video_id"], "session_id": started["upload_session_id"],
+                         "start_offset": int(started["start_offset"]), "end_offset": int(started["end_offset"])}
+                store.start(path, page_id, size, stat.st_mtime, entry["video_id"], entry["session_id"],
+                            entry["start_offset"], entry["end_offset"])
+            start, end = entry["start_offset"], entry["end_offset"]
+            event["resumed_from"] = start
+            try:
+                while start < end:
+                    chunk = _read_chunk(f, start, end)
+                    answer = graph_post(
+                        session, url,
+                        {"access_token": access_token, "upload_phase": "transfer",
+                         "upload_session_id": entry["session_id"], "start_offset": start},
+                        files={"video_file_chunk": (os.path.basename(path), chunk, "application/octet-stream")},
+                    )
+                    start, end = int(answer["start_offset"]), int(answer["end_offset"])
+                    store.save_offsets(path, page_id, start, end)
+                    if progress_callback:
+                        progress_callback(start, size)
+                break
+            except GraphError as e:
+                if not resuming:
+                    raise
+                # The saved session expired or no longer matches: start a new one.
+                print(f"Could not resume the upload of {os.path.basename(path)} ({e}), starting over.")
+                store.discard(path, page_id)
+
+        graph_post(session, url, {"access_token": access_token, "upload_phase": "finish",
+                                  "upload_session_id": entry["session_id"],
+                                  "title": title or os.path.basename(path), "description": description or ""})
+        store.mark_done(path, page_id)
+        event["bytes"] = size - event["resumed_from"]
+    return entry["video_id"]
+
+
+def upload_files(paths, page_id, access_token, title=None, description="", concurrency=DEFAULT_UPLOAD_CONCURRENCY,
+                 progress_callback=None, **options):
+    """
+    Uploads several videos, `concurrency` at a time. Returns one (path, video_id, error)
+    per file, in order; one failed file does not stop the others.
+    `progress_callback(path, sent, total)` reports every chunk of every file.
+    """
+    import requests
+
+    def upload_one(path):
+        try:
+            callback = (lambda sent, total: progress_callback(path, sent, total)) if progress_callback else None
+            return path, upload_video(path, page_id, access_token, title, description,
+                                      progress_callback=callback, **options), None
+        except (OSError, requests.RequestException, GraphError, KeyError, ValueError) as e:
+            return path, None, str(e) or type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(paths) or 1))) as executor:
+        return list(executor.map(upload_one, paths))
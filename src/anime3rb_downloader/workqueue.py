@@ -0,0 +1,508 @@
+import hmac
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import uuid
+
+from anime3rb_downloader.scheduler import Scheduler, JobCancelled
+
+# --- Shared work queue with leases ---
+# Lets several machines work through one backlog of episode jobs. A job is identified
+# by (title, episode) and moves pending -> leased -> done (or failed). A worker leases
+# jobs for `ttl` seconds and renews the lease with heartbeats while it downloads; a
+# lease that is not renewed (crashed or disconnected node) expires and the job goes
+# back to pending for the next worker. Enqueuing and completing are idempotent: an
+# episode already queued is not added twice, and completing a done job is a no-op
+# (a worker whose lease expired but who finished anyway still counts).
+#
+# Two interchangeable backends, picked by open_queue():
+#   path/to/queue.sqlite3   SqliteQueue, a sqlite file that may live on shared storage
+#                           (NFS, SMB): every operation holds an OS lock on a side file,
+#                           and the database uses a rollback journal since WAL needs
+#                           shared memory that network filesystems do not provide.
+#   tcp://host:port         RemoteQueue, talking to a QueueServer (the coordinator),
+#                           which serves a SqliteQueue on its local disk.
+# Lease expiry compares wall clocks, so the nodes of a sqlite queue need synchronised
+# clocks; with a coordinator only its clock matters.
+# The coordinator's protocol is plain JSON over TCP. It listens on 127.0.0.1 unless
+# given a shared secret, which every request must then carry; even so, only expose it
+# on a trusted network (the secret travels in clear).
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+LEASE_TTL = 120
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5
+DEFAULT_QUEUE_PORT = 8643
+CONNECT_TIMEOUT = 10
+# Environment variable read by the CLI when --queue-secret is not given.
+SECRET_ENV = "ANIME3RB_QUEUE_SECRET"
+
+
+class QueueError(Exception):
+    """An error answered by the coordinator, or a request it could not be reached for."""
+
+
+class _FileLock:
+    """Exclusive OS lock on a file, also held across threads of this process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self.path, "a+b")
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after 10 attempts; keep waiting.
+                        pass
+            else:
+                import fcntl
+                # POSIX record locks (lockf) are the ones NFS forwards to the server.
+                fcntl.lockf(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.lockf(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        finally:
+            self._thread_lock.release()
+        return False
+
+
+class SqliteQueue:
+    """Work queue in a sqlite file that several processes and machines may share (see the module comment)."""
+
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = _FileLock(path + ".lock")
+        with self._lock:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    title TEXT NOT NULL,
+                    episode INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL,
+                    owner TEXT,
+                    token TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (title, episode)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, priority, title, episode)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(time.time())
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def _requeue_expired(self, now):
+        # Expired leases go back to the queue (or fail for good after max_attempts).
+        self._conn.execute(
+            """UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, token = NULL,
+               error = 'lease expired', updated_at = ? WHERE state = ? AND lease_expires < ?""",
+            (self.max_attempts, FAILED, PENDING, now, LEASED, now),
+        )
+
+    def put(self, jobs):
+        """
+        Queues episode jobs, dicts with "title", "episode" and optionally "priority" (lower
+        first); the whole dict is handed back as the lease payload. Returns how many were new.
+        """
+        def insert(now):
+            added = 0
+            for job in jobs:
+                cursor = self._conn.execute(
+                    """INSERT OR IGNORE INTO jobs (title, episode, payload, priority, state, updated_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (job["title"], int(job["episode"]), json.dumps(job), int(job.get("priority", 0)), PENDING, now),
+                )
+                added += cursor.rowcount
+            return added
+        return self._transaction(insert)
+
+    def lease(self, worker, count=1, ttl=LEASE_TTL):
+        """
+        Leases up to `count` pending jobs to `worker` for `ttl` seconds. Returns a list of
+        leases: dicts with title, episode, payload, token (needed to renew or finish) and attempts.
+        """
+        def take(now):
+            self._requeue_expired(now)
+            rows = self._conn.execute(
+                "SELECT title, episode, payload, attempts FROM jobs WHERE state = ? "
+                "ORDER BY priority, title, episode LIMIT ?",
+                (PENDING, max(0, count)),
+            ).fetchall()
+            leases = []
+            for title, episode, payload, attempts in rows:
+                token = uuid.uuid4().hex
+                self._conn.execute(
+                    """UPDATE jobs SET state = ?, owner = ?, token = ?, lease_expires = ?, attempts = attempts + 1,
+                       updated_at = ? WHERE title = ? AND episode = ?""",
+                    (LEASED, worker, token, now + ttl, now, title, episode),
+                )
+                leases.append({"title": title, "episode": episode, "payload": json.loads(payload), "token": token,
+                               "attempts": attempts + 1})
+            return leases
+        return self._transaction(take)
+
+    def heartbeat(self, title, episode, token, ttl=LEASE_TTL):
+        """Extends a lease; returns False if it was lost (expired and re-leased, or the job is done)."""
+        def renew(now):
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE title = ? AND episode = ? AND state = ? "
+                "AND token = ?",
+                (now + ttl, now, title, int(episode), LEASED, token),
+            )
+            return cursor.rowcount == 1
+        return self._transaction(renew)
+
+    def complete(self, title, episode, token=None):
+        """Marks a job done, whoever holds its lease. Completing a done job again is a no-op; returns True either way."""
+        def finish(now):
+            cursor = self._conn.execute(
+                "UPDATE jobs SET state = ?, owner = NULL, token = NULL, error = NULL, updated_at = ? "
+                "WHERE title = ? AND episode = ? AND state != ?",
+                (DONE, now, title, int(episode), DONE),
+            )
+            if cursor.rowcount:
+                return True
+            return self._conn.execute("SELECT 1 FROM jobs WHERE title = ? AND episode = ?",
+                                      (title, int(episode))).fetchone() is not None
+        return self._transaction(finish)
+
+    def fail(self, title, episode, token, error=None):
+        """
+        Gives a leased job back after a failed attempt: it is queued again, or marked failed
+        once it used max_attempts. Ignored (returns False) if `token` no longer holds the lease.
+        """
+        def release(now):
+            cursor = self._conn.execute(
+                """UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, token = NULL,
+                   error = ?, updated_at = ? WHERE title = ? AND episode = ? AND state = ? AND token = ?""",
+                (self.max_attempts, FAILED, PENDING, error, now, title, int(episode), LEASED, token),
+            )
+            return cursor.rowcount == 1
+        return self._transaction(release)
+
+    def stats(self):
+        """Returns the number of jobs in each state."""
+        def count(now):
+            self._requeue_expired(now)
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+            return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+        return self._transaction(count)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Coordinator ---
+
+QUEUE_OPERATIONS = ("put", "lease", "heartbeat", "complete", "fail", "stats")
+
+
+class QueueServer(socketserver.ThreadingTCPServer):
+    """
+    Serves a queue backend over a line-based JSON protocol: each request line is
+    {"op": <one of QUEUE_OPERATIONS>, "args": {...}, "secret": ...}, answered with
+    {"result": ...} or {"error": message}. With a `secret`, requests without it are refused.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, queue, secret=None):
+        self.queue = queue
+        self.secret = secret
+        super().__init__(address, QueueRequestHandler)
+
+
+class QueueRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("A request must be a JSON object")
+                secret = self.server.secret
+                if secret and not hmac.compare_digest(str(request.get("secret", "")).encode(), secret.encode()):
+                    raise PermissionError("Missing or wrong queue secret")
+                if request.get("op") not in QUEUE_OPERATIONS:
+                    raise ValueError(f"Unknown queue operation {request.get('op')!r}")
+                reply = {"result": getattr(self.server.queue, request["op"])(**request.get("args", {}))}
+            except Exception as e:
+                # A bad request is answered, never allowed to drop the connection.
+                reply = {"error": str(e) or type(e).__name__}
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+class RemoteQueue:
+    """Client of a QueueServer with the same methods as SqliteQueue. Safe to share between threads."""
+
+    def __init__(self, host, port=DEFAULT_QUEUE_PORT, timeout=CONNECT_TIMEOUT, secret=None):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.secret = secret
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _call(self, op, **args):
+        request = {"op": op, "args": args}
+        if self.secret:
+            request["secret"] = self.secret
+        line = (json.dumps(request) + "\n").encode("utf-8")
+        with self._lock:
+            # A broken connection is reopened once: every operation is safe to repeat.
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = socket.create_connection(self.address, self.timeout)
+                        self._file = self._sock.makefile("rb")
+                    self._sock.sendall(line)
+                    answer = self._file.readline()
+                    if not answer:
+                        raise ConnectionError("coordinator closed the connection")
+                    break
+                except OSError as e:
+                    self._close()
+                    if attempt:
+                        raise QueueError(f"Queue coordinator {self.address[0]}:{self.address[1]} unreachable: {e}")
+        reply = json.loads(answer)
+        if "error" in reply:
+            raise QueueError(reply["error"])
+        return reply["result"]
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+    def put(self, jobs):
+        return self._call("put", jobs=list(jobs))
+
+    def lease(self, worker, count=1, ttl=LEASE_TTL):
+        return self._call("lease", worker=worker, count=count, ttl=ttl)
+
+    def heartbeat(self, title, episode, token, ttl=LEASE_TTL):
+        return self._call("heartbeat", title=title, episode=episode, token=token, ttl=ttl)
+
+    def complete(self, title, episode, token=None):
+        return self._call("complete", title=title, episode=episode, token=token)
+
+    def fail(self, title, episode, token, error=None):
+        return self._call("fail", title=title, episode=episode, token=token, error=error)
+
+    def stats(self):
+        return self._call("stats")
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+def open_queue(spec, secret=None):
+    """
+    Returns the queue backend for `spec`: "tcp://host[:port]" for a coordinator (sent
+    `secret` with every request), otherwise a sqlite file path.
+    """
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://"):].rstrip("/").partition(":")
+        return RemoteQueue(host or "127.0.0.1", int(port) if port else DEFAULT_QUEUE_PORT, secret=secret)
+    if spec.startswith("sqlite://"):
+        spec = spec[len("sqlite://"):]
+    return SqliteQueue(spec)
+
+
+def is_loopback(host):
+    """True if `host` resolves to a loopback address ("" and 0.0.0.0, all interfaces, do not)."""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def serve_queue(queue, host="127.0.0.1", port=DEFAULT_QUEUE_PORT, secret=None):
+    """
+    Starts a QueueServer for `queue` on a background thread and returns it. Raises
+    ValueError for a `host` other than loopback without a `secret`.
+    """
+    if not (secret or is_loopback(host)):
+        raise ValueError(f"Refusing to serve the queue on {host or 'all interfaces'} without a secret "
+                         f"(--queue-secret or {SECRET_ENV})")
+    server = QueueServer((host, port), queue, secret)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Queue coordinator listening on {server.server_address[0]}:{server.server_address[1]}")
+    return server
+
+
+# --- Worker ---
+
+class QueueWorker:
+    """
+    Leases jobs from a queue and runs `run_job(payload)` on `concurrency` threads,
+    renewing the leases every ttl/3 seconds. A job returning a true value is completed;
+    a false value or an exception gives it back for another attempt. A job whose lease
+    is lost is cancelled (it stops at its next Job.check_cancelled()).
+    """
+
+    def __init__(self, queue, run_job, concurrency=1, worker_id=None, ttl=LEASE_TTL, poll_interval=POLL_INTERVAL):
+        self.queue = queue
+        self.run_job = run_job
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.counts = {DONE: 0, FAILED: 0, "lost": 0}
+        self._scheduler = Scheduler(self.concurrency)
+        self._active = {}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    def run(self, until_empty=True):
+        """
+        Works until the queue has nothing pending or leased (or, with until_empty=False,
+        until stop() is called). Returns the counts of done, failed and lost jobs.
+        """
+        heartbeats = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeats.start()
+        try:
+            while not self._stop.is_set():
+                with self._cond:
+                    while len(self._active) >= self.concurrency and not self._stop.is_set():
+                        self._cond.wait()
+                    free = self.concurrency - len(self._active)
+                try:
+                    leases = self.queue.lease(self.worker_id, free, self.ttl) if free else []
+                except QueueError as e:
+                    print(f"Could not lease jobs: {e}")
+                    leases = []
+                for lease in leases:
+                    self._start(lease)
+                if leases:
+                    continue
+                if until_empty and not self._active:
+                    try:
+                        stats = self.queue.stats()
+                    except QueueError as e:
+                        print(f"Could not read the queue: {e}")
+                    else:
+                        # Jobs leased by other workers may still come back if their lease expires.
+                        if not stats[PENDING] and not stats[LEASED]:
+                            break
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+            self._scheduler.shutdown()
+            self._finished.set()
+            heartbeats.join()
+        return dict(self.counts)
+
+    def stop(self):
+        """Stops leasing; running jobs finish first."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _start(self, lease):
+        key = (lease["title"], lease["episode"])
+        with self._cond:
+            self._active[key] = [lease, None]
+        job = self._scheduler.submit(self._run, lease, key=key)
+        with self._cond:
+            if key in self._active:
+                self._active[key][1] = job
+
+    def _run(self, lease):
+        key = (lease["title"], lease["episode"])
+        outcome, error = "lost", None
+        try:
+            if self.run_job(lease["payload"]):
+                outcome = DONE
+            else:
+                outcome, error = FAILED, "download failed"
+        except JobCancelled:
+            pass
+        except Exception as e:
+            outcome, error = FAILED, str(e) or type(e).__name__
+        finally:
+            with self._cond:
+                self._active.pop(key, None)
+                self.counts[outcome] += 1
+                self._cond.notify_all()
+        try:
+            if outcome == DONE:
+                self.queue.complete(lease["title"], lease["episode"], lease["token"])
+            elif outcome == FAILED:
+                self.queue.fail(lease["title"], lease["episode"], lease["token"], error)
+        except QueueError as e:
+            # The lease expires and the job is leased again; completing it there is a no-op.
+            print(f"Could not report episode {lease['episode']} of {lease['title']}: {e}")
+        return outcome == DONE
+
+    def _heartbeat_loop(self):
+        # Runs until the last job has finished, even after stop().
+        while not self._finished.wait(self.ttl / 3):
+            with self._cond:
+                active = list(self._active.values())
+            for lease, job in active:
+                try:
+                    alive = self.queue.heartbeat(lease["title"], lease["episode"], lease["token"], self.ttl)
+                except QueueError as e:
+                    # Keep going: the lease is only lost if the coordinator stays away past its expiry.
+                    print(f"Heartbeat failed: {e}")
+                    continue
+                if not alive and job is not None:
+                    print(f"Lease on episode {lease['episode']} of {lease['title']} lost, stopping it.")
+                    self._scheduler.cancel(job)
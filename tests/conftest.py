@@ -0,0 +1,76 @@
+"""
+Fixtures running the package against the local stand-ins of benchmarks/: the mock
+anime3rb site and CDN (mock_server.py) and the Graph API endpoint (mock_graph.py),
+served from a thread of the test process.
+"""
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from bench_e2e import route_sessions  # noqa: E402
+from mock_graph import MockGraph  # noqa: E402
+from mock_server import BLOCK_SIZE, MockAnime3rb  # noqa: E402
+
+from anime3rb_downloader import cache, core, library, links, prefetch, ratelimit, upload  # noqa: E402
+
+
+def start_server(handler):
+    """Serves `handler` on a free port from a daemon thread; returns (server, base URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory, with fresh process-wide stores (cache, links, library...)."""
+    monkeypatch.chdir(tmp_path)
+    for module, name in ((cache, "_default_cache"), (links, "_default_store"), (library, "_default_library"),
+                         (prefetch, "_default_prefetcher"), (upload, "_default_store")):
+        monkeypatch.setattr(module, name, None)
+    # Page requests as fast as the mock answers them (the real budget is 2 per second).
+    limiter = ratelimit.RateLimiter()
+    limiter.configure(ratelimit.PAGE, rate=1000, burst=1000)
+    monkeypatch.setattr(ratelimit, "limiter", limiter)
+    return tmp_path
+
+
+@pytest.fixture
+def mock_site(request, workdir, monkeypatch):
+    """
+    A MockAnime3rb (with its `url`) that core's sessions talk to. Options of MockAnime3rb
+    are taken from the test's indirect parameter, e.g.
+    @pytest.mark.parametrize("mock_site", [{"episodes": 100, "per_page": 30}], indirect=True).
+    """
+    options = {"latency": 0, "video_size": 1024 * 1024, **getattr(request, "param", {})}
+    site = MockAnime3rb(**options)
+    server, site.url = start_server(site.handler())
+    monkeypatch.setattr(core, "sessions", None)
+    route_sessions(core, site.url)
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mock_graph(workdir):
+    """A MockGraph (with its `graph_url`) for upload.upload_video(..., graph_url=mock_graph.graph_url)."""
+    graph = MockGraph(chunk_size=256 * 1024)
+    server, url = start_server(graph.handler())
+    graph.graph_url = f"{url}/v18.0"
+    yield graph
+    server.shutdown()
+    server.server_close()
+
+
+def video_bytes(site):
+    """The content of every video the mock site serves."""
+    blocks = -(-site.video_size // BLOCK_SIZE)
+    return (site.block * blocks)[:site.video_size]
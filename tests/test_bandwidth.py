@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from anime3rb_downloader import bandwidth
+
+
+def at(hour, minute):
+    """Seconds since the epoch of today's local hour:minute."""
+    return time.mktime(time.localtime()[:3] + (hour, minute, 0, 0, 0, -1))
+
+
+def test_parse_schedule():
+    assert bandwidth.parse_schedule("01:00-07:00=0, 07:00-01:00=2048") == [(60, 420, 0), (420, 60, 2048 * 1024)]
+    assert bandwidth.parse_schedule("22:00-24:00=100") == [(1320, 1440, 100 * 1024)]
+
+
+@pytest.mark.parametrize("text", ["24:00-06:00=100", "22:00-24:30=100", "23:60-24:00=100", "25:00-01:00=1",
+                                  "01:00=5", "01:00-02:00=-1"])
+def test_invalid_windows_are_refused(text):
+    with pytest.raises(ValueError):
+        bandwidth.parse_schedule(text)
+
+
+def test_schedule_windows_apply_by_time_of_day():
+    governor = bandwidth.Governor()
+    governor.configure(1000, bandwidth.parse_schedule("22:00-24:00=100,01:00-07:00=0,07:00-01:00=2048"))
+
+    assert governor.current_rate(at(23, 59)) == 100 * 1024
+    assert governor.current_rate(at(0, 30)) == 2048 * 1024
+    assert governor.current_rate(at(3, 0)) == 0
@@ -0,0 +1,76 @@
+import itertools
+
+import pytest
+
+from anime3rb_downloader import core
+
+TITLE_URL = "https://anime3rb.com/titles/one-piece"
+# 100 episodes listed 30 a page: pages 1-30, 31-60, 61-90 and 91-100.
+PAGED = [{"episodes": 100, "per_page": 30}]
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """URLs fetched by core, in order."""
+    urls = []
+    fetch = core.fetch
+
+    def recording_fetch(url, *args, **kwargs):
+        urls.append(url)
+        return fetch(url, *args, **kwargs)
+
+    monkeypatch.setattr(core, "fetch", recording_fetch)
+    return urls
+
+
+def page_numbers(urls):
+    return [int(match.group(2)) if match else 1 for match in map(core.PAGE_PARAM.search, urls)]
+
+
+@pytest.mark.parametrize("mock_site", PAGED, indirect=True)
+def test_walks_every_page_in_order(mock_site, fetched):
+    episodes = list(core.iter_episodes(TITLE_URL))
+
+    assert [number for number, _ in episodes] == list(range(1, 101))
+    assert episodes[41] == (42, "https://anime3rb.com/episode/one-piece/42")
+    assert page_numbers(fetched) == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("mock_site", PAGED, indirect=True)
+def test_pages_are_fetched_lazily(mock_site, fetched):
+    assert [number for number, _ in itertools.islice(core.iter_episodes(TITLE_URL), 5)] == [1, 2, 3, 4, 5]
+    assert page_numbers(fetched) == [1]
+
+
+@pytest.mark.parametrize("mock_site", PAGED, indirect=True)
+def test_range_jumps_to_the_pages_holding_it(mock_site, fetched):
+    episodes = list(core.iter_episodes(TITLE_URL, start=55, end=65))
+
+    assert [number for number, _ in episodes] == list(range(55, 66))
+    assert page_numbers(fetched) == [1, 2, 3]
+    assert all("?page=" in url for url in fetched[1:])
+
+
+@pytest.mark.parametrize("mock_site", PAGED, indirect=True)
+def test_pages_of_skipped_episodes_are_not_fetched(mock_site, fetched):
+    skip = set(range(31, 61)) | {95}
+    episodes = list(core.iter_episodes(TITLE_URL, skip=skip))
+
+    assert [number for number, _ in episodes] == [n for n in range(1, 101) if n not in skip]
+    assert page_numbers(fetched) == [1, 3, 4]
+
+
+@pytest.mark.parametrize("mock_site", PAGED, indirect=True)
+def test_listing_pages_come_from_the_cache(mock_site, fetched):
+    assert len(core.episode_list(TITLE_URL)) == 100
+    del fetched[:]
+
+    assert len(list(core.iter_episodes(TITLE_URL, start=90))) == 11
+    assert fetched == []
+
+
+def test_single_page_listing(mock_site, fetched):
+    episodes = list(core.iter_episodes(TITLE_URL, start=3, end=5))
+
+    assert [number for number, _ in episodes] == [3, 4, 5]
+    assert len(fetched) == 1
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from anime3rb_downloader import core, telemetry
+from anime3rb_downloader.links import get_link_store, is_link_fresh, link_expiry
+
+EPISODE_URL = "https://anime3rb.com/episode/one-piece/1"
+CLI_ORDER = (480, 720, 1080)
+GUI_ORDER = (1080, 720, 480)
+
+
+@pytest.fixture
+def page_fetches():
+    fetches = []
+    handler = telemetry.subscribe(lambda e: e["event"] == telemetry.FETCH and e["kind"] == "page" and fetches.append(e))
+    yield fetches
+    telemetry.unsubscribe(handler)
+
+
+def test_link_expiry_from_query_string():
+    assert link_expiry("https://cdn/v.mp4?expires=1700000000&signature=x") == 1700000000
+    assert link_expiry("https://cdn/v.mp4?Expires=1700000000000") == 1700000000
+    assert link_expiry("https://cdn/v.mp4?X-Amz-Date=20240101T000000Z&X-Amz-Expires=600") == 1704067800
+    assert link_expiry("https://cdn/v.mp4?token=abc") is None
+
+
+def test_link_near_expiry_is_stale():
+    now = time.time()
+    assert is_link_fresh(f"https://cdn/v.mp4?expires={int(now) + 3600}")
+    assert not is_link_fresh(f"https://cdn/v.mp4?expires={int(now) + 60}")
+
+
+def test_fresh_link_is_reused_without_fetching_the_page(mock_site, page_fetches):
+    link = core.get_download_link(EPISODE_URL, qualities=GUI_ORDER)
+    assert "1080p" in link and len(page_fetches) == 1
+
+    assert core.get_download_link(EPISODE_URL, qualities=GUI_ORDER) == link
+    assert len(page_fetches) == 1
+
+
+def test_expired_link_is_resolved_again(mock_site, page_fetches):
+    expired = f"https://video.vid3rb.com/download/one-piece-1-1080p.mp4?expires={int(time.time()) - 10}"
+    get_link_store().put("one-piece", "1", 1080, expired)
+    get_link_store().put_offered("one-piece", "1", GUI_ORDER)
+
+    link = core.get_download_link(EPISODE_URL, qualities=GUI_ORDER)
+
+    assert link != expired and "1080p" in link and is_link_fresh(link)
+    assert len(page_fetches) == 1
+    assert get_link_store().get("one-piece", "1", 1080) == link
+
+
+def test_cached_link_of_another_preference_is_not_served(mock_site, page_fetches):
+    assert "480p" in core.get_download_link(EPISODE_URL, qualities=CLI_ORDER)
+
+    assert "1080p" in core.get_download_link(EPISODE_URL, qualities=GUI_ORDER)
+    # Both links are stored now: each order gets its own without another resolution.
+    assert "480p" in core.get_download_link(EPISODE_URL, qualities=CLI_ORDER)
+    assert "1080p" in core.get_download_link(EPISODE_URL, qualities=GUI_ORDER)
+    assert get_link_store().offered("one-piece", "1") == [1080, 720, 480]
+
+
+def test_unlabelled_link_is_not_stored_as_a_quality():
+    assert core.pick_link([["Download", "https://cdn/v.mp4"]], GUI_ORDER) == (None, "https://cdn/v.mp4")
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+import pytest
+
+from anime3rb_downloader import core, prefetch, ratelimit
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """URLs fetched by core, in order (from any thread)."""
+    urls = []
+    lock = threading.Lock()
+    fetch = core.fetch
+
+    def recording_fetch(url, *args, **kwargs):
+        with lock:
+            urls.append(url)
+        return fetch(url, *args, **kwargs)
+
+    monkeypatch.setattr(core, "fetch", recording_fetch)
+    return urls
+
+
+@pytest.fixture
+def prefetcher(workdir):
+    prefetcher = prefetch.Prefetcher()
+    yield prefetcher
+    prefetcher.scheduler.shutdown(cancel_pending=True)
+
+
+def test_prefetched_results_are_fetched_once(mock_site, fetched, prefetcher):
+    anime_map = core.search("naruto")
+    results = list(anime_map.values())[:3]
+    del fetched[:]
+
+    prefetcher.prefetch(anime_map, 3)
+    # The same search again (a second user, say) queues nothing new.
+    prefetcher.prefetch(anime_map, 3)
+    for data in results:
+        assert os.path.exists(prefetcher.cover(data["image"]))
+        assert prefetcher.episode_list(data["url"])
+
+    pages = [data["url"] for data in results] + [data["image"] for data in results]
+    assert sorted(fetched) == sorted(pages)
+
+
+def test_click_on_a_pending_prefetch_fetches_the_page_once(mock_site, fetched, prefetcher):
+    anime_map = core.search("naruto")
+    data = next(iter(anime_map.values()))
+    del fetched[:]
+    release = threading.Event()
+    # Hold the prefetch workers, so that the prefetch of the result is still pending when clicked.
+    blockers = [prefetcher.scheduler.submit(release.wait, priority=-100) for _ in range(prefetch.PREFETCH_WORKERS)]
+
+    prefetcher.prefetch(anime_map, 1)
+    assert prefetcher.episode_list(data["url"])
+    release.set()
+    for job in blockers:
+        job.wait()
+    prefetcher.scheduler.join()
+
+    assert fetched.count(data["url"]) == 1
+
+
+def test_background_requests_leave_a_slot_for_the_user():
+    host = ratelimit.HostLimiter(rate=1000, burst=10, max_concurrency=2)
+    host.acquire()
+    acquired = threading.Event()
+
+    def background():
+        host.acquire(background=True)
+        acquired.set()
+
+    threading.Thread(target=background, daemon=True).start()
+    # The second slot is kept for the user: the prefetch waits...
+    assert not acquired.wait(0.2)
+    host.acquire()
+    assert host.in_flight == 2
+    # ...until both of the user's requests are done.
+    host.release()
+    assert not acquired.wait(0.2)
+    host.release()
+    assert acquired.wait(1)
+
+
+def test_waiting_user_request_goes_first():
+    host = ratelimit.HostLimiter(rate=1000, burst=10, max_concurrency=3)
+    host.acquire()
+    host.acquire()
+    host.acquire()
+    order = []
+
+    def request(name, background):
+        host.acquire(background)
+        order.append(name)
+
+    threads = [threading.Thread(target=request, args=("prefetch", True), daemon=True),
+               threading.Thread(target=request, args=("user", False), daemon=True)]
+    threads[0].start()
+    time.sleep(0.1)
+    threads[1].start()
+    while host.waiting == 0:
+        time.sleep(0.01)
+    for _ in range(3):
+        host.release()
+    for thread in threads:
+        thread.join(1)
+    assert order == ["user", "prefetch"]
@@ -0,0 +1,80 @@
+import pytest
+
+from anime3rb_downloader import core, segmented, telemetry
+from anime3rb_downloader.journal import DownloadJournal, download_with_journal
+from anime3rb_downloader.segmented import download_resumable, segments_written
+
+from conftest import video_bytes
+
+VIDEO_URL = "https://video.vid3rb.com/download/one-piece-1-1080p.mp4"
+# Four segments of MIN_SEGMENT_SIZE.
+FOUR_SEGMENTS = [{"video_size": 4 * segmented.MIN_SEGMENT_SIZE}]
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingJournal(DownloadJournal):
+    """A journal whose process "dies" right after persisting its first checkpoint."""
+
+    def save_segments(self, title, episode, segments):
+        super().save_segments(title, episode, segments)
+        raise Crash()
+
+
+@pytest.fixture
+def events():
+    received = []
+    handler = telemetry.subscribe(received.append)
+    yield received
+    telemetry.unsubscribe(handler)
+
+
+@pytest.mark.parametrize("mock_site", FOUR_SEGMENTS, indirect=True)
+def test_segmented_download_matches_source(mock_site, workdir):
+    path = str(workdir / "ep.mp4")
+    progress = []
+
+    assert download_resumable(VIDEO_URL, path, core.get_sessions().get, connections=4,
+                              progress_callback=lambda done, total: progress.append((done, total)))
+
+    with open(path, "rb") as f:
+        assert f.read() == video_bytes(mock_site)
+    assert progress[-1] == (mock_site.video_size, mock_site.video_size)
+
+
+def test_split_ranges_covers_the_file():
+    ranges = segmented.split_ranges(10 * segmented.MIN_SEGMENT_SIZE + 7, 4)
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == 10 * segmented.MIN_SEGMENT_SIZE + 6
+    assert all(end + 1 == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.parametrize("mock_site", FOUR_SEGMENTS, indirect=True)
+def test_interrupted_download_resumes_from_journal(mock_site, workdir, monkeypatch, events):
+    monkeypatch.setattr(segmented, "CHECKPOINT_BYTES", 256 * 1024)
+    path = str(workdir / "ep.mp4")
+    session = core.get_sessions().get
+
+    with pytest.raises(Crash):
+        download_with_journal(CrashingJournal("journal.sqlite3"), "one-piece", 1, VIDEO_URL, path, session,
+                              connections=4)
+
+    journal = DownloadJournal("journal.sqlite3")
+    entry = journal.get("one-piece", 1)
+    saved = segments_written(entry["segments"])
+    assert 0 < saved < mock_site.video_size
+    assert not journal.is_done("one-piece", 1)
+
+    del events[:]
+    assert download_with_journal(journal, "one-piece", 1, VIDEO_URL, path, session, connections=4)
+
+    with open(path, "rb") as f:
+        assert f.read() == video_bytes(mock_site)
+    assert journal.is_done("one-piece", 1)
+    start = next(e for e in events if e["event"] == "download_start")
+    download = next(e for e in events if e["event"] == telemetry.DOWNLOAD)
+    # Only what the journal did not hold was fetched again.
+    assert start["resumed_from"] == saved
+    assert download["bytes"] == mock_site.video_size - saved
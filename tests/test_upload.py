@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+import pytest
+
+from anime3rb_downloader import upload
+
+
+class Crash(Exception):
+    pass
+
+
+def make_video(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return path
+
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_upload_in_chunks(mock_graph, workdir):
+    path = make_video(workdir, "ep-1.mp4", 1024 * 1024 + 5)
+
+    video_id = upload.upload_video(path, "page", "token", title="Episode 1", graph_url=mock_graph.graph_url)
+
+    (state,) = mock_graph.state().values()
+    assert state["video_id"] == video_id and state["finished"] and state["title"] == "Episode 1"
+    assert state["chunks"] == 5 and state["sha256"] == sha256(path)
+
+
+def test_interrupted_upload_resumes_its_session(mock_graph, workdir):
+    path = make_video(workdir, "ep-1.mp4", 1024 * 1024)
+
+    def crash_after_two_chunks(sent, total):
+        if sent == 2 * mock_graph.chunk_size:
+            raise Crash()
+
+    with pytest.raises(Crash):
+        upload.upload_video(path, "page", "token", graph_url=mock_graph.graph_url,
+                            progress_callback=crash_after_two_chunks)
+    video_id = upload.upload_video(path, "page", "token", graph_url=mock_graph.graph_url)
+
+    (state,) = mock_graph.state().values()
+    assert state["video_id"] == video_id and state["finished"]
+    # The first two chunks were not sent again.
+    assert state["chunks"] == 4 and state["sha256"] == sha256(path)
+
+
+def test_uploaded_file_is_not_sent_again(mock_graph, workdir):
+    path = make_video(workdir, "ep-1.mp4", 300 * 1024)
+    video_id = upload.upload_video(path, "page", "token", graph_url=mock_graph.graph_url)
+
+    assert upload.upload_video(path, "page", "token", graph_url=mock_graph.graph_url) == video_id
+    assert len(mock_graph.state()) == 1
+
+
+def test_upload_files_reports_each_file(mock_graph, workdir):
+    paths = [make_video(workdir, f"ep-{n}.mp4", 300 * 1024) for n in range(1, 4)]
+    paths.insert(1, os.path.join(workdir, "missing.mp4"))
+
+    results = upload.upload_files(paths, "page", "token", concurrency=2, graph_url=mock_graph.graph_url)
+
+    assert [path for path, _, _ in results] == paths
+    assert results[1][1] is None and results[1][2]
+    assert all(video_id and not error for i, (_, video_id, error) in enumerate(results) if i != 1)
+    assert sum(state["finished"] for state in mock_graph.state().values()) == 3